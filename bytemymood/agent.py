@@ -1,5 +1,5 @@
 from google.adk.agents import Agent
-from bytemymood.tools.memory import _load_user_profile, memorize
+from bytemymood.tools.memory import _load_user_profile, memorize, memorize_many
 from bytemymood.sub_agents.inspiration.agent import inspiration_agent
 from bytemymood.sub_agents.planning.agent import planning_agent
 from bytemymood.sub_agents.execution.agent import execution_agent
@@ -20,6 +20,7 @@ root_agent = Agent(
     ],
     tools=[
         memorize,
+        memorize_many,
     ],
     before_agent_callback=_load_user_profile,
 )
\ No newline at end of file
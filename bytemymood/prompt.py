@@ -33,6 +33,7 @@ Only use the `memorize` tool to store user preferences into the following variab
 **Important**: 
 - Only use `memorize` to store `current_mood` if the user explicitly and clearly states their mood (e.g., "I'm sad", "I'm happy", "I'm not in a good mood").
 - If the user's input is ambiguous or does not clearly indicate a mood (e.g., "hi", "hello", "what's up"), do NOT memorize it as mood.
+- When the user shares more than one of these at once, store them all with a single `memorize_many` call instead of several `memorize` calls. Use `value` for single values and `values` to add items to list variables such as `allergies`, `dislikes`, `available_equipment`, `cooking_appliances` and `utensils`.
 - Do not use the `memorize` tool for any other purpose.
 - After memorizing, do not respond to the user anything about memorizing reply concise message.
 </Memorize>
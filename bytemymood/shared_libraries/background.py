@@ -0,0 +1,96 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Bounded queue for blocking work that callers do not need to wait for.
+
+Jobs are plain functions run in worker threads by a fixed number of
+consumer tasks on the event loop. The queue is bounded, so a caller that
+submits faster than the workers drain it waits for a free slot instead of
+letting pending work (and the data it holds) grow without limit. Failures
+are logged and counted, since nobody is waiting on the result.
+"""
+
+import asyncio
+import logging
+from typing import Any, Callable, List, Optional
+
+from bytemymood.shared_libraries import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundQueue:
+    """Runs submitted blocking jobs in worker threads, at most `maxsize` waiting at once."""
+
+    def __init__(self, name: str, maxsize: int, workers: int = 1):
+        self.name = name
+        self.maxsize = maxsize
+        self.workers = workers
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: List[asyncio.Task] = []
+        self._pending = 0
+
+    def _ensure_started(self) -> asyncio.Queue:
+        """Starts the workers on the running loop, replacing any bound to a previous loop."""
+        loop = asyncio.get_running_loop()
+        if self._queue is None or self._loop is not loop:
+            self._queue = asyncio.Queue(maxsize=self.maxsize)
+            self._loop = loop
+            self._pending = 0
+            self._tasks = [loop.create_task(self._worker(self._queue)) for _ in range(self.workers)]
+        return self._queue
+
+    async def _worker(self, queue: asyncio.Queue) -> None:
+        while True:
+            fn, args = await queue.get()
+            try:
+                await asyncio.to_thread(fn, *args)
+                metrics.increment("background_jobs", queue=self.name, outcome="success")
+            except Exception as e:
+                logger.warning(f"Background job in {self.name} failed: {e}")
+                metrics.increment("background_jobs", queue=self.name, outcome="error")
+            finally:
+                self._pending -= 1
+                queue.task_done()
+
+    async def submit(self, fn: Callable[..., Any], *args: Any) -> None:
+        """Queues fn(*args), waiting only if the queue is full."""
+        queue = self._ensure_started()
+        self._pending += 1
+        try:
+            await queue.put((fn, args))
+        except BaseException:
+            self._pending -= 1
+            raise
+
+    def pending(self) -> int:
+        """Returns the number of jobs queued or running."""
+        return self._pending
+
+    async def drain(self) -> None:
+        """Waits until every job submitted so far has finished."""
+        if self._queue is not None and self._loop is asyncio.get_running_loop():
+            await self._queue.join()
+
+    async def close(self) -> None:
+        """Finishes queued jobs, then stops the workers."""
+        if self._loop is not asyncio.get_running_loop():
+            self._queue, self._loop, self._tasks, self._pending = None, None, [], 0
+            return
+        await self.drain()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._queue, self._loop, self._tasks, self._pending = None, None, [], 0
@@ -86,7 +86,116 @@ STEP_TIPS = "tips"
 UPLOADED_IMAGE_B64 = "uploaded_image_b64"
 UPLOADED_MASK_B64 = "uploaded_mask_b64"
 UPLOADED_IMAGE_PARTS = "uploaded_image_parts" 
+GENERATED_IMAGE_ARTIFACTS = "generated_image_artifacts" # Image cache key -> artifact saved in this session
 
 # --- Image Saving Settings ---
 SAVE_IMAGES_LOCALLY: bool = True # Set to False to disable local saving
 LOCAL_IMAGE_SAVE_PATH: str = "local_image_results" # Directory relative to project root
+LOCAL_IMAGE_MAX_BYTES: int = 1024 * 1024 * 1024 # Oldest local copies are deleted beyond this size
+LOCAL_IMAGE_SAVE_IN_BACKGROUND: bool = False # Return once the artifact is saved and write the local copy from a queue
+LOCAL_IMAGE_WRITE_QUEUE_SIZE: int = 16 # Local copies waiting to be written before image tools wait for a slot
+
+# --- Outbound HTTP Settings ---
+HTTP_ENABLE_HTTP2: bool = True # Falls back to HTTP/1.1 when the 'h2' package is not installed
+HTTP_MAX_CONNECTIONS: int = 100 # Upper bound on open connections across all hosts
+HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20 # Idle connections kept warm for reuse
+HTTP_KEEPALIVE_EXPIRY: float = 30.0 # Seconds an idle connection stays in the pool
+HTTP_CONNECT_TIMEOUT: float = 3.0 # Seconds allowed for the TCP/TLS handshake
+HTTP_DEFAULT_TIMEOUT: float = 10.0 # Seconds, used for hosts not listed below
+HTTP_HOST_TIMEOUTS: dict = {
+    "maps.googleapis.com": 5.0,
+    "weather.googleapis.com": 10.0,
+}
+
+# --- Local Cache Settings ---
+LOCAL_CACHE_PATH: str = "local_cache" # Directory relative to project root
+GEOCODE_CACHE_ENABLED: bool = True # Set to False to geocode on every call
+GEOCODE_CACHE_PATH: str = f"{LOCAL_CACHE_PATH}/geocode.sqlite3"
+GEOCODE_CACHE_MEMORY_SIZE: int = 1024 # Locations kept in the in-memory tier
+
+# --- Image Generation Settings ---
+IMAGE_GENERATION_MODEL: str = "gemini-2.0-flash-preview-image-generation"
+IMAGE_CACHE_ENABLED: bool = True # Reuse images generated earlier for the same prompt, model and config
+IMAGE_CACHE_PATH: str = f"{LOCAL_CACHE_PATH}/images" # Content-addressed image store
+IMAGE_CACHE_MAX_BYTES: int = 512 * 1024 * 1024 # Least recently used images are evicted beyond this size
+ENHANCE_PROMPT_MODEL: str = "gemini-2.0-flash-001"
+PROMPT_CACHE_ENABLED: bool = True # Reuse enhanced prompts for step descriptions seen before
+PROMPT_CACHE_PATH: str = f"{LOCAL_CACHE_PATH}/prompts.sqlite3"
+PROMPT_CACHE_MEMORY_SIZE: int = 2048 # Enhanced prompts kept in the in-memory tier
+PROMPT_CACHE_TTL_SECONDS: float = 7 * 24 * 3600 # Enhanced prompts older than this are regenerated
+STEP_IMAGE_LOOKAHEAD: int = 2 # Steps after the current one whose images are prepared in advance
+STEP_IMAGE_CONCURRENCY: int = 2 # Step images prepared at once per session
+STEP_IMAGE_MAX_PIPELINES: int = 128 # Sessions with step images in progress; the least recently used are dropped
+STEP_IMAGE_PIPELINE_IDLE_TTL_SECONDS: int = 1800 # A session's step image pipeline is closed after this long without use
+IMAGE_DERIVATIVES_ENABLED: bool = True # Also save smaller renditions of each generated image as artifacts
+IMAGE_DERIVATIVE_FORMATS: tuple = ("webp",) # Add "avif" when the 'pillow-avif-plugin' package is installed
+IMAGE_DERIVATIVE_WIDTHS: tuple = (1024, 768, 256) # Rendition widths in pixels; never wider than the original
+IMAGE_DERIVATIVE_QUALITY: int = 80 # Lossy encoder quality, 0-100
+IMAGE_DERIVATIVE_WORKERS: int = 2 # Processes encoding renditions
+IMAGE_DISPLAY_WIDTH: int = 768 # Narrowest rendition returned to the agent for display; smaller ones are thumbnails
+IMAGE_DEDUPE_ENABLED: bool = True # Reuse a near-identical image instead of saving new bytes
+IMAGE_DEDUPE_THRESHOLD: int = 4 # Maximum differing bits (of 64) in the perceptual hash for images to count as duplicates
+PERCEPTUAL_INDEX_PATH: str = f"{LOCAL_CACHE_PATH}/perceptual.sqlite3" # Perceptual hashes of the local image copies
+
+# --- Gemini Rate Limit Settings ---
+GENAI_RATE_LIMITS: dict = { # Model -> (requests per minute, burst); keep below the project's quota
+    IMAGE_GENERATION_MODEL: (10, 3),
+    ENHANCE_PROMPT_MODEL: (60, 10),
+}
+GENAI_DEFAULT_RATE_LIMIT: tuple = (60, 10) # For models not listed above
+GENAI_RATE_LIMIT_MAX_QUEUE: int = 64 # Calls waiting per model before new ones are turned away
+GENAI_RATE_LIMIT_MAX_WAIT_SECONDS: float = 30.0 # Longer expected waits are reported to the tool instead of queued
+GENAI_CONCURRENCY_INITIAL: int = 4 # Starting limit on in-flight calls per model; adjusted from observed latency and errors
+GENAI_CONCURRENCY_MIN: int = 1
+GENAI_CONCURRENCY_MAX: int = 16
+GENAI_CONCURRENCY_DECREASE_FACTOR: float = 0.5 # Multiplies the limit on a 429, a 5xx or a latency spike
+GENAI_LATENCY_SPIKE_FACTOR: float = 3.0 # Calls slower than this multiple of the typical latency count as overload
+GENAI_MAX_ATTEMPTS: int = 3 # Tries per call when the upstream reports overload
+GENAI_RETRY_BASE_SECONDS: float = 1.0 # Backoff before the first retry, doubled for each later one (with full jitter)
+GENAI_RETRY_MAX_SECONDS: float = 10.0
+
+# --- Weather Cache Settings ---
+WEATHER_CACHE_TTL_SECONDS: float = 600 # Conditions older than this are refetched
+WEATHER_CACHE_GEOHASH_PRECISION: int = 5 # Grid cell size; 5 is roughly 5km x 5km
+WEATHER_CACHE_MAX_ENTRIES: int = 4096 # Grid cells kept in memory
+WEATHER_BATCH_CONCURRENCY: int = 16 # Lookups in flight at once for batch requests
+WEATHER_TOOL_LATENCY_BUDGET_SECONDS: float = 8.0 # Overall time allowed for geocoding plus weather lookup
+WEATHER_PREFETCH_ENABLED: bool = True # Warm the weather cache for the profile location at session start
+WEATHER_PREFETCH_SESSION_TTL_SECONDS: float = 1800 # A session's prefetch is released once the session has been idle this long
+
+# --- Offline Gazetteer Settings ---
+GAZETTEER_ENABLED: bool = True # Resolve common cities locally before calling the geocoder
+GAZETTEER_PATH: str = "" # Custom city table; empty uses the bundled bytemymood/tools/data/gazetteer.tsv
+
+# --- Upstream Resilience Settings ---
+CIRCUIT_BREAKER_FAILURE_THRESHOLD: int = 5 # Consecutive failures before an upstream's circuit opens
+CIRCUIT_BREAKER_RESET_SECONDS: float = 30.0 # Time an open circuit waits before letting a trial call through
+HTTP_HEDGE_ENABLED: bool = False # Send a second attempt when a request is slower than usual
+HTTP_HEDGE_PERCENTILE: float = 95 # Latency percentile after which a request is hedged
+HTTP_HEDGE_MIN_SAMPLES: int = 20 # Latency samples required before hedging starts
+
+# --- User Profile Settings ---
+PROFILE_REVALIDATE_SECONDS: float = 5.0 # How often the profile file's mtime is checked for changes
+PROFILE_BACKEND: str = "sqlite" # Per-user profile storage: "sqlite", "file", or "" to always use the sample profile
+PROFILE_STORE_PATH: str = "local_profiles" # Directory holding profiles.sqlite3 or the per-user JSON files
+PROFILE_CACHE_SIZE: int = 1024 # Profiles kept in memory
+PROFILE_WRITE_BATCH_SIZE: int = 32 # Users with pending changes before they are written back
+PROFILE_WRITE_INTERVAL_SECONDS: float = 5.0 # Longest time a memorized change waits to be written back
+PROFILE_JOURNAL_COMPACT_AFTER: int = 100 # Journaled changes per user before they are folded into a new snapshot
+PROFILE_PERSISTED_KEYS: frozenset = frozenset({ # Durable preferences saved across sessions; everything else is session-only
+    "city",
+    "country",
+    "cooking_skill_level",
+    "cooking_time_preference",
+    "allergies",
+    "dislikes",
+    "dietary_preferences",
+    "comfort_foods",
+    "preferred_dishes",
+    "spice_tolerance",
+    "sweet_preference",
+    "salt_preference",
+    "available_equipment",
+    "cooking_appliances",
+    "utensils",
+})
@@ -0,0 +1,32 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Identifiers of the session and user a tool or callback is running for.
+
+The ADK versions this package supports do not expose the session or user on
+ToolContext or CallbackContext, only on the invocation context behind them,
+so this module is the one place that reaches for them.
+"""
+
+from google.adk.agents.callback_context import CallbackContext
+
+
+def session_id(context: CallbackContext) -> str:
+    """Returns the id of the session a ToolContext or CallbackContext belongs to."""
+    return context._invocation_context.session.id
+
+
+def user_id(context: CallbackContext) -> str:
+    """Returns the id of the user a ToolContext or CallbackContext is running for."""
+    return context._invocation_context.user_id
@@ -0,0 +1,134 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""An insertion-ordered list of unique values with set-backed membership checks."""
+
+from typing import Any, Iterable, List
+
+
+class IndexedList(list):
+    """
+    A list without duplicates that keeps a set of its values alongside, so
+    membership checks and dedupe are O(1) instead of a scan.
+
+    It is still a list, so it serializes to a plain JSON list for the session
+    store and prompt templates. Change it through add/discard and their bulk
+    variants; positional writes that would bypass the index are rejected.
+    Unhashable values (e.g. dicts) are allowed but fall back to a scan.
+    """
+
+    def __init__(self, values: Iterable[Any] = ()):
+        super().__init__()
+        self._index = set()
+        self.add_many(values)
+
+    def __contains__(self, value: Any) -> bool:
+        try:
+            return value in self._index
+        except TypeError:
+            return list.__contains__(self, value)
+
+    def add(self, value: Any) -> bool:
+        """Appends value unless it is already present. Returns True if it was added."""
+        try:
+            if value in self._index:
+                return False
+            self._index.add(value)
+        except TypeError:
+            if list.__contains__(self, value):
+                return False
+        list.append(self, value)
+        return True
+
+    def add_many(self, values: Iterable[Any]) -> List[Any]:
+        """Appends every value not already present, in order. Returns the values added."""
+        return [value for value in values if self.add(value)]
+
+    def discard(self, value: Any) -> bool:
+        """Removes value if present. Returns True if it was removed."""
+        if value not in self:
+            return False
+        if _is_hashable(value):
+            self._index.discard(value)
+        list.remove(self, value)
+        return True
+
+    def discard_many(self, values: Iterable[Any]) -> List[Any]:
+        """Removes every given value that is present in one pass. Returns the values removed."""
+        removed = IndexedList(value for value in values if value in self)
+        if removed:
+            kept = [value for value in self if value not in removed]
+            list.__setitem__(self, slice(None), kept)
+            self._index.difference_update(value for value in removed if _is_hashable(value))
+        return list(removed)
+
+    def copy(self) -> "IndexedList":
+        """Returns a shallow copy without re-hashing the values."""
+        clone = IndexedList()
+        list.extend(clone, self)
+        clone._index = self._index.copy()
+        return clone
+
+    # Keep the list API consistent with the index.
+    def append(self, value: Any) -> None:
+        self.add(value)
+
+    def extend(self, values: Iterable[Any]) -> None:
+        self.add_many(values)
+
+    def remove(self, value: Any) -> None:
+        if not self.discard(value):
+            raise ValueError(f"{value!r} is not in list")
+
+    def pop(self, index: int = -1) -> Any:
+        value = list.pop(self, index)
+        if _is_hashable(value):
+            self._index.discard(value)
+        return value
+
+    def clear(self) -> None:
+        list.clear(self)
+        self._index.clear()
+
+    def _positional(self, *args, **kwargs):
+        raise TypeError("IndexedList does not support positional writes; use add or discard")
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = insert = _positional
+
+    def __copy__(self) -> "IndexedList":
+        return self.copy()
+
+    def __reduce__(self):
+        return IndexedList, (list(self),)
+
+
+def indexed_copy(value: Any) -> IndexedList:
+    """
+    Returns a private IndexedList copy of a list-valued state entry.
+    A missing value becomes an empty list, and a single value a one-item list.
+    """
+    if isinstance(value, IndexedList):
+        return value.copy()
+    if value is None:
+        return IndexedList()
+    if isinstance(value, (list, tuple)):
+        return IndexedList(value)
+    return IndexedList([value])
+
+
+def _is_hashable(value: Any) -> bool:
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
@@ -0,0 +1,57 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+State-change journal entries.
+
+A change to a state dict is recorded as a small (op, key, value) entry
+instead of the key's whole new value:
+
+    ("set", key, value)       store value under key
+    ("add", key, [items])     add items to the list under key, skipping duplicates
+    ("remove", key, [items])  remove items from the list under key
+
+Replaying the entries in order over a snapshot rebuilds the state.
+"""
+
+from typing import Any, Dict, Iterable, Tuple
+
+from bytemymood.shared_libraries.indexed_list import indexed_copy
+
+SET = "set"
+ADD = "add"
+REMOVE = "remove"
+
+Op = Tuple[str, str, Any]
+
+
+def apply_ops(state: Dict[str, Any], ops: Iterable[Op]) -> Dict[str, Any]:
+    """
+    Returns a new state with the journal entries applied in order.
+    The given state and its values are left unchanged.
+    """
+    result = dict(state)
+    for op, key, value in ops:
+        if op == SET:
+            result[key] = value
+        elif op == ADD:
+            items = indexed_copy(result.get(key))
+            items.add_many(value)
+            result[key] = items
+        elif op == REMOVE:
+            items = indexed_copy(result.get(key))
+            items.discard_many(value)
+            result[key] = items
+        else:
+            raise ValueError(f"Unknown journal op {op!r}")
+    return result
@@ -0,0 +1,65 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Closing pooled clients that are bound to an event loop.
+
+A pooled async client's connections belong to the loop that opened them.
+close_stale closes one left behind on a previous loop, and close_at_exit
+runs a client's async close function from an atexit hook, where no loop is
+running.
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+_closing: Set[asyncio.Future] = set()
+
+
+async def _close_quietly(aclose: Callable[[], Awaitable[None]], name: str) -> None:
+    try:
+        await aclose()
+    except Exception as e:
+        # A loop that has already shut down can leave the transports unclosable; they are dropped with it.
+        logger.debug(f"Could not close {name} cleanly: {e}")
+
+
+def close_stale(aclose: Callable[[], Awaitable[None]], loop: Optional[asyncio.AbstractEventLoop], name: str) -> None:
+    """
+    Closes a client that was opened on loop without waiting for it. The close
+    runs on loop if it is still running in another thread, otherwise on the
+    current loop.
+    """
+    current = asyncio.get_running_loop()
+    if loop is not None and loop is not current and loop.is_running() and not loop.is_closed():
+        asyncio.run_coroutine_threadsafe(_close_quietly(aclose, name), loop)
+        return
+    task = current.create_task(_close_quietly(aclose, name))
+    _closing.add(task)
+    task.add_done_callback(_closing.discard)
+
+
+def close_at_exit(aclose: Callable[[], Awaitable[None]], loop: Optional[asyncio.AbstractEventLoop], name: str) -> None:
+    """Runs aclose to completion from synchronous code such as an atexit hook."""
+    if loop is not None and loop.is_running():
+        return  # The loop's own shutdown owns the client
+    try:
+        if loop is not None and not loop.is_closed():
+            loop.run_until_complete(_close_quietly(aclose, name))
+        else:
+            asyncio.run(_close_quietly(aclose, name))
+    except RuntimeError as e:
+        logger.debug(f"Could not close {name} at exit: {e}")
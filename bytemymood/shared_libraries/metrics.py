@@ -0,0 +1,68 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""In-process counters and gauges for the ByteMyMood tools."""
+
+import threading
+from typing import Dict, Tuple
+
+_lock = threading.Lock()
+_counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+_gauges: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+
+
+def _key(name: str, labels: Dict[str, str]) -> Tuple[str, Tuple[Tuple[str, str], ...]]:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format(key: Tuple[str, Tuple[Tuple[str, str], ...]]) -> str:
+    name, labels = key
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{k}={v}" for k, v in labels) + "}"
+
+
+def increment(name: str, value: float = 1, **labels: str) -> None:
+    """Adds value to a counter."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name: str, value: float, **labels: str) -> None:
+    """Sets a gauge to its current value."""
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def get(name: str, **labels: str) -> float:
+    """Returns the current value of a counter or gauge (0 if never recorded)."""
+    key = _key(name, labels)
+    with _lock:
+        return _counters.get(key, _gauges.get(key, 0))
+
+
+def snapshot() -> Dict[str, Dict[str, float]]:
+    """Returns all counters and gauges, keyed as name{label=value,...}."""
+    with _lock:
+        return {
+            "counters": {_format(k): v for k, v in _counters.items()},
+            "gauges": {_format(k): v for k, v in _gauges.items()},
+        }
+
+
+def reset() -> None:
+    """Clears every counter and gauge."""
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
@@ -0,0 +1,307 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Client-side rate limiting for calls to quota-limited upstream APIs.
+
+A TokenBucket lets `burst` calls through at once and refills at `rate`
+calls per second. Callers that find it empty wait in a priority queue.
+Interactive requests are served before background work such as image
+prefetching. The queue is bounded: if it is full, or the estimated wait
+is longer than the caller is allowed to wait, acquire raises
+RateLimitExceeded straight away with that estimate, so a tool can tell
+the user how long to wait instead of failing at the upstream with a
+quota error.
+
+An AdaptiveConcurrencyLimiter caps how many calls are in flight at once
+and tunes that cap from what the upstream reports (AIMD). Each healthy
+call raises the limit a little, so over one limit's worth of calls it
+grows by one. A 429, a 5xx or a call much slower than usual halves it.
+
+A call's priority comes from the CallPriority in its context. Raising a
+CallPriority also moves calls already queued under it ahead, so work
+started in the background can be hurried once a user is waiting for it.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import logging
+import time
+import weakref
+from typing import Iterator, List, Optional, Union
+
+from bytemymood.shared_libraries import metrics
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+_queues: "weakref.WeakSet" = weakref.WeakSet()  # Rate and concurrency limiters whose waiters may be re-prioritized
+
+
+class CallPriority:
+    """
+    A rate-limit priority shared by the calls made under it. Lower numbers are
+    served first. raise_to also moves calls already waiting under it ahead.
+    """
+
+    def __init__(self, value: int):
+        self.value = value
+
+    def raise_to(self, value: int) -> None:
+        """Serves calls made under this priority, queued or not, at least as early as value."""
+        if value >= self.value:
+            return
+        self.value = value
+        for queue in list(_queues):
+            waiters = [waiter for waiter in queue._waiters if waiter[3] is self and waiter[0] > value]
+            for waiter in waiters:
+                waiter[0] = value
+            if waiters:
+                heapq.heapify(queue._waiters)
+
+
+_priority: contextvars.ContextVar = contextvars.ContextVar("rate_limit_priority", default=CallPriority(PRIORITY_INTERACTIVE))
+
+
+@contextlib.contextmanager
+def call_priority(priority: Union[int, CallPriority]) -> Iterator[None]:
+    """
+    Sets the rate-limit priority for calls made in this context, including
+    from tasks created inside it. Lower numbers are served first. Pass a
+    CallPriority to be able to raise it later.
+    """
+    token = _priority.set(priority if isinstance(priority, CallPriority) else CallPriority(priority))
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a call cannot be let through within the time its caller may wait."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Rate limit for {name} reached; retry in about {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """A token bucket whose waiters are queued by priority, then arrival order."""
+
+    def __init__(self, name: str, rate: float, burst: int, max_queue: int, max_wait: float):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._waiters: List[list] = []  # Heap of [priority, seq, future, CallPriority]
+        self._seq = itertools.count()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        _queues.add(self)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _queued_ahead(self, priority: int) -> int:
+        return sum(1 for waiter in self._waiters if waiter[0] <= priority and not waiter[2].done())
+
+    def estimated_wait(self, priority: Optional[int] = None) -> float:
+        """Returns roughly how many seconds a call with this priority would wait for a token."""
+        self._refill()
+        priority = _priority.get().value if priority is None else priority
+        needed = self._queued_ahead(priority) + 1 - self._tokens
+        return max(0.0, needed / self.rate)
+
+    async def acquire(self, priority: Optional[int] = None, max_wait: Optional[float] = None) -> float:
+        """
+        Waits for a token and returns how long that took.
+
+        Raises:
+            RateLimitExceeded: If the queue is full or the estimated wait exceeds max_wait.
+        """
+        handle = _priority.get()
+        priority = handle.value if priority is None else priority
+        max_wait = self.max_wait if max_wait is None else max_wait
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Waiters queued on a previous event loop can never be woken from this one.
+            self._loop, self._waiters, self._dispatcher = loop, [], None
+        self._refill()
+        if not self._waiters and self._tokens >= 1:
+            self._tokens -= 1
+            metrics.increment("rate_limit", bucket=self.name, outcome="immediate")
+            return 0.0
+        wait = self.estimated_wait(priority)
+        if len(self._waiters) >= self.max_queue or wait > max_wait:
+            metrics.increment("rate_limit", bucket=self.name, outcome="rejected")
+            raise RateLimitExceeded(self.name, wait)
+
+        started = time.monotonic()
+        future = loop.create_future()
+        heapq.heappush(self._waiters, [priority, next(self._seq), future, handle])
+        metrics.set_gauge("rate_limit_queue_depth", len(self._waiters), bucket=self.name)
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.ensure_future(self._dispatch())
+        await future
+        metrics.increment("rate_limit", bucket=self.name, outcome="queued")
+        return time.monotonic() - started
+
+    async def _dispatch(self) -> None:
+        """Hands out tokens to waiters in priority order as the bucket refills."""
+        while self._waiters:
+            if self._waiters[0][2].done():  # Cancelled while waiting
+                heapq.heappop(self._waiters)
+                continue
+            self._refill()
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                continue
+            self._tokens -= 1
+            heapq.heappop(self._waiters)[2].set_result(None)
+            metrics.set_gauge("rate_limit_queue_depth", len(self._waiters), bucket=self.name)
+
+    def stats(self) -> dict:
+        self._refill()
+        return {"tokens": self._tokens, "queued": len(self._waiters), "rate": self.rate, "burst": self.burst}
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Limits concurrent calls, raising the limit additively while calls succeed
+    at normal latency and cutting it multiplicatively on overload.
+    Waiters are queued by priority, then arrival order, as in TokenBucket.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial: int,
+        min_limit: int,
+        max_limit: int,
+        decrease_factor: float,
+        latency_spike_factor: float,
+        max_queue: int,
+        max_wait: float,
+    ):
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.latency_spike_factor = latency_spike_factor
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.limit = float(initial)
+        self.in_flight = 0
+        self.latency: Optional[float] = None  # Moving average of healthy call latency
+        self._last_decrease = 0.0
+        self._waiters: List[list] = []  # Heap of [priority, seq, future, CallPriority]
+        self._seq = itertools.count()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        _queues.add(self)
+        metrics.set_gauge("concurrency_limit", self.limit, limiter=self.name)
+
+    def _has_room(self) -> bool:
+        return self.in_flight < max(self.min_limit, int(self.limit))
+
+    def _estimated_wait(self) -> float:
+        return (len(self._waiters) + 1) / max(1, int(self.limit)) * (self.latency or 1.0)
+
+    async def acquire(self, priority: Optional[int] = None, max_wait: Optional[float] = None) -> None:
+        """
+        Waits for a free slot. Every successful acquire must be paired with release.
+
+        Raises:
+            RateLimitExceeded: If the queue is full or no slot frees up within max_wait.
+        """
+        handle = _priority.get()
+        priority = handle.value if priority is None else priority
+        max_wait = self.max_wait if max_wait is None else max_wait
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Slots held on a previous event loop will never be released on this one.
+            self._loop, self._waiters, self.in_flight = loop, [], 0
+        if not self._waiters and self._has_room():
+            self.in_flight += 1
+            metrics.increment("concurrency", limiter=self.name, outcome="immediate")
+            return
+        if len(self._waiters) >= self.max_queue:
+            metrics.increment("concurrency", limiter=self.name, outcome="rejected")
+            raise RateLimitExceeded(self.name, self._estimated_wait())
+
+        future = loop.create_future()
+        heapq.heappush(self._waiters, [priority, next(self._seq), future, handle])
+        try:
+            await asyncio.wait_for(asyncio.shield(future), max_wait)
+        except asyncio.TimeoutError:
+            if future.done():  # A slot was handed over just as the wait ran out
+                return
+            future.cancel()
+            metrics.increment("concurrency", limiter=self.name, outcome="rejected")
+            raise RateLimitExceeded(self.name, self._estimated_wait()) from None
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()  # Pass on the slot this caller will never use
+            future.cancel()
+            raise
+        metrics.increment("concurrency", limiter=self.name, outcome="queued")
+
+    def release(self, latency: Optional[float] = None, overloaded: bool = False) -> None:
+        """
+        Frees a slot and adjusts the limit. latency is None when the call did not
+        finish (e.g. it was cancelled), in which case the limit is left alone.
+        """
+        self.in_flight = max(0, self.in_flight - 1)
+        if overloaded:
+            self._decrease("error")
+        elif latency is not None:
+            spike = self.latency is not None and latency > self.latency * self.latency_spike_factor
+            # Spikes move the average too, so latency that rises for good becomes the new normal.
+            self.latency = latency if self.latency is None else 0.9 * self.latency + 0.1 * latency
+            if spike:
+                self._decrease("latency")
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        metrics.set_gauge("concurrency_limit", self.limit, limiter=self.name)
+        self._wake()
+
+    def _decrease(self, reason: str) -> None:
+        metrics.increment("concurrency_backoff", limiter=self.name, reason=reason)
+        now = time.monotonic()
+        # Calls in flight when the upstream became overloaded tend to fail together; cut once for all of them.
+        if now - self._last_decrease < (self.latency or 1.0):
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+        logger.info(f"Concurrency limit for {self.name} lowered to {int(self.limit)} ({reason})")
+
+    def _wake(self) -> None:
+        while self._waiters and self._has_room():
+            future = heapq.heappop(self._waiters)[2]
+            if future.done():  # Timed out or cancelled while waiting
+                continue
+            self.in_flight += 1
+            future.set_result(None)
+
+    def stats(self) -> dict:
+        return {"limit": self.limit, "in_flight": self.in_flight, "queued": len(self._waiters), "latency": self.latency}
@@ -0,0 +1,176 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Failure-handling primitives for calls to upstream services."""
+
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Optional
+
+from bytemymood.shared_libraries import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the upstream's circuit is open."""
+
+
+class LatencyBudgetExceeded(Exception):
+    """Raised when an operation runs out of its overall latency budget."""
+
+
+class CircuitBreaker:
+    """
+    Tracks consecutive failures for one upstream and fails fast once it looks down.
+
+    closed -> open after `failure_threshold` consecutive failures.
+    open -> half_open after `reset_timeout` seconds; one trial call is let through.
+    half_open -> closed on success, or back to open on failure.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    _STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._set_state(self.CLOSED)
+
+    def _set_state(self, state: str) -> None:
+        self.state = state
+        metrics.set_gauge("circuit_breaker_state", self._STATE_VALUES[state], upstream=self.name)
+
+    def before_call(self) -> None:
+        """Raises CircuitOpenError if the call should not be attempted."""
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self._set_state(self.HALF_OPEN)
+        if self.state == self.OPEN or (self.state == self.HALF_OPEN and self._trial_in_flight):
+            metrics.increment("circuit_breaker_rejections", upstream=self.name)
+            raise CircuitOpenError(f"Circuit for {self.name} is open; failing fast")
+        if self.state == self.HALF_OPEN:
+            self._trial_in_flight = True
+
+    def release(self) -> None:
+        """Ends a call that neither succeeded nor failed (e.g. it was cancelled)."""
+        self._trial_in_flight = False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._trial_in_flight = False
+        if self.state != self.CLOSED:
+            logger.info(f"Circuit for {self.name} closed")
+            self._set_state(self.CLOSED)
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning(f"Circuit for {self.name} opened after {self.failures} consecutive failures")
+                metrics.increment("circuit_breaker_trips", upstream=self.name)
+            self.opened_at = time.monotonic()
+            self._set_state(self.OPEN)
+
+
+class LatencyTracker:
+    """Keeps a sliding window of recent latencies to estimate percentiles."""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Returns the p-th percentile (0-100) of recent samples, or None if there are none."""
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+
+class LatencyBudget:
+    """An overall deadline shared by every step of one operation."""
+
+    def __init__(self, seconds: float, name: str = "default"):
+        self.name = name
+        self.deadline = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.deadline - time.monotonic())
+
+    def check(self) -> float:
+        """Returns the remaining seconds, raising LatencyBudgetExceeded if none are left."""
+        remaining = self.remaining()
+        if remaining <= 0:
+            metrics.increment("latency_budget_exceeded", budget=self.name)
+            raise LatencyBudgetExceeded(f"Latency budget for {self.name} exhausted")
+        return remaining
+
+    async def run(self, awaitable: Awaitable[Any]) -> Any:
+        """Awaits within the remaining budget, raising LatencyBudgetExceeded on expiry."""
+        if self.remaining() <= 0 and asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        try:
+            return await asyncio.wait_for(awaitable, self.check())
+        except asyncio.TimeoutError:
+            metrics.increment("latency_budget_exceeded", budget=self.name)
+            raise LatencyBudgetExceeded(f"Latency budget for {self.name} exhausted")
+
+
+async def hedged(fn: Callable[[], Awaitable[Any]], delay: Optional[float], name: str = "default") -> Any:
+    """
+    Runs fn(); if it has not finished after `delay` seconds, starts a second
+    attempt and returns whichever succeeds first, cancelling the other.
+    With no delay (e.g. not enough latency samples yet) fn() runs once.
+    """
+    if delay is None:
+        return await fn()
+    first = asyncio.ensure_future(fn())
+    tasks = [first]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done:
+            return first.result()
+        metrics.increment("hedged_requests", upstream=name)
+        second = asyncio.ensure_future(fn())
+        tasks.append(second)
+        pending = set(tasks)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is second:
+                        metrics.increment("hedged_request_wins", upstream=name)
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
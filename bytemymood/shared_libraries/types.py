@@ -3,7 +3,7 @@
 from typing import List, Optional, Dict, Any
 
 from google.genai import types
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 
 # Convenient declaration for controlled generation
@@ -22,6 +22,43 @@ class UserProfile(BaseModel):
     meal_preferences: Dict[str, Any] = Field(default_factory=dict, description="Preferences for different meal types")
 
 
+class CurrentRecipeState(BaseModel):
+    """The recipe the user is currently working with, as stored in session state."""
+    model_config = ConfigDict(extra="allow")
+    name: str = Field("", description="Name of the recipe")
+    source_url: str = Field("", description="Where the recipe was verified")
+    ingredients: List[Any] = Field(default_factory=list, description="Recipe ingredients")
+    instructions: List[Any] = Field(default_factory=list, description="Recipe steps")
+    prep_time: str = Field("", description="Preparation time")
+    cook_time: str = Field("", description="Cooking time")
+    servings: str = Field("", description="Number of servings")
+    verification_status: str = Field("", description="Outcome of recipe verification")
+    is_verified: bool = Field(False, description="Whether the recipe has been verified")
+
+
+class ProfileState(BaseModel):
+    """Initial session state loaded from a user profile file."""
+    model_config = ConfigDict(extra="allow")
+    city: str = Field("", description="User's city")
+    country: str = Field("", description="User's country")
+    cooking_skill_level: str = Field("", description="User's cooking skill level")
+    allergies: List[str] = Field(default_factory=list, description="List of food allergies")
+    dislikes: List[str] = Field(default_factory=list, description="Foods the user dislikes")
+    current_recipe: CurrentRecipeState = Field(default_factory=CurrentRecipeState, description="Current recipe")
+
+
+class ProfileFile(BaseModel):
+    """Schema of a user profile JSON file."""
+    state: ProfileState = Field(..., description="Initial session state")
+
+
+class MemoryUpdate(BaseModel):
+    """One state update applied by the memorize_many tool."""
+    key: str = Field(..., min_length=1, description="The label indexing the memory")
+    value: Optional[str] = Field(None, description="Value to store under key, replacing any previous value")
+    values: Optional[List[str]] = Field(None, description="Items to add to the list stored under key")
+
+
 class Ingredient(BaseModel):
     """An ingredient in a recipe."""
     name: str = Field(..., description="Name of the ingredient")
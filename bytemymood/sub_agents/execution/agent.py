@@ -2,8 +2,9 @@ from google.adk.agents import Agent
 from google.adk.tools.agent_tool import AgentTool
 from google.genai.types import GenerateContentConfig
 from bytemymood.sub_agents.execution.prompt import EXECUTION_AGENT_INSTR
-from bytemymood.tools.memory import memorize, memorize_list
-from bytemymood.tools.image_generation.image_generation import prompt_enhance_tool, gemini_image_generation_tool
+from bytemymood.tools.memory import memorize, memorize_list, memorize_many
+from bytemymood.tools.image_generation.image_generation import generate_step_image_tool
+from bytemymood.tools.image_generation.step_pipeline import prepare_step_images_tool, step_image_tool
 
 
 execution_agent = Agent(
@@ -14,8 +15,10 @@ execution_agent = Agent(
     tools=[
         memorize,  # For storing progress and preferences
         memorize_list,  # For tracking completed steps
-        prompt_enhance_tool,  # For enhancing image prompts
-        gemini_image_generation_tool,  # For generating cooking step images
+        memorize_many,  # For storing several values in one call
+        prepare_step_images_tool,  # For generating step images ahead of time
+        step_image_tool,  # For showing the prepared image of a step
+        generate_step_image_tool,  # For generating a step image when none was prepared
     ],
     generate_content_config=GenerateContentConfig(
         temperature=0.1,  # Low temperature for consistent responses
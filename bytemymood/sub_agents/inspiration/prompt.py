@@ -295,7 +295,9 @@ Response Format (MUST follow this exact structure):
     "verification_details": {
         "source": "Google Weather API",
         "timestamp": "time of weather check",
-        "is_current": true/false
+        "is_current": true/false,
+        "cached": true/false,
+        "cache_age_seconds": ...
     },
     "error_message": "if check failed after all retries, explain why"
 }
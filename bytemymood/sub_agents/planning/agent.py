@@ -2,14 +2,14 @@ from google.adk.agents import Agent
 from google.adk.tools.agent_tool import AgentTool
 from google.genai.types import GenerateContentConfig
 from bytemymood.sub_agents.planning.prompt import PLANNING_AGENT_INSTR, FRIDGE_AGENT_INSTR, SHOPPING_LIST_AGENT_INSTR
-from bytemymood.tools.memory import memorize, memorize_list
+from bytemymood.tools.memory import forget_list_items, memorize, memorize_list, memorize_list_items, memorize_many
 
 shopping_list_agent = Agent(
     model="gemini-2.0-flash",
     name="shopping_list_agent",
     description="An agent that generates shopping lists for missing ingredients",
     instruction=SHOPPING_LIST_AGENT_INSTR,
-    tools=[memorize, memorize_list],
+    tools=[memorize, memorize_list, memorize_list_items, forget_list_items],
 )
 
 fridge_agent = Agent(
@@ -17,7 +17,7 @@ fridge_agent = Agent(
     name="fridge_agent",
     description="An agent that checks available ingredients in the fridge and pantry",
     instruction=FRIDGE_AGENT_INSTR,
-    tools=[memorize, memorize_list],
+    tools=[memorize, memorize_list, memorize_list_items, forget_list_items],
     generate_content_config=GenerateContentConfig(
         temperature=0.1,  # Low temperature for consistent responses
         top_p=0.5  # Moderate top_p for some flexibility while maintaining consistency
@@ -33,6 +33,8 @@ planning_agent = Agent(
         AgentTool(agent=shopping_list_agent),
         memorize,
         memorize_list,
+        memorize_list_items,
+        memorize_many,
     ],
     generate_content_config=GenerateContentConfig(
         temperature=0.1, top_p=0.5
@@ -0,0 +1,52 @@
+"""Shared fixtures for the unit tests."""
+
+from types import SimpleNamespace
+
+import pytest
+
+from bytemymood.tools import profile_repository
+from bytemymood.tools.image_generation import image_store
+
+
+@pytest.fixture(autouse=True)
+def isolated_profile_store(tmp_path_factory, monkeypatch):
+    """Keeps memorized profile changes in a per-test store instead of local_profiles/ in the working directory."""
+    repository = profile_repository.ProfileRepository(
+        profile_repository.SqliteProfileBackend(str(tmp_path_factory.mktemp("profile_store") / "profiles.sqlite3"))
+    )
+    monkeypatch.setattr(profile_repository, "_repository", repository)
+    monkeypatch.setattr(profile_repository, "_repository_unavailable", False)
+    yield repository
+    repository.close()
+
+
+@pytest.fixture(autouse=True)
+def isolated_image_store(tmp_path_factory, monkeypatch):
+    """Keeps cached images and their sidecars in a per-test store instead of local_cache/ in the working directory."""
+    store = image_store.ImageStore(str(tmp_path_factory.mktemp("image_store")), max_bytes=10**7)
+    monkeypatch.setattr(image_store, "_store", store)
+    return store
+
+
+class FakeToolContext:
+    """A tool context with in-memory state that records the artifacts saved through it."""
+
+    def __init__(self, session_id="session", user_id="user"):
+        self._invocation_context = SimpleNamespace(session=SimpleNamespace(id=session_id), user_id=user_id)
+        self.state = {}
+        self.artifacts = {}  # Saved Parts by filename
+
+    @property
+    def saved(self):
+        """The filenames saved so far, in order."""
+        return list(self.artifacts)
+
+    async def save_artifact(self, filename, artifact):
+        self.artifacts[filename] = artifact
+        return len(self.artifacts)
+
+
+@pytest.fixture
+def make_tool_context():
+    """Returns a factory for fake tool contexts; pass session_id to tell sessions apart."""
+    return FakeToolContext
@@ -0,0 +1,51 @@
+"""Tests for the bounded background work queue."""
+
+import asyncio
+import threading
+
+import pytest
+
+from bytemymood.shared_libraries import metrics
+from bytemymood.shared_libraries.background import BackgroundQueue
+
+
+@pytest.mark.asyncio
+async def test_jobs_run_in_worker_threads():
+    queue = BackgroundQueue("test", maxsize=4)
+    threads = []
+    await queue.submit(lambda: threads.append(threading.get_ident()))
+    await queue.drain()
+    assert threads and threads[0] != threading.get_ident()
+    assert queue.pending() == 0
+    await queue.close()
+
+
+@pytest.mark.asyncio
+async def test_submit_waits_when_queue_is_full():
+    queue = BackgroundQueue("test", maxsize=1)
+    release = threading.Event()
+    await queue.submit(release.wait)
+    await asyncio.sleep(0.01)  # Let the worker take the first job
+    await queue.submit(lambda: None)
+    third = asyncio.ensure_future(queue.submit(lambda: None))
+    await asyncio.sleep(0.01)
+    assert not third.done()
+    release.set()
+    await third
+    await queue.close()
+    assert queue.pending() == 0
+
+
+@pytest.mark.asyncio
+async def test_failures_are_counted_not_raised():
+    metrics.reset()
+    queue = BackgroundQueue("test", maxsize=4)
+
+    def fail():
+        raise OSError("disk full")
+
+    await queue.submit(fail)
+    await queue.submit(lambda: None)
+    await queue.close()
+    assert metrics.get("background_jobs", queue="test", outcome="error") == 1
+    assert metrics.get("background_jobs", queue="test", outcome="success") == 1
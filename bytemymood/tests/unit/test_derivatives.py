@@ -0,0 +1,77 @@
+"""Tests for smaller renditions of generated images."""
+
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from bytemymood.tools.image_generation import derivatives, image_generation
+from bytemymood.tools.image_generation.derivatives import _encode_renditions, pick_display_rendition
+
+
+def _png(width, height):
+    buffer = BytesIO()
+    Image.new("RGB", (width, height), "tomato").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_renditions_never_upscale():
+    renditions = _encode_renditions(_png(300, 200), ["webp"], [1024, 768, 256], 80)
+    assert [(r.width, r.height) for r in renditions] == [(300, 200), (256, 171)]
+    assert all(Image.open(BytesIO(r.data)).format == "WEBP" for r in renditions)
+
+
+def test_display_rendition_is_smallest_adequate(monkeypatch):
+    monkeypatch.setattr(derivatives.constants, "IMAGE_DISPLAY_WIDTH", 768)
+    renditions = [
+        {"filename": "a.png", "width": 1024, "bytes": 900},
+        {"filename": "a.1024w.webp", "width": 1024, "bytes": 200},
+        {"filename": "a.768w.webp", "width": 768, "bytes": 120},
+        {"filename": "a.256w.webp", "width": 256, "bytes": 20},
+    ]
+    assert pick_display_rendition(renditions, 1024)["filename"] == "a.768w.webp"
+    assert pick_display_rendition(renditions[-1:], 256)["filename"] == "a.256w.webp"
+
+
+@pytest.fixture
+def store(isolated_image_store, monkeypatch):
+    monkeypatch.setattr(image_generation, "SAVE_IMAGES_LOCALLY", False)
+    return isolated_image_store
+
+
+@pytest.mark.asyncio
+async def test_renditions_are_saved_as_linked_artifacts(store, make_tool_context):
+    context = make_tool_context()
+    result = await image_generation._save_session_image("key", _png(1024, 1024), False, context)
+    derivatives.shutdown_derivative_pool()
+
+    stem = result["original_filename"][:-len(".png")]
+    assert result["filename"] == f"{stem}.768w.webp"
+    assert result["mime_type"] == "image/webp"
+    assert sorted(context.artifacts) == sorted(
+        [result["original_filename"], f"{stem}.1024w.webp", f"{stem}.768w.webp", f"{stem}.256w.webp"]
+    )
+    assert [r["width"] for r in result["renditions"]] == [1024, 768, 256]
+
+
+@pytest.mark.asyncio
+async def test_cached_image_reuses_stored_renditions_and_hash(store, make_tool_context, monkeypatch):
+    calls = []
+
+    async def encode(data):
+        calls.append("renditions")
+        return _encode_renditions(data, ["webp"], [1024, 768, 256], 80)
+
+    async def perceptual_hash(image_bytes):
+        calls.append("dhash")
+        return 12345
+
+    monkeypatch.setattr(image_generation, "make_renditions", encode)
+    monkeypatch.setattr(image_generation, "_perceptual_hash", perceptual_hash)
+    png = _png(1024, 1024)
+    store.put("key", png)
+    first = await image_generation._save_session_image("key", png, False, make_tool_context())
+    again = await image_generation._save_session_image("key", png, True, make_tool_context())
+    assert calls == ["dhash", "renditions"]
+    assert [r["bytes"] for r in again["renditions"]] == [r["bytes"] for r in first["renditions"]]
+    assert again["filename"].endswith(".768w.webp")
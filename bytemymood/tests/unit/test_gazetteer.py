@@ -0,0 +1,78 @@
+"""Tests for the offline gazetteer."""
+
+import time
+
+import pytest
+
+from bytemymood.tools.gazetteer import (
+    DEFAULT_COUNTRIES_PATH,
+    DEFAULT_GAZETTEER_PATH,
+    Gazetteer,
+    read_geonames,
+    write_gazetteer,
+)
+
+
+@pytest.fixture(scope="module")
+def gazetteer():
+    g = Gazetteer(DEFAULT_GAZETTEER_PATH, DEFAULT_COUNTRIES_PATH)
+    yield g
+    g.close()
+
+
+def test_lookup_with_country_code_and_name(gazetteer):
+    """Test exact lookups by ISO code and by country name."""
+    by_code = gazetteer.lookup("Paris", "FR")
+    assert by_code["city"] == "Paris"
+    assert by_code["country"] == "FR"
+    assert by_code["lat"] == pytest.approx(48.8566)
+    assert gazetteer.lookup("paris", "United States")["country"] == "US"
+    assert gazetteer.lookup("  SAO paulo ", "brasil")["city"] == "São Paulo"
+
+
+def test_lookup_without_country_prefers_most_populous(gazetteer):
+    """Test that ambiguous names resolve to the most populous city."""
+    assert gazetteer.lookup("London")["country"] == "GB"
+    assert gazetteer.lookup("Paris")["country"] == "FR"
+
+
+def test_lookup_misses(gazetteer):
+    """Test unknown cities and countries fall through as misses."""
+    assert gazetteer.lookup("Atlantis") is None
+    assert gazetteer.lookup("Paris", "Narnia") is None
+    assert gazetteer.lookup("Paris", "JP") is None
+    assert gazetteer.lookup("") is None
+
+
+def test_prefix_completion(gazetteer):
+    """Test prefix search over the sorted keys."""
+    names = [row["city"] for row in gazetteer.complete("san")]
+    assert names[0] == "Santiago"
+    assert set(names) == {"Santiago", "San Antonio", "San Diego", "San Jose", "San Francisco"}
+    assert [row["city"] for row in gazetteer.complete("san f")] == ["San Francisco"]
+
+
+def test_lookup_is_sub_millisecond(gazetteer):
+    """Test that a warm lookup stays well under a millisecond."""
+    start = time.perf_counter()
+    for _ in range(1000):
+        gazetteer.lookup("Tokyo", "JP")
+    assert (time.perf_counter() - start) / 1000 < 0.001
+
+
+def test_build_from_geonames(tmp_path):
+    """Test building a table from a GeoNames export, keeping the most populous duplicate."""
+    source = tmp_path / "cities.txt"
+    lines = [
+        ["1", "Springfield", "Springfield", "", "39.7817", "-89.6501", "P", "PPLA", "US"] + [""] * 5 + ["114394"],
+        ["2", "Springfield", "Springfield", "", "37.2153", "-93.2982", "P", "PPL", "US"] + [""] * 5 + ["169176"],
+        ["3", "Zürich", "Zurich", "", "47.3667", "8.5500", "P", "PPLA", "CH"] + [""] * 5 + ["341730"],
+    ]
+    source.write_text("".join("\t".join(line) + "\n" for line in lines), encoding="utf-8")
+    out = tmp_path / "gazetteer.tsv"
+
+    assert write_gazetteer(read_geonames(str(source)), str(out)) == 2
+    g = Gazetteer(str(out))
+    assert g.lookup("Springfield", "US")["lat"] == pytest.approx(37.2153)
+    assert g.lookup("zurich", "ch")["city"] == "Zürich"
+    g.close()
@@ -0,0 +1,90 @@
+"""Tests for the shared async GenAI client."""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from bytemymood.tools import genai_client
+from bytemymood.tools.image_generation import image_generation
+
+
+class FakeClient:
+    """Stands in for genai.Client, recording calls made through its async surface."""
+
+    def __init__(self):
+        self.calls = []
+        self.closed = False
+        self.aio = SimpleNamespace(models=SimpleNamespace(generate_content=self._generate), aclose=self._aclose)
+
+    async def _generate(self, model, contents, config=None):
+        self.calls.append((model, contents))
+        await asyncio.sleep(0)
+        return SimpleNamespace(text=f"enhanced: {contents[-20:]}")
+
+    async def _aclose(self):
+        self.closed = True
+
+
+@pytest.fixture
+def fake_client(monkeypatch):
+    """Makes the shared client a FakeClient and counts how many are built."""
+    built = []
+
+    def build():
+        built.append(FakeClient())
+        return built[-1]
+
+    monkeypatch.setattr(genai_client, "_build_client", build)
+    yield built
+
+
+@pytest.mark.asyncio
+async def test_client_is_shared_within_loop(fake_client):
+    """Test that repeated calls reuse one client and closing it releases the pool."""
+    first = genai_client.get_genai_client()
+    assert genai_client.get_genai_client() is first
+    assert len(fake_client) == 1
+    await genai_client.close_genai_client()
+    assert fake_client[0].closed
+    assert genai_client.get_genai_client() is not first
+    await genai_client.close_genai_client()
+
+
+def test_client_is_rebuilt_for_new_loop(fake_client):
+    """Test that a client bound to a previous event loop is not reused."""
+    async def get():
+        return genai_client.get_genai_client()
+
+    async def get_and_settle():
+        client = genai_client.get_genai_client()
+        await asyncio.sleep(0)  # Lets the stale client's close run
+        return client
+
+    first = asyncio.run(get())
+    second = asyncio.run(get_and_settle())
+    assert first is not second
+    assert fake_client[0].closed and not fake_client[1].closed
+    genai_client._close_genai_client_at_exit()
+    assert fake_client[1].closed
+    assert genai_client._client is None
+
+
+@pytest.mark.asyncio
+async def test_prompt_enhancement_uses_async_client(fake_client, monkeypatch):
+    """Test that concurrent enhancements await the shared client without a worker thread."""
+    monkeypatch.setattr(image_generation, "_prompt_cache", None)
+    monkeypatch.setattr(image_generation.constants, "PROMPT_CACHE_ENABLED", False)
+
+    def no_threads(*args, **kwargs):
+        raise AssertionError("generate_content should not run in a worker thread")
+
+    monkeypatch.setattr(image_generation.asyncio, "to_thread", no_threads)
+    results = await asyncio.gather(
+        image_generation._enhance_prompt_for_image_gen("Dice the onion"),
+        image_generation._enhance_prompt_for_image_gen("Boil the pasta"),
+    )
+    assert all(result.startswith("enhanced: ") for result in results)
+    assert len(fake_client) == 1
+    assert len(fake_client[0].calls) == 2
+    await genai_client.close_genai_client()
@@ -0,0 +1,69 @@
+"""Tests for the shared pooled HTTP client."""
+
+import httpx
+import pytest
+
+from bytemymood.shared_libraries import constants
+from bytemymood.tools import http_client
+
+
+@pytest.fixture
+def mock_transport(monkeypatch):
+    """Routes the shared client through a mock transport that records requests."""
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json={"ok": True})
+
+    monkeypatch.setattr(
+        http_client, "_build_client",
+        lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+    yield requests
+
+
+@pytest.mark.asyncio
+async def test_client_is_shared_within_loop(mock_transport):
+    """Test that repeated calls reuse the same pooled client."""
+    first = http_client.get_http_client()
+    second = http_client.get_http_client()
+    assert first is second
+    await http_client.close_http_client()
+    assert first.is_closed
+    assert http_client.get_http_client() is not first
+    await http_client.close_http_client()
+
+
+def test_client_from_previous_loop_is_closed(mock_transport):
+    """Test that a client left on a finished event loop is closed, as is the last one at exit."""
+    import asyncio
+
+    async def get():
+        client = http_client.get_http_client()
+        await asyncio.sleep(0)  # Lets the stale client's close run
+        return client
+
+    first = asyncio.run(get())
+    second = asyncio.run(get())
+    assert first.is_closed and not second.is_closed
+    http_client._close_http_client_at_exit()
+    assert second.is_closed
+
+
+@pytest.mark.asyncio
+async def test_http_get_sends_params(mock_transport):
+    """Test that http_get sends the query through the shared client."""
+    resp = await http_client.http_get("https://maps.googleapis.com/maps/api/geocode/json", params={"address": "Paris"})
+    assert resp.json() == {"ok": True}
+    assert mock_transport[0].url.params["address"] == "Paris"
+    await http_client.close_http_client()
+
+
+def test_timeout_for_uses_host_settings():
+    """Test per-host timeouts with a fallback to the default."""
+    geo = http_client.timeout_for("https://maps.googleapis.com/maps/api/geocode/json")
+    assert geo.read == constants.HTTP_HOST_TIMEOUTS["maps.googleapis.com"]
+    other = http_client.timeout_for("https://example.com/")
+    assert other.read == constants.HTTP_DEFAULT_TIMEOUT
+    assert other.connect == constants.HTTP_CONNECT_TIMEOUT
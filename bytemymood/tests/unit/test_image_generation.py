@@ -7,6 +7,7 @@ This test will generate a test image and save it locally for verification.
 import pytest
 import asyncio
 import os
+import threading
 from dotenv import load_dotenv
 from bytemymood.tools.image_generation.image_generation import _generate_image_with_gemini, _enhance_prompt_for_image_gen
 from unittest.mock import Mock
@@ -136,6 +137,235 @@ class TestImageGenerationLocal:
         
         return result
 
+@pytest.fixture
+def prompt_cache(tmp_path, monkeypatch):
+    """Points the enhanced-prompt cache at a temporary database and fakes the Gemini call."""
+    from bytemymood.shared_libraries.cache import TieredCache
+    from bytemymood.tools.image_generation import image_generation
+
+    cache = TieredCache(str(tmp_path / "prompts.sqlite3"), "enhanced_prompts", 16, ttl=60)
+    monkeypatch.setattr(image_generation, "_prompt_cache", cache)
+    monkeypatch.setattr(image_generation, "_prompt_flight", image_generation.SingleFlight())
+    calls = []
+
+    async def fake_remote(desc, cache, key):
+        calls.append(desc)
+        await asyncio.sleep(0.05)  # Long enough for the concurrent request to join the flight
+        cache.set(key, f"enhanced: {desc}")
+        return f"enhanced: {desc}"
+
+    monkeypatch.setattr(image_generation, "_enhance_prompt_remote", fake_remote)
+    return cache, calls
+
+
+@pytest.mark.asyncio
+async def test_prompt_enhancement_is_memoized(prompt_cache):
+    """Identical step descriptions are enhanced once, including concurrent requests."""
+    cache, calls = prompt_cache
+    results = await asyncio.gather(
+        _enhance_prompt_for_image_gen("Dice the onion"),
+        _enhance_prompt_for_image_gen("dice  the onion"),
+    )
+    assert results == ["enhanced: Dice the onion"] * 2
+    assert await _enhance_prompt_for_image_gen("Dice the onion") == "enhanced: Dice the onion"
+    assert calls == ["Dice the onion"]
+
+    from bytemymood.tools.image_generation.image_generation import get_prompt_cache_stats
+    stats = get_prompt_cache_stats()
+    assert stats["memory_hits"] == 1
+    assert stats["model_calls_saved"] == 2
+
+
+@pytest.mark.asyncio
+async def test_prompt_cache_respects_template_version_and_ttl(prompt_cache, monkeypatch):
+    """A new template version or an expired entry triggers a fresh enhancement."""
+    from bytemymood.tools.image_generation import image_generation_prompt
+
+    cache, calls = prompt_cache
+    await _enhance_prompt_for_image_gen("Dice the onion")
+    monkeypatch.setattr(image_generation_prompt, "ENHANCE_PROMPT_TEMPLATE_VERSION", 2)
+    await _enhance_prompt_for_image_gen("Dice the onion")
+    assert len(calls) == 2
+
+    cache.ttl = 0
+    await _enhance_prompt_for_image_gen("Dice the onion")
+    assert len(calls) == 3
+    assert cache.stats()["expired"] == 1
+
+
+def _encoded_image(image_format):
+    from io import BytesIO
+    from PIL import Image
+
+    buffer = BytesIO()
+    Image.new("RGB", (4, 4), "orange").save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def fake_image_model(monkeypatch):
+    """Makes the image model return the bytes placed in the returned list."""
+    from types import SimpleNamespace
+
+    returned = []
+
+    async def generate_content(model, contents, config):
+        part = SimpleNamespace(inline_data=SimpleNamespace(data=returned[0]))
+        return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))])
+
+    from bytemymood.tools import genai_client
+
+    client = SimpleNamespace(models=SimpleNamespace(generate_content=generate_content))
+    monkeypatch.setattr(genai_client, "get_genai_client", lambda: client)
+    return returned
+
+
+def test_sniff_image_format():
+    from bytemymood.tools.image_generation.image_generation import _sniff_image_format
+
+    assert _sniff_image_format(_encoded_image("PNG")) == "png"
+    assert _sniff_image_format(memoryview(_encoded_image("JPEG"))) == "jpeg"
+    assert _sniff_image_format(_encoded_image("WEBP")) == "webp"
+    assert _sniff_image_format(b"not an image") is None
+
+
+@pytest.mark.asyncio
+async def test_png_output_is_passed_through(fake_image_model, monkeypatch):
+    """PNG bytes from the model reach the store and artifact without being re-encoded."""
+    from bytemymood.tools.image_generation import image_generation
+
+    def no_transcode(data):
+        raise AssertionError("PNG output should not be transcoded")
+
+    monkeypatch.setattr(image_generation, "_transcode_to_png", no_transcode)
+    png = _encoded_image("PNG")
+    fake_image_model.append(png)
+    stored = {}
+    store = Mock(put=lambda key, data: stored.update({key: data}))
+    result = await image_generation._render_image("Whisk the eggs", None, store, "key")
+
+    assert isinstance(result["image_bytes"], memoryview)
+    assert result["image_bytes"].obj is png
+    assert stored["key"] is result["image_bytes"]
+    assert image_generation._as_bytes(result["image_bytes"]) is png
+
+
+@pytest.mark.asyncio
+async def test_other_formats_are_transcoded(fake_image_model):
+    """Non-PNG model output is re-encoded as PNG before it is stored."""
+    from bytemymood.tools.image_generation import image_generation
+
+    fake_image_model.append(_encoded_image("JPEG"))
+    result = await image_generation._render_image("Whisk the eggs", None, None, "key")
+    assert image_generation._sniff_image_format(result["image_bytes"]) == "png"
+
+
+class SlowArtifactContext:
+    """Tool context whose artifact save waits until the local copy has been started."""
+
+    def __init__(self, local_started, fail=False, error=None):
+        self.local_started = local_started
+        self.error = error or (RuntimeError("artifact service unavailable") if fail else None)
+
+    async def save_artifact(self, filename, artifact):
+        assert await asyncio.to_thread(self.local_started.wait, 1)
+        if self.error is not None:
+            raise self.error
+        return 1
+
+
+@pytest.fixture
+def local_saves(tmp_path, monkeypatch):
+    """Saves local copies under tmp_path and signals when a local write starts."""
+    from bytemymood.tools.image_generation import image_generation, image_store
+
+    monkeypatch.setattr(image_generation, "SAVE_IMAGES_LOCALLY", True)
+    monkeypatch.setattr(image_generation, "LOCAL_IMAGE_SAVE_PATH", str(tmp_path))
+    monkeypatch.setattr(image_store, "_local_store", image_store.ImageStore(str(tmp_path), 10_000))
+    started = threading.Event()
+    write = image_generation._write_local_copy
+
+    def signalling_write(*args):
+        started.set()
+        return write(*args)
+
+    monkeypatch.setattr(image_generation, "_write_local_copy", signalling_write)
+    return started
+
+
+def _local_copy(root, filename):
+    """Returns the bytes of the local copy saved for an artifact filename."""
+    import uuid
+    from bytemymood.tools.image_generation.image_store import image_path
+
+    key = uuid.UUID(filename[len("generated_image_"):-len(".png")]).hex
+    with open(image_path(str(root), key), "rb") as f:
+        return f.read()
+
+
+@pytest.mark.asyncio
+async def test_local_and_artifact_saves_run_concurrently(local_saves, tmp_path):
+    from bytemymood.tools.image_generation.image_generation import _image_save_func
+
+    result = await _image_save_func(memoryview(b"png"), ".png", SlowArtifactContext(local_saves))
+    assert result["artifact_version"] == 1
+    assert _local_copy(tmp_path, result["filename"]) == b"png"
+
+
+@pytest.mark.asyncio
+async def test_artifact_failure_reports_local_copy(local_saves, tmp_path):
+    from bytemymood.tools.image_generation.image_generation import _image_save_func
+
+    result = await _image_save_func(b"png", ".png", SlowArtifactContext(local_saves, fail=True))
+    assert "artifact service unavailable" in result["artifact_error"]
+    assert open(result["local_path"], "rb").read() == b"png"
+
+
+@pytest.mark.asyncio
+async def test_cancelled_artifact_save_is_not_reported_as_failure(local_saves):
+    from bytemymood.tools.image_generation.image_generation import _image_save_func
+
+    with pytest.raises(asyncio.CancelledError):
+        await _image_save_func(b"png", ".png", SlowArtifactContext(local_saves, error=asyncio.CancelledError()))
+
+
+@pytest.mark.asyncio
+async def test_local_copy_can_be_written_in_background(local_saves, tmp_path, monkeypatch):
+    from bytemymood.tools.image_generation import image_generation
+
+    monkeypatch.setattr(image_generation.constants, "LOCAL_IMAGE_SAVE_IN_BACKGROUND", True)
+    result = await image_generation._image_save_func(b"png", ".png", SlowArtifactContext(local_saves))
+    assert "queued" in result["confirmation"]
+    await image_generation.get_local_image_writes().close()
+    assert _local_copy(tmp_path, result["filename"]) == b"png"
+
+
+@pytest.mark.asyncio
+async def test_step_image_is_enhanced_and_generated_in_one_call(prompt_cache, monkeypatch):
+    """generate_step_image generates from the enhanced prompt, reusing cached enhancements."""
+    from bytemymood.tools.image_generation import image_generation
+
+    cache, calls = prompt_cache
+    generated = []
+
+    async def fake_generate(desc, tool_context):
+        generated.append(desc)
+        return {"filename": "generated_image_1.png"}
+
+    monkeypatch.setattr(image_generation, "_generate_image_with_gemini", fake_generate)
+    assert await image_generation.generate_step_image("Dice the onion", None) == {"filename": "generated_image_1.png"}
+    await image_generation.generate_step_image("Dice the onion", None)
+    assert generated == ["enhanced: Dice the onion"] * 2
+    assert calls == ["Dice the onion"]
+
+    async def failed_enhancement(desc, cache, key):
+        return None
+
+    monkeypatch.setattr(image_generation, "_enhance_prompt_remote", failed_enhancement)
+    await image_generation.generate_step_image("Boil the pasta", None)
+    assert generated[-1] == "Boil the pasta"
+
+
 # For running the test directly (not through pytest)
 async def run_manual_test():
     """Manual test runner for when pytest is not available."""
@@ -0,0 +1,134 @@
+"""Tests for the content-addressed generated-image store."""
+
+import os
+import threading
+
+import pytest
+
+from bytemymood.shared_libraries.constants import GENERATED_IMAGE_ARTIFACTS
+from bytemymood.tools.image_generation import image_generation, image_store
+from bytemymood.tools.image_generation.image_store import ImageStore, image_key
+
+
+def test_image_key_normalizes_prompt():
+    assert image_key("Chop  the onions\n", "model") == image_key("chop the onions", "model")
+    assert image_key("chop the onions", "model") != image_key("chop the onions", "other-model")
+    assert image_key("chop the onions", "model", {"seed": 1}) != image_key("chop the onions", "model")
+
+
+def test_store_round_trip(tmp_path):
+    store = ImageStore(str(tmp_path), max_bytes=1000)
+    assert store.get("ab12") is None
+    store.put("ab12", b"png")
+    assert store.get("ab12") == b"png"
+    assert os.path.exists(tmp_path / "ab" / "ab12.png")
+    assert store.stats()["hits"] == 1
+
+
+def test_store_evicts_least_recently_used(tmp_path):
+    store = ImageStore(str(tmp_path), max_bytes=10)
+    store.put("aa", b"12345")
+    store.put("bb", b"12345")
+    store.get("aa")
+    store.put("cc", b"12345")
+    assert "bb" not in store
+    assert store.get("aa") == b"12345"
+    assert not os.path.exists(tmp_path / "bb" / "bb.png")
+    assert store.stats()["bytes"] == 10
+
+
+def test_store_rebuilds_index_on_restart(tmp_path):
+    store = ImageStore(str(tmp_path), max_bytes=10)
+    store.put("aa", b"12345")
+    store.put("bb", b"12345")
+    os.utime(tmp_path / "aa" / "aa.png", (1, 1))
+    reopened = ImageStore(str(tmp_path), max_bytes=10)
+    assert reopened.stats()["bytes"] == 10
+    reopened.put("cc", b"12345")
+    assert "aa" not in reopened
+    assert reopened.get("bb") == b"12345"
+
+
+def test_sidecars_are_kept_and_evicted_with_their_image(tmp_path):
+    store = ImageStore(str(tmp_path), max_bytes=20)
+    assert store.put_sidecar("aa", "dhash", b"1") is False  # No image to attach it to
+    store.put("aa", b"12345")
+    assert store.put_sidecar("aa", "256x256q80.webp", b"123")
+    store.put("aa", b"12345")
+    assert store.get_sidecar("aa", "256x256q80.webp") == b"123"
+    assert store.stats()["bytes"] == 8
+
+    (tmp_path / "cc").mkdir()
+    (tmp_path / "cc" / "cc.dhash").write_bytes(b"orphan")
+    reopened = ImageStore(str(tmp_path), max_bytes=20)
+    assert reopened.sidecars("aa") == ["256x256q80.webp"]
+    assert reopened.stats()["bytes"] == 8
+    assert not (tmp_path / "cc" / "cc.dhash").exists()
+
+    reopened.put("bb", b"1234567890abc")
+    assert "aa" not in reopened
+    assert not (tmp_path / "aa" / "aa.256x256q80.webp").exists()
+    assert reopened.stats()["bytes"] == 13
+
+
+@pytest.mark.asyncio
+async def test_store_is_first_opened_off_the_event_loop(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_store, "_store", None)
+    monkeypatch.setattr(image_store.constants, "IMAGE_CACHE_PATH", str(tmp_path))
+    scanned_on = []
+    scan = ImageStore._scan
+
+    def recording_scan(self):
+        scanned_on.append(threading.current_thread())
+        scan(self)
+
+    monkeypatch.setattr(ImageStore, "_scan", recording_scan)
+    store = await image_store.open_image_store()
+    assert store is await image_store.open_image_store()
+    assert len(scanned_on) == 1 and scanned_on[0] is not threading.main_thread()
+
+
+@pytest.mark.asyncio
+async def test_generation_reuses_cached_image(tmp_path, make_tool_context, monkeypatch):
+    store = ImageStore(str(tmp_path), max_bytes=10_000)
+    monkeypatch.setattr(image_store, "_store", store)
+    monkeypatch.setattr(image_generation, "SAVE_IMAGES_LOCALLY", False)
+    renders = []
+
+    async def fake_render(desc, config, store, key):
+        renders.append(desc)
+        store.put(key, b"png-bytes")
+        return {"image_bytes": b"png-bytes"}
+
+    monkeypatch.setattr(image_generation, "_render_image", fake_render)
+
+    first_session, second_session = make_tool_context(), make_tool_context()
+    first = await image_generation._generate_image_with_gemini("Whisk the eggs", first_session)
+    assert first["cached"] is False
+    again = await image_generation._generate_image_with_gemini("whisk the eggs", first_session)
+    assert again["cached"] is True and again["filename"] == first["filename"]
+    assert first_session.saved == [first["filename"]]
+
+    other = await image_generation._generate_image_with_gemini("Whisk the eggs", second_session)
+    assert other["cached"] is True
+    assert len(second_session.state[GENERATED_IMAGE_ARTIFACTS]) == 1
+    assert renders == ["Whisk the eggs"]
+
+
+def test_store_reconciles_directory_on_startup(tmp_path):
+    legacy = "generated_image_0f8fad5b-d9cb-469f-a165-70867728950e.png"
+    (tmp_path / legacy).write_bytes(b"12345")
+    (tmp_path / "notes.png").write_bytes(b"1")
+    (tmp_path / "ab").mkdir()
+    (tmp_path / "ab" / "ab12.png.99.tmp").write_bytes(b"partial")
+    os.utime(tmp_path / "ab" / "ab12.png.99.tmp", (1, 1))
+    (tmp_path / "ab" / "ab34.png.98.tmp").write_bytes(b"in progress")
+
+    store = ImageStore(str(tmp_path), max_bytes=100)
+    assert "0f8fad5bd9cb469fa16570867728950e" in store
+    assert (tmp_path / "0f" / "0f8fad5bd9cb469fa16570867728950e.png").exists()
+    assert not (tmp_path / legacy).exists()
+    assert (tmp_path / "notes.png").exists()
+    assert not (tmp_path / "ab" / "ab12.png.99.tmp").exists()
+    assert (tmp_path / "ab" / "ab34.png.98.tmp").exists()
+    assert store.stats()["bytes"] == 5
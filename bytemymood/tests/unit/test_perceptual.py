@@ -0,0 +1,101 @@
+"""Tests for perceptual-hash dedupe of generated images."""
+
+import os
+import random
+from io import BytesIO
+
+import pytest
+from PIL import Image, ImageDraw
+
+from bytemymood.tools.image_generation import image_generation, perceptual
+from bytemymood.tools.image_generation.perceptual import BKTree, PerceptualIndex, dhash, hamming
+
+
+def _scene(seed, size=256):
+    """Draws a reproducible arrangement of shapes and returns it encoded."""
+    rng = random.Random(seed)
+    image = Image.new("RGB", (size, size), "white")
+    draw = ImageDraw.Draw(image)
+    for _ in range(6):
+        x, y = rng.randrange(size), rng.randrange(size)
+        r = rng.randrange(size // 8, size // 3)
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=tuple(rng.randrange(256) for _ in range(3)))
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _variant(data, size, image_format="PNG", **save_args):
+    """Returns data resized and re-encoded, as a second render of the same scene might be."""
+    buffer = BytesIO()
+    Image.open(BytesIO(data)).resize((size, size)).save(buffer, format=image_format, **save_args)
+    return buffer.getvalue()
+
+
+def test_dhash_is_stable_under_reencoding():
+    original = dhash(_scene(1))
+    assert hamming(original, dhash(_variant(_scene(1), 200, "JPEG", quality=70))) <= 4
+    assert hamming(original, dhash(_scene(2))) > 10
+
+
+def test_bk_tree_matches_brute_force():
+    rng = random.Random(0)
+    hashes = [rng.getrandbits(64) for _ in range(300)]
+    tree = BKTree()
+    for i, h in enumerate(hashes):
+        tree.add(h, i)
+    query = hashes[7] ^ 0b1011
+    expected = sorted(i for i, h in enumerate(hashes) if hamming(query, h) <= 12)
+    assert sorted(i for _, i in tree.search(query, 12)) == expected
+    assert tree.search(query, 3)[0] == (3, 7)
+
+
+def test_index_persists_and_drops_missing_keys(tmp_path):
+    path = str(tmp_path / "perceptual.sqlite3")
+    index = PerceptualIndex(path)
+    index.add("aa", 0b1111)
+    index.add("bb", 0b1111 << 40)
+    reopened = PerceptualIndex(path)
+    assert reopened.find(0b0111, 2) == ("aa", 1)
+    assert reopened.find(0b0111, 2, exists=lambda key: key != "aa") is None
+    assert len(reopened) == 1
+
+
+def test_dedupe_cli_links_duplicates(tmp_path, capsys):
+    (tmp_path / "a.png").write_bytes(_scene(1))
+    os.utime(tmp_path / "a.png", (1, 1))
+    (tmp_path / "b.jpg").write_bytes(_variant(_scene(1), 200, "JPEG", quality=70))
+    (tmp_path / "c.png").write_bytes(_scene(2))
+
+    perceptual.main(["dedupe", str(tmp_path), "--workers", "2", "--link"])
+    assert "Found 1 duplicates" in capsys.readouterr().out
+    assert os.path.samefile(tmp_path / "a.png", tmp_path / "b.jpg")
+    assert not os.path.samefile(tmp_path / "a.png", tmp_path / "c.png")
+
+
+@pytest.mark.asyncio
+async def test_near_identical_images_reuse_session_artifact(make_tool_context, monkeypatch):
+    monkeypatch.setattr(image_generation, "SAVE_IMAGES_LOCALLY", False)
+    monkeypatch.setattr(image_generation.constants, "IMAGE_DERIVATIVES_ENABLED", False)
+    context = make_tool_context()
+    first = await image_generation._save_session_image("chop", _scene(1), False, context)
+    second = await image_generation._save_session_image("dice", _variant(_scene(1), 240), False, context)
+    other = await image_generation._save_session_image("boil", _scene(2), False, context)
+
+    assert second["filename"] == first["filename"] and second["cached"] is True
+    assert "phash" not in second
+    assert other["filename"] != first["filename"]
+    assert context.saved == [first["filename"], other["filename"]]
+    assert image_generation._session_image("dice", context)["filename"] == first["filename"]
+
+
+def test_local_copies_are_deduplicated(tmp_path, monkeypatch):
+    from bytemymood.tools.image_generation import image_store
+
+    monkeypatch.setattr(image_generation, "LOCAL_IMAGE_SAVE_PATH", str(tmp_path / "images"))
+    monkeypatch.setattr(image_store, "_local_store", image_store.ImageStore(str(tmp_path / "images"), 10**7))
+    monkeypatch.setattr(perceptual, "_local_index", PerceptualIndex(str(tmp_path / "perceptual.sqlite3")))
+    first = image_generation._write_local_copy("aa" * 16, _scene(1), dhash(_scene(1)))
+    again = image_generation._write_local_copy("bb" * 16, _variant(_scene(1), 240), dhash(_variant(_scene(1), 240)))
+    assert again == first
+    assert image_store._local_store.stats()["images"] == 1
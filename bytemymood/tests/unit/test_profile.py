@@ -1,9 +1,13 @@
 """Tests for ByteMyMood user profile functionality."""
 
+import asyncio
 import unittest
 import json
 import os
+import tempfile
+from unittest import mock
 from dotenv import load_dotenv
+from google.adk.agents.callback_context import CallbackContext
 from google.adk.agents.invocation_context import InvocationContext
 from google.adk.artifacts import InMemoryArtifactService
 from google.adk.sessions import InMemorySessionService
@@ -11,7 +15,8 @@ from google.adk.tools import ToolContext
 import pytest
 
 from bytemymood.agent import root_agent
-from bytemymood.tools.memory import memorize, memorize_list, _set_initial_states, _load_user_profile
+from bytemymood.tools import memory, profile_repository
+from bytemymood.tools.memory import memorize, memorize_list, forget, _set_initial_states, _load_user_profile
 from bytemymood.shared_libraries.constants import (
     USER_PROFILE,
     ALLERGIES,
@@ -161,4 +166,136 @@ class TestByteMyMoodProfile(unittest.TestCase):
                 tool_context=self.tool_context
             )
         for item in equipment:
-            self.assertIn(item, self.tool_context.state[EQUIPMENT_AVAILABLE]) 
\ No newline at end of file
+            self.assertIn(item, self.tool_context.state[EQUIPMENT_AVAILABLE]) 
+
+class TestProfileTemplateCache(unittest.TestCase):
+    """Test cases for the cached profile template."""
+
+    def setUp(self):
+        super().setUp()
+        memory._profile_templates.clear()
+        self.addCleanup(memory._profile_templates.clear)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "profile.json")
+        self._write({"state": {"city": "Lisbon", "country": "Portugal", "allergies": ["peanuts"]}})
+        self.repository = profile_repository.ProfileRepository(
+            profile_repository.SqliteProfileBackend(":memory:"), batch_size=100, flush_interval=3600
+        )
+        patcher = mock.patch.object(profile_repository, "_repository", self.repository)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _write(self, data, mtime_ns=None):
+        with open(self.path, "w") as f:
+            json.dump(data, f)
+        if mtime_ns is not None:
+            os.utime(self.path, ns=(mtime_ns, mtime_ns))
+
+    def _callback_context(self):
+        session = session_service.create_session_sync(app_name="ByteMyMood", user_id="user123")
+        invoc_context = InvocationContext(
+            session_service=session_service,
+            invocation_id="TEST123",
+            agent=root_agent,
+            session=session,
+        )
+        return CallbackContext(invoc_context)
+
+    def test_template_read_once(self):
+        """The file is parsed once and served from memory afterwards."""
+        first = memory._get_profile_template(self.path)
+        with mock.patch("builtins.open", side_effect=AssertionError("profile re-read")):
+            self.assertIs(memory._get_profile_template(self.path), first)
+
+    def test_template_reloaded_on_mtime_change(self):
+        """A changed file is picked up once its mtime changes."""
+        self.assertEqual(memory._get_profile_template(self.path)["state"]["city"], "Lisbon")
+        self._write({"state": {"city": "Porto"}}, mtime_ns=os.stat(self.path).st_mtime_ns + 10**9)
+        with mock.patch.object(memory.constants, "PROFILE_REVALIDATE_SECONDS", 0):
+            self.assertEqual(memory._get_profile_template(self.path)["state"]["city"], "Porto")
+
+    def test_invalid_template(self):
+        """An invalid profile is rejected, but never replaces a valid one."""
+        memory._get_profile_template(self.path)
+        self._write({"state": {"allergies": "peanuts"}}, mtime_ns=os.stat(self.path).st_mtime_ns + 10**9)
+        with mock.patch.object(memory.constants, "PROFILE_REVALIDATE_SECONDS", 0):
+            self.assertEqual(memory._get_profile_template(self.path)["state"]["allergies"], ["peanuts"])
+            memory._profile_templates.clear()
+            with self.assertRaises(ValueError):
+                memory._get_profile_template(self.path)
+
+    def test_load_user_profile_shares_template(self):
+        """Sessions reference the shared template and copy a value only when it changes."""
+        self.repository.record = mock.Mock()
+        with mock.patch.object(memory, "SAMPLE_PROFILE_PATH", self.path):
+            first, second = self._callback_context(), self._callback_context()
+            asyncio.run(_load_user_profile(first))
+            asyncio.run(_load_user_profile(second))
+        self.assertTrue(first.state[USER_PROFILE])
+        self.assertIs(first.state["allergies"], second.state["allergies"])
+        with self.assertRaises(TypeError):
+            first.state["allergies"].append("shellfish")
+
+        tool_context = ToolContext(invocation_context=first._invocation_context)
+        memorize_list(key="allergies", value="shellfish", tool_context=tool_context)
+        self.assertEqual(tool_context.state["allergies"], ["peanuts", "shellfish"])
+        self.assertEqual(second.state["allergies"], ["peanuts"])
+        forget(key="allergies", value="peanuts", tool_context=tool_context)
+        self.assertEqual(tool_context.state["allergies"], ["shellfish"])
+        self.assertEqual(memory._get_profile_template(self.path)["state"]["allergies"], ["peanuts"])
+
+    def test_load_user_profile_short_circuits(self):
+        """No file I/O once the session state is initialized."""
+        context = self._callback_context()
+        context.state[USER_PROFILE] = True
+        with mock.patch("builtins.open", side_effect=AssertionError("profile read")), \
+                mock.patch("os.stat", side_effect=AssertionError("profile stat")):
+            asyncio.run(_load_user_profile(context))
+
+    def test_load_user_profile_prefers_stored_profile(self):
+        """A user's stored profile replaces the sample profile, and memorized changes are written back."""
+        self.repository.backend.save_many([("user123", {"city": "Oslo", "allergies": []})])
+        with mock.patch.object(memory, "SAMPLE_PROFILE_PATH", self.path):
+            context = self._callback_context()
+            asyncio.run(_load_user_profile(context))
+            self.assertEqual(context.state["city"], "Oslo")
+
+            tool_context = ToolContext(invocation_context=context._invocation_context)
+            memorize_list(key="allergies", value="shellfish", tool_context=tool_context)
+        self.assertEqual(self.repository.pending(), 1)
+        self.repository.flush()
+        self.assertEqual(self.repository.backend.load("user123"), {"city": "Oslo", "allergies": ["shellfish"]})
+
+    def test_new_user_changes_do_not_touch_storage(self):
+        """Once the callback has looked a new user up, the memory tools never read storage or the template file."""
+        with mock.patch.object(memory, "SAMPLE_PROFILE_PATH", self.path):
+            context = self._callback_context()
+            asyncio.run(_load_user_profile(context))
+            tool_context = ToolContext(invocation_context=context._invocation_context)
+            with mock.patch.object(self.repository.backend, "load", side_effect=AssertionError("profile loaded")), \
+                    mock.patch.object(memory.constants, "PROFILE_REVALIDATE_SECONDS", 0), \
+                    mock.patch("builtins.open", side_effect=AssertionError("profile read")), \
+                    mock.patch("os.stat", side_effect=AssertionError("profile stat")):
+                memorize(key="city", value="Porto", tool_context=tool_context)
+                memorize_list(key="allergies", value="shellfish", tool_context=tool_context)
+        self.assertEqual(self.repository.get("user123")["allergies"], ["peanuts", "shellfish"])
+
+    def test_only_durable_preferences_are_saved(self):
+        """Session-only state such as the current recipe never reaches the stored profile."""
+        with mock.patch.object(memory, "SAMPLE_PROFILE_PATH", self.path):
+            context = self._callback_context()
+            asyncio.run(_load_user_profile(context))
+            tool_context = ToolContext(invocation_context=context._invocation_context)
+            memorize(key="city", value="Porto", tool_context=tool_context)
+            memorize(key="current_mood", value="tired", tool_context=tool_context)
+            memorize_list(key="completed_steps", value="1", tool_context=tool_context)
+            self.repository.flush()
+            self.assertEqual(self.repository.backend.load("user123"), {
+                "city": "Porto", "country": "Portugal", "allergies": ["peanuts"],
+            })
+
+            later = self._callback_context()
+            asyncio.run(_load_user_profile(later))
+        self.assertEqual(later.state["city"], "Porto")
+        self.assertNotIn("current_mood", later.state)
@@ -0,0 +1,192 @@
+"""Tests for the per-user profile repository."""
+
+import os
+import threading
+
+import pytest
+
+from bytemymood.shared_libraries.journal import ADD, REMOVE, SET, apply_ops
+from bytemymood.tools.profile_repository import (
+    FileProfileBackend,
+    ProfileBackend,
+    ProfileRepository,
+    SqliteProfileBackend,
+)
+
+
+@pytest.fixture(params=["sqlite", "file"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        backend = SqliteProfileBackend(str(tmp_path / "profiles.sqlite3"), compact_after=3)
+    else:
+        backend = FileProfileBackend(str(tmp_path / "profiles"), compact_after=3)
+    yield backend
+    backend.close()
+
+
+def test_backend_round_trip(backend):
+    assert backend.load("alice") is None
+    backend.save_many([("alice", {"city": "Lisbon"}), ("bob", {"city": "Oslo"})])
+    assert backend.load("alice") == {"city": "Lisbon"}
+    assert backend.load("bob") == {"city": "Oslo"}
+
+
+def test_backend_replays_journal(backend):
+    backend.save_many([("alice", {"city": "Lisbon", "allergies": ["peanuts"]})])
+    backend.append([("alice", [(SET, "city", "Porto"), (ADD, "allergies", ["shellfish"])])])
+    assert backend.load("alice") == {"city": "Porto", "allergies": ["peanuts", "shellfish"]}
+
+
+def test_backend_compacts_journal(backend):
+    backend.save_many([("alice", {"allergies": []})])
+    backend.append([("alice", [(ADD, "allergies", ["peanuts"]), (ADD, "allergies", ["soy"])])])
+    backend.append([("alice", [(REMOVE, "allergies", ["peanuts"])])])
+    if isinstance(backend, SqliteProfileBackend):
+        assert backend._conn.execute("SELECT COUNT(*) FROM profile_journal").fetchone()[0] == 0
+    else:
+        assert not os.path.exists(backend._path("alice", ".journal"))
+    assert backend.load("alice") == {"allergies": ["soy"]}
+
+
+def test_file_backend_keeps_unsafe_ids_inside_directory(tmp_path):
+    backend = FileProfileBackend(str(tmp_path / "profiles"))
+    backend.save_many([("../escape", {"city": "Lisbon"})])
+    assert backend.load("../escape") == {"city": "Lisbon"}
+    assert os.listdir(tmp_path) == ["profiles"]
+
+
+def test_file_backend_skips_torn_journal_line(tmp_path):
+    backend = FileProfileBackend(str(tmp_path / "profiles"))
+    backend.append([("alice", [(SET, "city", "Lisbon")])])
+    with open(backend._path("alice", ".journal"), "a") as f:
+        f.write('["set", "city", "Por')
+    assert backend.load("alice") == {"city": "Lisbon"}
+
+
+def test_backend_must_implement_storage_methods():
+    class LoadOnlyBackend(ProfileBackend):
+        def load(self, user_id):
+            return None
+
+    with pytest.raises(TypeError):
+        LoadOnlyBackend()
+
+
+def test_apply_ops_leaves_input_unchanged():
+    state = {"allergies": ["peanuts"]}
+    assert apply_ops(state, [(ADD, "allergies", ["soy"])]) == {"allergies": ["peanuts", "soy"]}
+    assert state == {"allergies": ["peanuts"]}
+    with pytest.raises(ValueError):
+        apply_ops(state, [("rename", "allergies", None)])
+
+
+class CountingBackend(SqliteProfileBackend):
+    def __init__(self):
+        super().__init__(":memory:")
+        self.loads = 0
+        self.writes = []
+
+    def load(self, user_id):
+        self.loads += 1
+        return super().load(user_id)
+
+    def append(self, entries):
+        entries = list(entries)
+        self.writes.append(("append", [user_id for user_id, _ in entries]))
+        super().append(entries)
+
+    def save_many(self, profiles):
+        profiles = list(profiles)
+        self.writes.append(("snapshot", [user_id for user_id, _ in profiles]))
+        super().save_many(profiles)
+
+
+def test_hot_profiles_served_from_memory():
+    backend = CountingBackend()
+    backend.save_many([("alice", {"city": "Lisbon"}), ("bob", {"city": "Oslo"})])
+    repository = ProfileRepository(backend, cache_size=1)
+    assert repository.get("alice") == {"city": "Lisbon"}
+    assert repository.get("alice") == {"city": "Lisbon"}
+    assert backend.loads == 1
+    repository.get("bob")
+    repository.get("alice")
+    assert backend.loads == 3
+
+
+def test_missing_profile_looked_up_once():
+    backend = CountingBackend()
+    repository = ProfileRepository(backend, flush_interval=3600)
+    assert repository.get("carol") is None
+    assert repository.get("carol") is None
+    repository.record("carol", [(SET, "city", "Porto")], base={"allergies": []})
+    assert repository.get("carol") == {"city": "Porto", "allergies": []}
+    assert backend.loads == 1
+
+
+def test_changes_written_back_in_batches():
+    backend = CountingBackend()
+    backend.save_many([("alice", {"city": "Paris", "allergies": []})])
+    backend.writes.clear()
+    repository = ProfileRepository(backend, batch_size=2, flush_interval=3600)
+    repository.record("alice", [(SET, "city", "Lisbon")])
+    repository.record("alice", [(ADD, "allergies", ["peanuts"])])
+    assert backend.writes == []
+    assert repository.get("alice") == {"city": "Lisbon", "allergies": ["peanuts"]}
+
+    repository.record("bob", [(SET, "city", "Oslo")], base={"allergies": ["soy"]})
+    repository.drain()
+    assert backend.writes == [("snapshot", ["bob"]), ("append", ["alice"])]
+    assert backend.load("alice") == {"city": "Lisbon", "allergies": ["peanuts"]}
+    assert backend.load("bob") == {"city": "Oslo", "allergies": ["soy"]}
+    assert repository.pending() == 0
+
+
+def test_pending_changes_survive_eviction():
+    backend = CountingBackend()
+    backend.save_many([("alice", {"city": "Paris"})])
+    repository = ProfileRepository(backend, cache_size=1, batch_size=100, flush_interval=3600)
+    repository.record("alice", [(SET, "city", "Lisbon")])
+    repository.get("bob")
+    assert repository.get("alice") == {"city": "Lisbon"}
+    assert repository.flush() == 1
+    assert repository.flush() == 0
+    assert backend.load("alice") == {"city": "Lisbon"}
+
+
+def test_records_do_not_wait_for_background_writes():
+    backend = CountingBackend()
+    backend.save_many([("alice", {"city": "Paris"})])
+    writing, release = threading.Event(), threading.Event()
+    append = backend.append
+
+    def slow_append(entries):
+        writing.set()
+        assert release.wait(5)
+        append(entries)
+
+    backend.append = slow_append
+    repository = ProfileRepository(backend, batch_size=1, flush_interval=3600)
+    repository.record("alice", [(SET, "city", "Lisbon")])
+    assert writing.wait(5)
+    # The write is still blocked, but recording and reading carry on
+    repository.record("alice", [(ADD, "allergies", ["soy"])])
+    repository._cache.clear()
+    assert repository.get("alice") == {"city": "Lisbon", "allergies": ["soy"]}
+    release.set()
+    repository.drain()
+    repository.flush()
+    assert repository.pending() == 0
+    assert backend.load("alice") == {"city": "Lisbon", "allergies": ["soy"]}
+
+
+def test_changes_flushed_after_interval():
+    backend = CountingBackend()
+    repository = ProfileRepository(backend, batch_size=100, flush_interval=0.05)
+    repository.record("alice", [(SET, "city", "Lisbon")], base={})
+    assert backend.writes == []
+    for _ in range(100):
+        if backend.writes:
+            break
+        threading.Event().wait(0.02)
+    repository.drain()
+    assert backend.writes == [("snapshot", ["alice"])]
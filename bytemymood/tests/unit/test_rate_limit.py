@@ -0,0 +1,226 @@
+"""Tests for the client-side Gemini rate limiter."""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from google.genai import errors
+
+from bytemymood.shared_libraries import metrics
+from bytemymood.shared_libraries.rate_limit import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_INTERACTIVE,
+    AdaptiveConcurrencyLimiter,
+    CallPriority,
+    RateLimitExceeded,
+    TokenBucket,
+    call_priority,
+)
+from bytemymood.tools import genai_client
+from bytemymood.tools.image_generation import image_generation
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+@pytest.mark.asyncio
+async def test_burst_passes_then_callers_queue():
+    bucket = TokenBucket("test", rate=50, burst=2, max_queue=8, max_wait=5)
+    assert await bucket.acquire() == 0.0
+    assert await bucket.acquire() == 0.0
+    waited = await bucket.acquire()
+    assert waited > 0
+    assert metrics.get("rate_limit", bucket="test", outcome="immediate") == 2
+    assert metrics.get("rate_limit", bucket="test", outcome="queued") == 1
+
+
+@pytest.mark.asyncio
+async def test_interactive_callers_are_served_before_background():
+    bucket = TokenBucket("test", rate=50, burst=1, max_queue=8, max_wait=5)
+    await bucket.acquire()
+    order = []
+
+    async def call(name, priority):
+        with call_priority(priority):
+            await bucket.acquire()
+        order.append(name)
+
+    background = [asyncio.ensure_future(call(f"prefetch{i}", PRIORITY_BACKGROUND)) for i in range(2)]
+    await asyncio.sleep(0)
+    await asyncio.gather(call("user", PRIORITY_INTERACTIVE), *background)
+    assert order == ["user", "prefetch0", "prefetch1"]
+
+
+@pytest.mark.asyncio
+async def test_raised_priority_moves_queued_calls_ahead():
+    bucket = TokenBucket("test", rate=50, burst=1, max_queue=8, max_wait=5)
+    limiter = _limiter(initial=1, max_limit=1)
+    await bucket.acquire()
+    await limiter.acquire()
+    order = []
+
+    async def call(name, priority):
+        with call_priority(priority):
+            await bucket.acquire()
+            await limiter.acquire()
+        order.append(name)
+        limiter.release(latency=0.01)
+
+    awaited = CallPriority(PRIORITY_BACKGROUND)
+    calls = [asyncio.ensure_future(call(name, priority))
+             for name, priority in [("prefetch", PRIORITY_BACKGROUND), ("awaited", awaited)]]
+    await asyncio.sleep(0)
+    awaited.raise_to(PRIORITY_INTERACTIVE)
+    limiter.release(latency=0.01)
+    await asyncio.gather(*calls)
+    assert order == ["awaited", "prefetch"]
+
+
+@pytest.mark.asyncio
+async def test_rejects_with_estimated_wait():
+    bucket = TokenBucket("test", rate=1, burst=1, max_queue=8, max_wait=2)
+    await bucket.acquire()
+    waiters = [asyncio.ensure_future(bucket.acquire()) for _ in range(2)]
+    await asyncio.sleep(0)
+    with pytest.raises(RateLimitExceeded) as excinfo:
+        await bucket.acquire()
+    assert 2 < excinfo.value.retry_after <= 3
+    assert metrics.get("rate_limit", bucket="test", outcome="rejected") == 1
+    for waiter in waiters:
+        waiter.cancel()
+
+
+@pytest.mark.asyncio
+async def test_image_tool_reports_retry_after(monkeypatch):
+    async def busy(model, contents, config=None):
+        raise RateLimitExceeded(model, 12.3)
+
+    monkeypatch.setattr(genai_client, "generate_content", busy)
+    result = await image_generation._render_image("a pan of onions", None, None, "key")
+    assert result["retry_after_seconds"] == 12.3
+    assert "12 seconds" in result["error"]
+
+
+@pytest.mark.asyncio
+async def test_prompt_enhancement_reports_retry_after(monkeypatch):
+    async def busy(model, contents, config=None):
+        raise RateLimitExceeded(model, 7.0)
+
+    monkeypatch.setattr(genai_client, "generate_content", busy)
+    monkeypatch.setattr(image_generation, "get_prompt_cache", lambda: None)
+    result = await image_generation.enhance_image_prompt("Dice the onion")
+    assert result["retry_after_seconds"] == 7.0
+    assert "7 seconds" in result["error"]
+    step = await image_generation.generate_step_image("Dice the onion", None)
+    assert step["retry_after_seconds"] == 7.0
+
+
+def _limiter(**overrides):
+    options = dict(initial=2, min_limit=1, max_limit=4, decrease_factor=0.5,
+                   latency_spike_factor=3.0, max_queue=4, max_wait=1.0)
+    options.update(overrides)
+    return AdaptiveConcurrencyLimiter("test", **options)
+
+
+@pytest.mark.asyncio
+async def test_concurrency_limit_grows_additively_and_halves_on_overload():
+    limiter = _limiter()
+    for _ in range(4):
+        await limiter.acquire()
+        limiter.release(latency=0.1)
+    assert 3 <= limiter.limit < 4
+    await limiter.acquire()
+    limiter.release(overloaded=True)
+    assert limiter.limit < 2
+    assert metrics.get("concurrency_limit", limiter="test") == limiter.limit
+    assert metrics.get("concurrency_backoff", limiter="test", reason="error") == 1
+
+
+@pytest.mark.asyncio
+async def test_latency_spike_lowers_limit():
+    limiter = _limiter(initial=4)
+    await limiter.acquire()
+    limiter.release(latency=0.1)
+    await limiter.acquire()
+    limiter.release(latency=1.0)
+    assert limiter.limit < 3
+    assert metrics.get("concurrency_backoff", limiter="test", reason="latency") == 1
+
+
+@pytest.mark.asyncio
+async def test_limit_recovers_after_lasting_latency_rise():
+    limiter = _limiter(initial=4, min_limit=1)
+    await limiter.acquire()
+    limiter.release(latency=2.0)
+    for _ in range(200):
+        await limiter.acquire()
+        limiter.release(latency=8.0)
+    assert limiter.latency > 7.5
+    assert limiter.limit == 4
+
+
+@pytest.mark.asyncio
+async def test_waiters_get_released_slots_or_are_rejected():
+    limiter = _limiter(initial=1, max_limit=1, max_queue=1, max_wait=0.05)
+    await limiter.acquire()
+    waiter = asyncio.ensure_future(limiter.acquire())
+    await asyncio.sleep(0)
+    with pytest.raises(RateLimitExceeded):
+        await limiter.acquire()  # Queue is full
+    limiter.release(latency=0.1)
+    await waiter
+    assert limiter.in_flight == 1
+    with pytest.raises(RateLimitExceeded):
+        await limiter.acquire()  # Nothing frees up within max_wait
+    assert metrics.get("concurrency", limiter="test", outcome="rejected") == 2
+
+
+@pytest.mark.asyncio
+async def test_generate_content_retries_overloaded_calls(monkeypatch):
+    monkeypatch.setattr(genai_client, "_rate_limiters", {})
+    monkeypatch.setattr(genai_client, "_concurrency_limiters", {})
+    monkeypatch.setattr(genai_client.constants, "GENAI_RETRY_BASE_SECONDS", 0.0)
+    codes = [429, 503]
+
+    async def generate(model, contents, config=None):
+        if codes:
+            raise errors.APIError(codes.pop(0), {"error": {"message": "overloaded"}})
+        return "ok"
+
+    client = SimpleNamespace(models=SimpleNamespace(generate_content=generate))
+    monkeypatch.setattr(genai_client, "get_genai_client", lambda: client)
+    assert await genai_client.generate_content("model", "prompt") == "ok"
+    assert metrics.get("genai_retries", model="model", code=429) == 1
+    assert metrics.get("genai_retries", model="model", code=503) == 1
+    assert genai_client.get_concurrency_limiter("model").in_flight == 0
+
+    codes.extend([400])
+    with pytest.raises(errors.APIError):
+        await genai_client.generate_content("model", "prompt")
+    assert genai_client.get_concurrency_limiter("model").in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_calls_turned_away_by_concurrency_limiter_spend_no_quota(monkeypatch):
+    monkeypatch.setattr(genai_client, "_rate_limiters", {"model": TokenBucket("model", rate=1, burst=2, max_queue=8, max_wait=5)})
+    monkeypatch.setattr(genai_client, "_concurrency_limiters", {"model": _limiter(initial=1, max_limit=1, max_queue=0)})
+    limiter = genai_client.get_concurrency_limiter("model")
+    await limiter.acquire()  # Another call holds the only slot
+    with pytest.raises(RateLimitExceeded):
+        await genai_client.generate_content("model", "prompt")
+    assert genai_client.get_rate_limiter("model").stats()["tokens"] >= 2
+    assert limiter.in_flight == 1
+
+
+@pytest.mark.asyncio
+async def test_slot_freed_when_rate_limiter_rejects(monkeypatch):
+    monkeypatch.setattr(genai_client, "_rate_limiters", {"model": TokenBucket("model", rate=1, burst=1, max_queue=0, max_wait=0)})
+    monkeypatch.setattr(genai_client, "_concurrency_limiters", {})
+    await genai_client.get_rate_limiter("model").acquire()
+    with pytest.raises(RateLimitExceeded):
+        await genai_client.generate_content("model", "prompt")
+    assert genai_client.get_concurrency_limiter("model").in_flight == 0
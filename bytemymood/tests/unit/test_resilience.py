@@ -0,0 +1,76 @@
+"""Tests for circuit breaking, hedging and latency budgets."""
+
+import asyncio
+
+import pytest
+
+from bytemymood.shared_libraries import metrics
+from bytemymood.shared_libraries.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    LatencyBudget,
+    LatencyBudgetExceeded,
+    LatencyTracker,
+    hedged,
+)
+
+
+def test_circuit_breaker_opens_and_recovers(monkeypatch):
+    """Test closed -> open -> half_open -> closed transitions."""
+    clock = [100.0]
+    monkeypatch.setattr("bytemymood.shared_libraries.resilience.time.monotonic", lambda: clock[0])
+    breaker = CircuitBreaker("test-upstream", failure_threshold=2, reset_timeout=10)
+
+    breaker.before_call()
+    breaker.record_failure()
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert metrics.get("circuit_breaker_state", upstream="test-upstream") == 2
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    clock[0] += 10
+    breaker.before_call()  # trial call allowed
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()  # only one trial at a time
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert metrics.get("circuit_breaker_state", upstream="test-upstream") == 0
+
+
+def test_latency_tracker_percentile():
+    """Test percentile estimates over the sliding window."""
+    tracker = LatencyTracker(window=100)
+    assert tracker.percentile(95) is None
+    for i in range(1, 101):
+        tracker.record(i / 100)
+    assert tracker.percentile(50) == pytest.approx(0.5)
+    assert tracker.percentile(95) == pytest.approx(0.95)
+
+
+@pytest.mark.asyncio
+async def test_hedged_returns_faster_attempt():
+    """Test that a slow first attempt is overtaken by the hedge."""
+    delays = [0.5, 0.01]
+
+    async def call():
+        delay = delays.pop(0)
+        await asyncio.sleep(delay)
+        return delay
+
+    before = metrics.get("hedged_request_wins", upstream="hedge-test")
+    assert await hedged(call, 0.02, "hedge-test") == 0.01
+    assert metrics.get("hedged_request_wins", upstream="hedge-test") == before + 1
+
+
+@pytest.mark.asyncio
+async def test_latency_budget_expires():
+    """Test that work outliving the budget raises LatencyBudgetExceeded."""
+    budget = LatencyBudget(0.05, name="budget-test")
+    with pytest.raises(LatencyBudgetExceeded):
+        await budget.run(asyncio.sleep(1))
+    with pytest.raises(LatencyBudgetExceeded):
+        budget.check()
+    assert metrics.get("latency_budget_exceeded", budget="budget-test") == 2
@@ -0,0 +1,130 @@
+"""Tests for look-ahead step image generation."""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from bytemymood.shared_libraries import rate_limit
+from bytemymood.tools.image_generation import image_generation, step_pipeline
+from bytemymood.tools.image_generation.step_pipeline import StepImagePipeline
+
+
+@pytest.fixture
+def fake_prepare(monkeypatch):
+    """Replaces step preparation with jobs that finish when their step is released."""
+    started = []
+    release = {}
+
+    async def prepare(desc):
+        started.append(desc)
+        release.setdefault(desc, asyncio.Event())
+        await release[desc].wait()
+        priority = rate_limit._priority.get().value  # What a Gemini call made now would queue at
+        return {"image_bytes": b"png", "cached": False, "key": f"key-{desc}", "prompt": f"enhanced {desc}",
+                "priority": priority}
+
+    def finish(desc):
+        release.setdefault(desc, asyncio.Event()).set()
+
+    monkeypatch.setattr(step_pipeline, "_prepare_step_image", prepare)
+    return SimpleNamespace(started=started, finish=finish)
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_prefetches_current_and_next_steps_first(fake_prepare):
+    pipeline = StepImagePipeline(["s1", "s2", "s3", "s4"], lookahead=1, concurrency=1)
+    await settle()
+    assert fake_prepare.started == ["s1"]
+    fake_prepare.finish("s1")
+    await settle()
+    assert fake_prepare.started == ["s1", "s2"]
+    fake_prepare.finish("s2")
+    await settle()
+    assert fake_prepare.started == ["s1", "s2"]  # s3 is beyond the look-ahead window
+
+    result, status = await pipeline.get(2)
+    assert status == "ready" and result["prompt"] == "enhanced s2"
+    await settle()
+    assert fake_prepare.started == ["s1", "s2", "s3"]
+    pipeline.close()
+
+
+@pytest.mark.asyncio
+async def test_get_awaits_in_flight_job_or_jumps_ahead(fake_prepare):
+    pipeline = StepImagePipeline(["s1", "s2", "s3", "s4"], lookahead=1, concurrency=1)
+    await settle()
+    waiting = asyncio.ensure_future(pipeline.get(1))
+    await settle()
+    fake_prepare.finish("s1")
+    assert (await waiting)[1] == "in_flight"
+    assert fake_prepare.started.count("s1") == 1
+
+    jump = asyncio.ensure_future(pipeline.get(4))
+    await settle()
+    fake_prepare.finish("s4")
+    assert (await jump)[1] == "started"
+    with pytest.raises(ValueError):
+        await pipeline.get(5)
+    pipeline.close()
+
+
+@pytest.mark.asyncio
+async def test_awaited_prefetch_is_raised_to_interactive_priority(fake_prepare):
+    pipeline = StepImagePipeline(["s1", "s2"], lookahead=1, concurrency=2)
+    await settle()
+    waiting = asyncio.ensure_future(pipeline.get(1))
+    await settle()
+    fake_prepare.finish("s1")
+    fake_prepare.finish("s2")
+    assert (await waiting)[0]["priority"] == rate_limit.PRIORITY_INTERACTIVE
+    result, status = await pipeline.get(2)
+    assert status == "ready" and result["priority"] == rate_limit.PRIORITY_BACKGROUND
+    pipeline.close()
+
+
+@pytest.fixture
+def pipelines(monkeypatch):
+    """Starts every test with no pipelines and a short idle TTL."""
+    monkeypatch.setattr(step_pipeline, "_pipelines", step_pipeline.OrderedDict())
+    monkeypatch.setattr(step_pipeline, "_sweep_loop", None)
+    monkeypatch.setattr(step_pipeline.constants, "STEP_IMAGE_PIPELINE_IDLE_TTL_SECONDS", 0.1)
+    return step_pipeline._pipelines
+
+
+@pytest.mark.asyncio
+async def test_idle_pipelines_are_closed(fake_prepare, pipelines):
+    idle = step_pipeline.start_step_pipeline("idle", ["s1"])
+    used = step_pipeline.start_step_pipeline("used", ["s1"])
+    await asyncio.sleep(0.06)
+    assert step_pipeline.get_step_pipeline("used") is used
+    await asyncio.sleep(0.07)
+    assert list(pipelines) == ["used"]
+    assert all(worker.done() for worker in idle._workers)
+    await asyncio.sleep(0.1)
+    assert not pipelines
+    assert all(worker.done() for worker in used._workers)
+
+
+@pytest.mark.asyncio
+async def test_step_image_tools(fake_prepare, make_tool_context, monkeypatch):
+    monkeypatch.setattr(image_generation, "SAVE_IMAGES_LOCALLY", False)
+    context = make_tool_context("session-1")
+    assert "error" in await step_pipeline.get_step_image(1, context)
+
+    prepared = await step_pipeline.prepare_step_images(["Chop the onion", " ", "Fry it"], context)
+    assert prepared["steps"] == 2
+    fake_prepare.finish("Chop the onion")
+    first = await step_pipeline.get_step_image(1, context)
+    assert first["step"] == 1 and first["cached"] is False
+    assert context.saved == [first["filename"]]
+
+    again = await step_pipeline.get_step_image(1, context)
+    assert again["filename"] == first["filename"] and again["cached"] is True
+    assert len(context.saved) == 1
+    step_pipeline.get_step_pipeline("session-1").close()
@@ -14,6 +14,8 @@
 
 """Tests for ByteMyMood tools."""
 
+import json
+import pickle
 import unittest
 from dotenv import load_dotenv
 from google.adk.agents.invocation_context import InvocationContext
@@ -23,7 +25,8 @@ from google.adk.tools import ToolContext
 import pytest
 
 from bytemymood.agent import root_agent
-from bytemymood.tools.memory import memorize, memorize_list, forget
+from bytemymood.shared_libraries.indexed_list import IndexedList
+from bytemymood.tools.memory import memorize, memorize_list, memorize_many, forget, memorize_list_items, forget_list_items
 from bytemymood.tools.search import google_search_grounding
 from bytemymood.shared_libraries.constants import (
     USER_PROFILE,
@@ -140,6 +143,74 @@ class TestByteMyMoodTools(unittest.TestCase):
         self.assertIn("shellfish", self.tool_context.state[ALLERGIES])
         self.assertIn("Removed", result["status"])
 
+    def test_repeated_list_changes_do_not_copy(self):
+        """Test that only the first change to a shared profile list copies it."""
+        from unittest import mock
+        from bytemymood.shared_libraries.frozen import freeze
+        from bytemymood.tools import memory
+
+        template = freeze(["peanuts"])
+        self.tool_context.state[ALLERGIES] = template
+        with mock.patch.object(memory, "indexed_copy", wraps=memory.indexed_copy) as copies, \
+                mock.patch.object(IndexedList, "copy", side_effect=AssertionError("list copied")):
+            for i in range(50):
+                memorize_list(key=ALLERGIES, value=f"item{i}", tool_context=self.tool_context)
+            forget(key=ALLERGIES, value="item0", tool_context=self.tool_context)
+            memorize_list_items(key=ALLERGIES, values=["soy"], tool_context=self.tool_context)
+        self.assertEqual(copies.call_count, 1)
+        self.assertEqual(len(self.tool_context.state[ALLERGIES]), 51)
+        self.assertEqual(template, ["peanuts"])
+
+    def test_list_items_bulk(self):
+        """Test adding and removing many list items in one call."""
+        result = memorize_list_items(
+            key=EQUIPMENT_AVAILABLE,
+            values=["oven", "blender", "oven", "wok"],
+            tool_context=self.tool_context
+        )
+        self.assertEqual(result["added"], ["oven", "blender", "wok"])
+        self.assertEqual(self.tool_context.state[EQUIPMENT_AVAILABLE], ["oven", "blender", "wok"])
+
+        previous = self.tool_context.state[EQUIPMENT_AVAILABLE]
+        result = forget_list_items(
+            key=EQUIPMENT_AVAILABLE,
+            values=["blender", "toaster"],
+            tool_context=self.tool_context
+        )
+        self.assertEqual(result["removed"], ["blender"])
+        self.assertEqual(self.tool_context.state[EQUIPMENT_AVAILABLE], ["oven", "wok"])
+        # The session's own list is changed in place rather than copied
+        self.assertIs(previous, self.tool_context.state[EQUIPMENT_AVAILABLE])
+
+    def test_memorize_many(self):
+        """Test storing several values in one call."""
+        memorize_list(key=ALLERGIES, value="peanuts", tool_context=self.tool_context)
+        result = memorize_many(
+            updates=[
+                {"key": "city", "value": "Lisbon"},
+                {"key": "spice_tolerance", "value": "high"},
+                {"key": ALLERGIES, "values": ["shellfish", "peanuts"]},
+            ],
+            tool_context=self.tool_context
+        )
+        self.assertIn("Stored 3 values", result["status"])
+        self.assertEqual(self.tool_context.state["city"], "Lisbon")
+        self.assertEqual(self.tool_context.state["spice_tolerance"], "high")
+        self.assertEqual(self.tool_context.state[ALLERGIES], ["peanuts", "shellfish"])
+
+    def test_memorize_many_is_atomic(self):
+        """Test that an invalid update stores nothing."""
+        invalid_batches = [
+            [{"key": "city", "value": "Porto"}, {"key": ALLERGIES, "value": "peanuts"}],
+            [{"key": "city", "value": "Porto"}, {"key": "city", "value": "Faro"}],
+            [{"key": "city", "value": "Porto"}, {"key": "dislikes"}],
+            [{"key": "city", "value": "Porto"}, {"key": USER_PROFILE, "value": "false"}],
+        ]
+        for updates in invalid_batches:
+            result = memorize_many(updates=updates, tool_context=self.tool_context)
+            self.assertIn("error", result)
+            self.assertNotIn("city", self.tool_context.state)
+
     def test_google_search_grounding(self):
         """Test Google search grounding tool."""
         # Test recipe search
@@ -159,3 +230,37 @@ class TestByteMyMoodTools(unittest.TestCase):
         self.assertIsInstance(result, list)
         self.assertTrue(len(result) > 0)
         self.assertIsInstance(result[0], str)
+
+
+class TestIndexedList(unittest.TestCase):
+    """Test cases for the set-indexed list used by the list memory tools."""
+
+    def test_dedupes_in_insertion_order(self):
+        items = IndexedList(["b", "a", "b"])
+        self.assertEqual(items, ["b", "a"])
+        self.assertFalse(items.add("a"))
+        self.assertTrue(items.add("c"))
+        self.assertEqual(items.discard_many(["a", "x"]), ["a"])
+        self.assertEqual(items, ["b", "c"])
+        self.assertNotIn("a", items)
+
+    def test_serializes_as_plain_list(self):
+        items = IndexedList(["salt", "pepper"])
+        self.assertEqual(json.dumps(items), '["salt", "pepper"]')
+        restored = pickle.loads(pickle.dumps(items))
+        self.assertIsInstance(restored, IndexedList)
+        self.assertIn("pepper", restored)
+
+    def test_copy_is_independent(self):
+        items = IndexedList(["salt"])
+        clone = items.copy()
+        clone.add("pepper")
+        self.assertNotIn("pepper", items)
+        with self.assertRaises(TypeError):
+            items[0] = "sugar"
+
+    def test_unhashable_values(self):
+        items = IndexedList([{"name": "flour"}, {"name": "flour"}])
+        self.assertEqual(len(items), 1)
+        self.assertTrue(items.discard({"name": "flour"}))
+        self.assertEqual(items, [])
@@ -5,8 +5,72 @@ This test calls the real APIs and checks for the presence of required fields.
 
 import pytest
 import asyncio
+import httpx
+import json
+import threading
+from bytemymood.shared_libraries import constants
+from bytemymood.shared_libraries.cache import LRUCache, SingleFlight, TieredCache
+from bytemymood.tools import http_client, weather
 from bytemymood.tools.weather import get_current_weather
 
+GEOCODE_RESPONSE = {
+    "results": [{
+        "geometry": {"location": {"lat": 48.8566, "lng": 2.3522}},
+        "address_components": [
+            {"long_name": "Paris", "short_name": "Paris", "types": ["locality", "political"]},
+            {"long_name": "France", "short_name": "FR", "types": ["country", "political"]},
+        ],
+    }]
+}
+WEATHER_RESPONSE = {
+    "temperature": {"degrees": 12.5},
+    "feelsLikeTemperature": {"degrees": 10.0},
+    "weatherCondition": {"type": "RAIN", "description": {"text": "Light rain"}},
+    "relativeHumidity": 80,
+    "wind": {"speed": {"value": 14}},
+    "precipitation": {"probability": {"percent": 70}},
+    "isDaytime": True,
+    "uvIndex": 1,
+}
+
+
+def _json_response(payload):
+    """Builds a streamed response so that httpx records `elapsed` like a real request."""
+    return httpx.Response(200, stream=httpx.ByteStream(json.dumps(payload).encode()))
+
+
+@pytest.fixture
+def mock_google_apis(monkeypatch, tmp_path):
+    """Serves canned geocoding/weather responses and isolates the caches."""
+    calls = {"geocode": 0, "weather": 0}
+
+    def handler(request):
+        if request.url.host == "maps.googleapis.com":
+            calls["geocode"] += 1
+            if request.url.params["address"].startswith("Atlantis"):
+                return _json_response({"results": []})
+            return _json_response(GEOCODE_RESPONSE)
+        calls["weather"] += 1
+        if calls.get("weather_down"):
+            return httpx.Response(503)
+        return _json_response(WEATHER_RESPONSE)
+
+    monkeypatch.setattr(weather, "GOOGLE_GEOCODING_API_KEY", "test-key")
+    monkeypatch.setattr(weather, "GOOGLE_WEATHER_API_KEY", "test-key")
+    monkeypatch.setattr(
+        http_client, "_build_client",
+        lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+    monkeypatch.setattr(constants, "GEOCODE_CACHE_PATH", str(tmp_path / "geocode.sqlite3"))
+    monkeypatch.setattr(constants, "GAZETTEER_ENABLED", False)
+    monkeypatch.setattr(weather, "_geocode_cache", None)
+    monkeypatch.setattr(weather, "_weather_cache", LRUCache(16))
+    monkeypatch.setattr(weather, "_weather_flight", SingleFlight())
+    monkeypatch.setattr(weather, "_geocode_flight", SingleFlight())
+    monkeypatch.setattr(http_client, "_breakers", {})
+    monkeypatch.setattr(http_client, "_latencies", {})
+    yield calls
+
 @pytest.mark.asyncio
 async def test_get_current_weather_success():
     """Test real weather data retrieval via Google APIs."""
@@ -23,6 +87,195 @@ async def test_get_current_weather_success():
     for field in expected_fields:
         assert field in cw
 
+@pytest.mark.asyncio
+async def test_geocode_cache_skips_repeat_lookups(mock_google_apis):
+    """Test that a normalized city/country is only geocoded once."""
+    first = await get_current_weather("Paris", "FR")
+    second = await get_current_weather("  paris ", "fr")
+
+    assert first["weather_status"] == "success"
+    assert second["location"]["city"] == "Paris"
+    assert second["location"]["country"] == "FR"
+    assert mock_google_apis["geocode"] == 1
+    stats = weather.get_geocode_cache_stats()
+    assert stats["memory_hits"] == 1
+    assert stats["misses"] == 1
+    await http_client.close_http_client()
+
+
+@pytest.mark.asyncio
+async def test_geocode_cache_survives_restart(mock_google_apis):
+    """Test that geocoded locations are read back from the SQLite tier."""
+    await get_current_weather("Paris", "FR")
+    weather.get_geocode_cache().close()
+
+    restarted = TieredCache(constants.GEOCODE_CACHE_PATH, "geocode")
+    cached = restarted.get(weather.normalize_location_key("Paris", "FR"))
+    assert cached == {"lat": 48.8566, "lon": 2.3522, "city": "Paris", "country": "FR"}
+    assert restarted.stats()["disk_hits"] == 1
+    restarted.close()
+    await http_client.close_http_client()
+
+
+@pytest.mark.asyncio
+async def test_geocode_cache_is_used_off_the_event_loop(mock_google_apis, monkeypatch):
+    """Test that the SQLite-backed geocode cache is never read or written on the event loop."""
+    threads = []
+    for name in ("get", "set"):
+        original = getattr(TieredCache, name)
+
+        def recording(self, *args, _original=original, **kwargs):
+            threads.append(threading.current_thread())
+            return _original(self, *args, **kwargs)
+
+        monkeypatch.setattr(TieredCache, name, recording)
+    await get_current_weather("Paris", "FR")
+    await get_current_weather("Paris", "FR")
+    assert len(threads) >= 2
+    assert threading.main_thread() not in threads
+    await http_client.close_http_client()
+
+
+def test_geohash_known_value():
+    """Test geohash encoding against a published reference point."""
+    assert weather.geohash(57.64911, 10.40744, 11) == "u4pruydqqvj"
+
+
+@pytest.mark.asyncio
+async def test_weather_cache_reports_age(mock_google_apis, monkeypatch):
+    """Test that a second lookup in the same grid cell is served from cache."""
+    first = await get_current_weather("Paris", "FR")
+    second = await get_current_weather("Paris", "FR")
+
+    assert mock_google_apis["weather"] == 1
+    assert first["verification_details"]["cached"] is False
+    assert second["verification_details"]["cached"] is True
+    assert second["verification_details"]["is_current"] is True
+    assert second["current_weather"] == first["current_weather"]
+
+    # Once the TTL has passed the entry is refetched rather than served stale
+    monkeypatch.setattr(constants, "WEATHER_CACHE_TTL_SECONDS", -1)
+    third = await get_current_weather("Paris", "FR")
+    assert third["verification_details"]["cached"] is False
+    assert mock_google_apis["weather"] == 2
+    await http_client.close_http_client()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_lookups_are_coalesced(mock_google_apis):
+    """Test that identical concurrent lookups share one upstream request."""
+    await weather._geocode("Paris", "FR")
+    results = await asyncio.gather(*(get_current_weather("Paris", "FR") for _ in range(5)))
+
+    assert all(r["weather_status"] == "success" for r in results)
+    assert mock_google_apis["weather"] == 1
+    assert weather.get_weather_cache_stats()["coalesced"] == 4
+    await http_client.close_http_client()
+
+
+@pytest.mark.asyncio
+async def test_batch_lookup_dedupes_and_isolates_errors(mock_google_apis):
+    """Test that batch lookups dedupe locations and report failures per item."""
+    locations = [("Paris", "FR"), ("paris", "fr"), ("Atlantis", None), ("Paris", "FR")]
+    seen = [item async for item in weather.iter_current_weather(locations, concurrency=2)]
+
+    assert len(seen) == 2
+    by_city = {item["city"]: item["result"] for item in seen}
+    assert by_city["Paris"]["weather_status"] == "success"
+    assert "error" in by_city["Atlantis"]
+
+    summary = await weather.get_current_weather_batch(locations)
+    assert summary["failed"] == 1
+    assert len(summary["results"]) == 2
+    await http_client.close_http_client()
+
+
+@pytest.mark.asyncio
+async def test_gazetteer_hit_skips_geocoding(mock_google_apis, monkeypatch):
+    """Test that cities in the offline gazetteer never reach the geocoder."""
+    monkeypatch.setattr(constants, "GAZETTEER_ENABLED", True)
+    result = await get_current_weather("Paris", "France")
+
+    assert result["weather_status"] == "success"
+    assert result["location"]["country"] == "FR"
+    assert mock_google_apis["geocode"] == 0
+    assert mock_google_apis["weather"] == 1
+    await http_client.close_http_client()
+
+
+@pytest.mark.asyncio
+async def test_open_circuit_serves_last_cached_weather(mock_google_apis, monkeypatch):
+    """Test that an unhealthy upstream trips the breaker and stale data is served."""
+    monkeypatch.setattr(constants, "CIRCUIT_BREAKER_FAILURE_THRESHOLD", 1)
+    await get_current_weather("Paris", "FR")
+    monkeypatch.setattr(constants, "WEATHER_CACHE_TTL_SECONDS", -1)
+    mock_google_apis["weather_down"] = True
+
+    degraded = await get_current_weather("Paris", "FR")
+    assert degraded["weather_status"] == "success"
+    assert degraded["verification_details"]["cached"] is True
+    assert degraded["verification_details"]["is_current"] is False
+    assert "fallback_reason" in degraded["verification_details"]
+    assert http_client.get_circuit_breaker("weather.googleapis.com").state == "open"
+
+    # While the circuit is open the upstream is not called at all
+    calls_before = mock_google_apis["weather"]
+    again = await get_current_weather("Paris", "FR")
+    assert "open" in again["verification_details"]["fallback_reason"]
+    assert mock_google_apis["weather"] == calls_before
+    await http_client.close_http_client()
+
+
+@pytest.mark.asyncio
+async def test_prefetch_is_shared_across_sessions(mock_google_apis):
+    """Test that sessions prefetching the same city share one request and warm the cache."""
+    assert weather.start_weather_prefetch("session-a", "Paris", "FR")
+    assert weather.start_weather_prefetch("session-b", " paris", "fr")
+    assert len(weather._prefetch_tasks) == 1
+    await next(iter(weather._prefetch_tasks.values()))
+
+    result = await get_current_weather("Paris", "FR")
+    assert result["verification_details"]["cached"] is True
+    assert mock_google_apis["geocode"] == 1
+    assert mock_google_apis["weather"] == 1
+    assert not weather._prefetch_tasks and not weather._session_prefetch
+    await http_client.close_http_client()
+
+
+@pytest.mark.asyncio
+async def test_prefetch_cancelled_when_last_session_ends(mock_google_apis):
+    """Test that a prefetch survives until every interested session has ended."""
+    weather.start_weather_prefetch("session-a", "Paris", "FR")
+    weather.start_weather_prefetch("session-b", "Paris", "FR")
+    task = next(iter(weather._prefetch_tasks.values()))
+
+    weather.cancel_weather_prefetch("session-a")
+    assert not task.cancelled()
+    weather.cancel_weather_prefetch("session-b")
+    await asyncio.sleep(0)
+    assert task.cancelled()
+    assert mock_google_apis["weather"] == 0
+    assert not weather._prefetch_tasks and not weather._prefetch_sessions
+
+
+@pytest.mark.asyncio
+async def test_prefetch_released_when_session_goes_idle(mock_google_apis, monkeypatch):
+    """Test that a prefetch outlives the turn and is released only once its session is idle."""
+    weather.start_weather_prefetch("session-a", "Paris", "FR")
+    task = next(iter(weather._prefetch_tasks.values()))
+    weather.start_weather_prefetch("session-b", "Lyon", "FR")
+    assert not task.cancelled()
+
+    monkeypatch.setattr(weather.constants, "WEATHER_PREFETCH_SESSION_TTL_SECONDS", 0)
+    weather.start_weather_prefetch("session-b", "Lyon", "FR")
+    await asyncio.sleep(0)
+    assert task.cancelled()
+    assert "session-a" not in weather._session_prefetch
+    weather.cancel_weather_prefetch("session-b")
+    await asyncio.sleep(0)
+    assert not weather._prefetch_tasks and not weather._session_seen
+
+
 if __name__ == "__main__":
     asyncio.run(test_get_current_weather_success())
     print("Weather API tool integration tests completed!") 
\ No newline at end of file
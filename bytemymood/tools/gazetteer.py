@@ -0,0 +1,221 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Offline gazetteer for resolving common cities without a network round trip.
+
+The city table is a UTF-8 TSV sorted by its "city,cc" key:
+    key<TAB>city<TAB>country_code<TAB>lat<TAB>lon<TAB>population
+It is memory-mapped and searched in place with a binary search over line
+boundaries, so the sorted keys act as a flattened prefix index: opening the
+table costs one mmap, and each lookup touches only a few pages.
+
+Build a larger table from a GeoNames export (e.g. cities15000.txt) with:
+    python -m bytemymood.tools.gazetteer build cities15000.txt gazetteer.tsv
+"""
+
+import logging
+import mmap
+import os
+import re
+import sys
+import threading
+import unicodedata
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from bytemymood.shared_libraries import constants
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+DEFAULT_GAZETTEER_PATH = os.path.join(DATA_DIR, "gazetteer.tsv")
+DEFAULT_COUNTRIES_PATH = os.path.join(DATA_DIR, "countries.tsv")
+
+
+def normalize_name(text: Optional[str]) -> str:
+    """Case-folds, strips accents and punctuation, and collapses whitespace."""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r"[^\w\s-]", " ", text.casefold())
+    return " ".join(text.split())
+
+
+class Gazetteer:
+    """A memory-mapped, sorted city table with exact and prefix lookups."""
+
+    def __init__(self, path: str, countries_path: Optional[str] = None):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._countries = _load_countries(countries_path) if countries_path else {}
+
+    def close(self) -> None:
+        self._mm.close()
+        self._file.close()
+
+    def country_code(self, country: Optional[str]) -> Optional[str]:
+        """Maps an ISO 3166-1 alpha-2 code or a known country name to its code."""
+        name = normalize_name(country)
+        if not name:
+            return None
+        if name in self._countries:
+            return self._countries[name]
+        return name.upper() if len(name) == 2 else None
+
+    def lookup(self, city: str, country: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Resolves a city to coordinates. Without a country, the most populous
+        city of that name wins.
+
+        Returns:
+            A dict with lat, lon, city and country, or None if the city is not in the table.
+        """
+        name = normalize_name(city)
+        if not name:
+            return None
+        if country:
+            code = self.country_code(country)
+            if code is None:
+                return None
+            rows = self._scan(f"{name},{code.lower()}", exact=True)
+        else:
+            rows = self._scan(f"{name},", exact=False)
+        best = max(rows, key=lambda row: row[5], default=None)
+        if best is None:
+            return None
+        return {"lat": best[3], "lon": best[4], "city": best[1], "country": best[2]}
+
+    def complete(self, prefix: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Returns up to `limit` cities whose normalized name starts with prefix, most populous first."""
+        rows = sorted(self._scan(normalize_name(prefix), exact=False), key=lambda row: -row[5])
+        return [{"lat": r[3], "lon": r[4], "city": r[1], "country": r[2]} for r in rows[:limit]]
+
+    def _scan(self, key: str, exact: bool) -> Iterator[Tuple[str, str, str, float, float, int]]:
+        """Yields parsed rows whose key equals (or starts with) the given key."""
+        needle = key.encode("utf-8")
+        pos = self._lower_bound(needle)
+        mm = self._mm
+        size = len(mm)
+        while pos < size:
+            end = mm.find(b"\n", pos)
+            if end == -1:
+                end = size
+            line = mm[pos:end]
+            row_key = line.split(b"\t", 1)[0]
+            matches = row_key == needle if exact else row_key.startswith(needle)
+            if not matches:
+                return
+            fields = line.decode("utf-8").split("\t")
+            yield (fields[0], fields[1], fields[2], float(fields[3]), float(fields[4]), int(fields[5]))
+            pos = end + 1
+
+    def _lower_bound(self, needle: bytes) -> int:
+        """Returns the offset of the first line whose key is >= needle."""
+        mm = self._mm
+        lo, hi = 0, len(mm)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = mm.rfind(b"\n", 0, mid) + 1
+            end = mm.find(b"\n", start)
+            if end == -1:
+                end = len(mm)
+            if mm[start:end].split(b"\t", 1)[0] < needle:
+                lo = end + 1
+            else:
+                hi = start
+        return lo
+
+
+def _load_countries(path: str) -> Dict[str, str]:
+    """Reads "CC<TAB>Name|Alias|..." lines into a normalized-name -> code mapping."""
+    countries = {}
+    if not os.path.exists(path):
+        return countries
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            code, _, names = line.rstrip("\n").partition("\t")
+            for name in names.split("|"):
+                countries[normalize_name(name)] = code.upper()
+    return countries
+
+
+_gazetteer: Optional[Gazetteer] = None
+_gazetteer_lock = threading.Lock()
+_gazetteer_unavailable = False
+
+
+def get_gazetteer() -> Optional[Gazetteer]:
+    """Returns the shared gazetteer, opening it on first use. None if disabled or missing."""
+    global _gazetteer, _gazetteer_unavailable
+    if not constants.GAZETTEER_ENABLED or _gazetteer_unavailable:
+        return None
+    if _gazetteer is None:
+        with _gazetteer_lock:
+            if _gazetteer is None:
+                path = constants.GAZETTEER_PATH or DEFAULT_GAZETTEER_PATH
+                try:
+                    _gazetteer = Gazetteer(path, DEFAULT_COUNTRIES_PATH)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Offline gazetteer unavailable ({path}): {e}")
+                    _gazetteer_unavailable = True
+                    return None
+    return _gazetteer
+
+
+def lookup_city(city: str, country: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Resolves a city from the offline gazetteer, or returns None on a miss."""
+    gazetteer = get_gazetteer()
+    return gazetteer.lookup(city, country) if gazetteer else None
+
+
+def write_gazetteer(rows: Iterable[Tuple[str, str, float, float, int]], out_path: str) -> int:
+    """
+    Writes (city, country_code, lat, lon, population) rows as a sorted gazetteer table.
+    When a key appears more than once, the most populous row is kept.
+
+    Returns:
+        The number of rows written.
+    """
+    best: Dict[bytes, Tuple[str, str, float, float, int]] = {}
+    for city, code, lat, lon, population in rows:
+        key = f"{normalize_name(city)},{code.lower()}".encode("utf-8")
+        if key not in best or population > best[key][4]:
+            best[key] = (city, code.upper(), lat, lon, population)
+    with open(out_path, "wb") as f:
+        for key in sorted(best):
+            city, code, lat, lon, population = best[key]
+            f.write(key + f"\t{city}\t{code}\t{lat:.4f}\t{lon:.4f}\t{population}\n".encode("utf-8"))
+    return len(best)
+
+
+def read_geonames(path: str) -> Iterator[Tuple[str, str, float, float, int]]:
+    """Reads a GeoNames cities export into write_gazetteer rows."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 15:
+                continue
+            yield fields[1], fields[8], float(fields[4]), float(fields[5]), int(fields[14] or 0)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 3 or argv[0] != "build":
+        print("Usage: python -m bytemymood.tools.gazetteer build <geonames.txt> <out.tsv>")
+        sys.exit(1)
+    count = write_gazetteer(read_geonames(argv[1]), argv[2])
+    print(f"Wrote {count} cities to {argv[2]}")
+
+
+if __name__ == "__main__":
+    main()
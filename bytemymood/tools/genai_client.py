@@ -0,0 +1,181 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Process-wide async GenAI client shared by the tools that call Gemini directly.
+Requests go through the SDK's native async surface (client.aio), so a
+multi-second generation waits on the event loop rather than holding a
+worker thread, and every call reuses the same pooled connections.
+
+generate_content also passes each call through a per-model token bucket,
+so bursts from many sessions queue client-side instead of running into
+the model's quota, and an adaptive concurrency limit that backs off when
+the model starts answering with 429s, 5xx errors or unusually slowly.
+Overloaded calls are retried with jittered exponential backoff.
+"""
+
+import asyncio
+import atexit
+import logging
+import random
+import time
+from typing import Any, Dict, Optional
+
+from google import genai
+from google.genai import errors, types
+from google.genai.client import AsyncClient
+
+from bytemymood.shared_libraries import constants, metrics
+from bytemymood.shared_libraries.lifecycle import close_at_exit, close_stale
+from bytemymood.shared_libraries.rate_limit import AdaptiveConcurrencyLimiter, TokenBucket
+
+logger = logging.getLogger(__name__)
+
+_client: Optional[genai.Client] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+_rate_limiters: Dict[str, TokenBucket] = {}
+_concurrency_limiters: Dict[str, AdaptiveConcurrencyLimiter] = {}
+
+
+def _build_client() -> genai.Client:
+    """Creates a new client. The API key and backend are read from the environment."""
+    logger.info("Creating shared GenAI client")
+    return genai.Client()
+
+
+def get_genai_client() -> AsyncClient:
+    """
+    Returns the async surface of the shared GenAI client, creating it on first use.
+    Pooled connections belong to the event loop that opened them, so a new
+    client is created if the running loop has changed since the last call.
+    """
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client_loop is not loop:
+        if _client is not None:
+            logger.debug("Event loop changed; closing GenAI client bound to the previous loop.")
+            _close_stale(_client, _client_loop)
+        _client = _build_client()
+        _client_loop = loop
+    return _client.aio
+
+
+def _close_stale(client: genai.Client, loop: Optional[asyncio.AbstractEventLoop]) -> None:
+    aclose = getattr(client.aio, "aclose", None)
+    if aclose is not None:
+        close_stale(aclose, loop, "GenAI client")
+
+
+async def close_genai_client() -> None:
+    """Closes the shared client and its pooled connections. Safe to call more than once."""
+    global _client, _client_loop
+    client, _client, _client_loop = _client, None, None
+    if client is None:
+        return
+    aclose = getattr(client.aio, "aclose", None)
+    if aclose is not None:
+        await aclose()
+    logger.info("Closed shared GenAI client.")
+
+
+def _close_genai_client_at_exit() -> None:
+    if _client is not None:
+        close_at_exit(close_genai_client, _client_loop, "GenAI client")
+
+
+atexit.register(_close_genai_client_at_exit)
+
+
+def get_rate_limiter(model: str) -> TokenBucket:
+    """Returns the token bucket for a model, creating it from GENAI_RATE_LIMITS on first use."""
+    if model not in _rate_limiters:
+        requests_per_minute, burst = constants.GENAI_RATE_LIMITS.get(model, constants.GENAI_DEFAULT_RATE_LIMIT)
+        _rate_limiters[model] = TokenBucket(
+            model,
+            rate=requests_per_minute / 60,
+            burst=burst,
+            max_queue=constants.GENAI_RATE_LIMIT_MAX_QUEUE,
+            max_wait=constants.GENAI_RATE_LIMIT_MAX_WAIT_SECONDS,
+        )
+    return _rate_limiters[model]
+
+
+def get_concurrency_limiter(model: str) -> AdaptiveConcurrencyLimiter:
+    """Returns the adaptive concurrency limiter for a model, creating it on first use."""
+    if model not in _concurrency_limiters:
+        _concurrency_limiters[model] = AdaptiveConcurrencyLimiter(
+            model,
+            initial=constants.GENAI_CONCURRENCY_INITIAL,
+            min_limit=constants.GENAI_CONCURRENCY_MIN,
+            max_limit=constants.GENAI_CONCURRENCY_MAX,
+            decrease_factor=constants.GENAI_CONCURRENCY_DECREASE_FACTOR,
+            latency_spike_factor=constants.GENAI_LATENCY_SPIKE_FACTOR,
+            max_queue=constants.GENAI_RATE_LIMIT_MAX_QUEUE,
+            max_wait=constants.GENAI_RATE_LIMIT_MAX_WAIT_SECONDS,
+        )
+    return _concurrency_limiters[model]
+
+
+def _is_overload(error: errors.APIError) -> bool:
+    """True for errors that mean the upstream is over capacity rather than that the request is bad."""
+    return error.code == 429 or error.code >= 500
+
+
+def _backoff(attempt: int) -> float:
+    """Returns a full-jitter delay before retry number attempt (starting at 0)."""
+    return random.uniform(0, min(constants.GENAI_RETRY_MAX_SECONDS, constants.GENAI_RETRY_BASE_SECONDS * 2**attempt))
+
+
+async def generate_content(
+    model: str, contents: Any, config: Optional[types.GenerateContentConfig] = None
+) -> types.GenerateContentResponse:
+    """
+    Calls generate_content on the shared client once the model's rate and
+    concurrency limiters let it through, retrying calls the upstream rejects
+    as overloaded up to GENAI_MAX_ATTEMPTS times.
+
+    Raises:
+        RateLimitExceeded: If the call would have to wait longer than GENAI_RATE_LIMIT_MAX_WAIT_SECONDS.
+        errors.APIError: If the upstream rejects the call, or is still overloaded after the last attempt.
+    """
+    limiter = get_concurrency_limiter(model)
+    attempt = 0
+    while True:
+        # A slot is taken before a token so that a call the concurrency limiter turns away does not spend quota.
+        await limiter.acquire()
+        try:
+            waited = await get_rate_limiter(model).acquire()
+        except BaseException:
+            limiter.release()
+            raise
+        if waited:
+            logger.debug(f"Waited {waited:.1f}s for the {model} rate limiter")
+        started = time.monotonic()
+        try:
+            response = await get_genai_client().models.generate_content(model=model, contents=contents, config=config)
+        except errors.APIError as e:
+            overloaded = _is_overload(e)
+            limiter.release(overloaded=overloaded)
+            if not overloaded or attempt == constants.GENAI_MAX_ATTEMPTS - 1:
+                raise
+            delay = _backoff(attempt)
+            metrics.increment("genai_retries", model=model, code=e.code)
+            logger.warning(f"{model} returned {e.code}; retrying in {delay:.1f}s (attempt {attempt + 2})")
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+        except BaseException:
+            limiter.release()
+            raise
+        limiter.release(time.monotonic() - started)
+        return response
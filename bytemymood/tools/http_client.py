@@ -0,0 +1,187 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Process-wide pooled async HTTP client shared by every outbound HTTP tool.
+Keeps connections alive between tool calls so repeated requests to the same
+host skip the TCP/TLS handshake.
+"""
+
+import asyncio
+import atexit
+import logging
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from bytemymood.shared_libraries import constants, metrics
+from bytemymood.shared_libraries.lifecycle import close_at_exit, close_stale
+from bytemymood.shared_libraries.resilience import (
+    CircuitBreaker,
+    LatencyBudget,
+    LatencyTracker,
+    hedged,
+)
+
+logger = logging.getLogger(__name__)
+
+_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+_breakers: Dict[str, CircuitBreaker] = {}
+_latencies: Dict[str, LatencyTracker] = {}
+
+
+def _http2_available() -> bool:
+    """Returns True if the optional 'h2' package needed for HTTP/2 is installed."""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _build_client() -> httpx.AsyncClient:
+    """Creates a new pooled client from the settings in constants."""
+    http2 = constants.HTTP_ENABLE_HTTP2 and _http2_available()
+    if constants.HTTP_ENABLE_HTTP2 and not http2:
+        logger.warning("HTTP/2 requested but the 'h2' package is not installed; using HTTP/1.1.")
+    limits = httpx.Limits(
+        max_connections=constants.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=constants.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=constants.HTTP_KEEPALIVE_EXPIRY,
+    )
+    logger.info(f"Creating shared HTTP client (http2={http2}, max_connections={constants.HTTP_MAX_CONNECTIONS})")
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=limits,
+        timeout=httpx.Timeout(constants.HTTP_DEFAULT_TIMEOUT, connect=constants.HTTP_CONNECT_TIMEOUT),
+    )
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Returns the shared HTTP client, creating it on first use.
+    Pooled connections belong to the event loop that opened them, so a new
+    client is created if the running loop has changed since the last call.
+    """
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        if _client is not None and not _client.is_closed:
+            logger.debug("Event loop changed; closing HTTP client bound to the previous loop.")
+            close_stale(_client.aclose, _client_loop, "HTTP client")
+        _client = _build_client()
+        _client_loop = loop
+    return _client
+
+
+def timeout_for(url: str, budget: Optional[LatencyBudget] = None) -> httpx.Timeout:
+    """
+    Returns the configured timeout for the host of the given URL,
+    capped by whatever is left of the caller's latency budget.
+    """
+    host = urlsplit(url).hostname or ""
+    seconds = constants.HTTP_HOST_TIMEOUTS.get(host, constants.HTTP_DEFAULT_TIMEOUT)
+    if budget is not None:
+        seconds = min(seconds, budget.check())
+    return httpx.Timeout(seconds, connect=min(seconds, constants.HTTP_CONNECT_TIMEOUT))
+
+
+def get_circuit_breaker(host: str) -> CircuitBreaker:
+    """Returns the circuit breaker for an upstream host, creating it on first use."""
+    if host not in _breakers:
+        _breakers[host] = CircuitBreaker(
+            host,
+            failure_threshold=constants.CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+            reset_timeout=constants.CIRCUIT_BREAKER_RESET_SECONDS,
+        )
+    return _breakers[host]
+
+
+def _hedge_delay(host: str) -> Optional[float]:
+    """Returns how long to wait before hedging a request to host, or None to not hedge."""
+    tracker = _latencies.get(host)
+    if not constants.HTTP_HEDGE_ENABLED or tracker is None or len(tracker) < constants.HTTP_HEDGE_MIN_SAMPLES:
+        return None
+    return tracker.percentile(constants.HTTP_HEDGE_PERCENTILE)
+
+
+async def http_get(
+    url: str,
+    params: Optional[Dict[str, Any]] = None,
+    budget: Optional[LatencyBudget] = None,
+    **kwargs,
+) -> httpx.Response:
+    """
+    Sends a GET request through the shared client.
+    The request is rejected immediately while the host's circuit breaker is open,
+    and may be hedged with a second attempt once it is slower than the configured
+    latency percentile.
+
+    Args:
+        url: The URL to request.
+        params: Optional query parameters.
+        budget: Optional overall latency budget that caps the request timeout.
+        **kwargs: Extra arguments passed to httpx.AsyncClient.get.
+
+    Returns:
+        The httpx response.
+
+    Raises:
+        CircuitOpenError: If the host's circuit is open.
+        LatencyBudgetExceeded: If the budget is already spent.
+    """
+    host = urlsplit(url).hostname or ""
+    kwargs.setdefault("timeout", timeout_for(url, budget))
+    breaker = get_circuit_breaker(host)
+    breaker.before_call()
+    client = get_http_client()
+    started = time.monotonic()
+    try:
+        resp = await hedged(lambda: client.get(url, params=params, **kwargs), _hedge_delay(host), host)
+    except httpx.TransportError:
+        breaker.record_failure()
+        metrics.increment("http_requests", upstream=host, outcome="error")
+        raise
+    except BaseException:
+        # Cancellation (e.g. by a latency budget) says nothing about the upstream's health.
+        breaker.release()
+        raise
+    elapsed = time.monotonic() - started
+    _latencies.setdefault(host, LatencyTracker()).record(elapsed)
+    if resp.status_code >= 500 or resp.status_code == 429:
+        breaker.record_failure()
+        metrics.increment("http_requests", upstream=host, outcome="error")
+    else:
+        breaker.record_success()
+        metrics.increment("http_requests", upstream=host, outcome="success")
+    return resp
+
+
+async def close_http_client() -> None:
+    """Closes the shared client and its pooled connections. Safe to call more than once."""
+    global _client, _client_loop
+    client, _client, _client_loop = _client, None, None
+    if client is not None and not client.is_closed:
+        await client.aclose()
+        logger.info("Closed shared HTTP client.")
+
+
+def _close_http_client_at_exit() -> None:
+    if _client is not None and not _client.is_closed:
+        close_at_exit(close_http_client, _client_loop, "HTTP client")
+
+
+atexit.register(_close_http_client_at_exit)
@@ -0,0 +1,187 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Smaller renditions of generated step images.
+
+Each full-size PNG is re-encoded as WebP (and AVIF when the optional
+'pillow-avif-plugin' package is installed) at the widths configured in
+constants. Encoding is CPU-bound, so it runs in a process pool rather than
+on the event loop or in a thread that would hold the GIL. The workers are
+spawned rather than forked: a fork copies the server's event loop, client
+pools and locks that other threads may be holding at that moment.
+Renditions of a cached image are stored next to it in the image store, so
+they are only encoded once.
+"""
+
+import asyncio
+import atexit
+import logging
+import multiprocessing
+import re
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from io import BytesIO
+from typing import List, Optional, Sequence
+
+from PIL import Image
+
+from bytemymood.shared_libraries import constants
+from bytemymood.tools.image_generation.image_store import ImageStore
+
+logger = logging.getLogger(__name__)
+
+MIME_TYPES = {"png": "image/png", "webp": "image/webp", "avif": "image/avif"}
+
+# Sidecar name of a stored rendition: <width>x<height>q<quality>.<format>
+_RENDITION_NAME = re.compile(r"(?P<width>\d+)x(?P<height>\d+)q(?P<quality>\d+)\.(?P<format>[a-z]+)")
+
+
+@dataclass(frozen=True)
+class Rendition:
+    """One encoded rendition of an image."""
+    format: str
+    width: int
+    height: int
+    data: bytes
+
+
+def _avif_available() -> bool:
+    """Returns True if the optional 'pillow-avif-plugin' package needed for AVIF is installed."""
+    try:
+        import pillow_avif  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _encode_renditions(data: bytes, formats: Sequence[str], widths: Sequence[int], quality: int) -> List[Rendition]:
+    """
+    Encodes data in every format at every width no larger than the image itself.
+    Runs in a worker process, so it takes and returns only picklable values.
+    """
+    if "avif" in formats:
+        _avif_available()  # Importing the plugin registers the AVIF codec in this process
+    image = Image.open(BytesIO(data))
+    image.load()
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+    renditions = []
+    for width in sorted({min(w, image.width) for w in widths}, reverse=True):
+        height = max(1, round(image.height * width / image.width))
+        resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+        for image_format in formats:
+            buffer = BytesIO()
+            resized.save(buffer, format=image_format.upper(), quality=quality)
+            renditions.append(Rendition(image_format, width, height, buffer.getvalue()))
+    return renditions
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=constants.IMAGE_DERIVATIVE_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pool
+
+
+def shutdown_derivative_pool() -> None:
+    """Stops the encoder processes. Safe to call more than once."""
+    global _pool
+    pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+atexit.register(shutdown_derivative_pool)
+
+
+def derivative_formats() -> List[str]:
+    """Returns the configured derivative formats this process can encode."""
+    formats = [f for f in constants.IMAGE_DERIVATIVE_FORMATS if f != "avif" or _avif_available()]
+    if len(formats) < len(constants.IMAGE_DERIVATIVE_FORMATS):
+        logger.debug("AVIF derivatives requested but 'pillow-avif-plugin' is not installed; skipping AVIF.")
+    return formats
+
+
+async def make_renditions(data: bytes) -> List[Rendition]:
+    """Encodes the configured renditions of a PNG in the process pool."""
+    formats = derivative_formats()
+    if not formats:
+        return []
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(
+            _get_pool(), _encode_renditions, data, formats,
+            constants.IMAGE_DERIVATIVE_WIDTHS, constants.IMAGE_DERIVATIVE_QUALITY,
+        )
+    except BrokenProcessPool:
+        # A crashed worker breaks the whole pool; start a fresh one next time.
+        shutdown_derivative_pool()
+        raise
+
+
+def _wanted_renditions(width: int) -> List[tuple]:
+    """Returns the (width, format) of each rendition of an image width pixels wide, in encoding order."""
+    widths = sorted({min(w, width) for w in constants.IMAGE_DERIVATIVE_WIDTHS}, reverse=True)
+    return [(w, image_format) for w in widths for image_format in derivative_formats()]
+
+
+def load_renditions(store: ImageStore, key: str, width: int) -> Optional[List[Rendition]]:
+    """
+    Returns the renditions stored with the image under key, or None unless every
+    rendition the current settings call for is there. Reads files, so call it
+    from a worker thread.
+    """
+    found = {}
+    for name in store.sidecars(key):
+        match = _RENDITION_NAME.fullmatch(name)
+        if match is None or int(match["quality"]) != constants.IMAGE_DERIVATIVE_QUALITY:
+            continue
+        data = store.get_sidecar(key, name)
+        if data is not None:
+            found[(int(match["width"]), match["format"])] = Rendition(
+                match["format"], int(match["width"]), int(match["height"]), data
+            )
+    wanted = _wanted_renditions(width)
+    if not all(w in found for w in wanted):
+        return None
+    return [found[w] for w in wanted]
+
+
+def store_renditions(store: ImageStore, key: str, renditions: Sequence[Rendition]) -> None:
+    """
+    Stores renditions next to the image under key. Writes files, so call it from a worker thread.
+
+    Raises:
+        OSError: If a rendition cannot be written.
+    """
+    for r in renditions:
+        name = f"{r.width}x{r.height}q{constants.IMAGE_DERIVATIVE_QUALITY}.{r.format}"
+        if not store.put_sidecar(key, name, r.data):
+            return  # The image itself has been evicted
+
+
+def pick_display_rendition(renditions: Sequence[dict], original_width: int) -> Optional[dict]:
+    """
+    Returns the smallest rendition, by encoded size, that is at least the configured
+    display width (or the full width of a smaller image). Thumbnails never qualify.
+    """
+    needed = min(constants.IMAGE_DISPLAY_WIDTH, original_width)
+    adequate = [r for r in renditions if r["width"] >= needed]
+    return min(adequate, key=lambda r: r["bytes"]) if adequate else None
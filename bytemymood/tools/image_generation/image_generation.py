@@ -1,26 +1,177 @@
 import logging
 import os
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple, Union
 import uuid
 from google.genai import types 
-from google import genai
 from PIL import Image
 from io import BytesIO
+from bytemymood.shared_libraries import constants, metrics
+from bytemymood.shared_libraries.background import BackgroundQueue
+from bytemymood.shared_libraries.cache import SingleFlight, TieredCache, open_tiered_cache
 from bytemymood.shared_libraries.constants import (
+    ENHANCE_PROMPT_MODEL,
+    GENERATED_IMAGE_ARTIFACTS,
+    IMAGE_GENERATION_MODEL,
     SAVE_IMAGES_LOCALLY,
     LOCAL_IMAGE_SAVE_PATH
 )
 from google.adk.tools import ToolContext, FunctionTool
+from bytemymood.shared_libraries.rate_limit import RateLimitExceeded
+from bytemymood.tools import genai_client
 from bytemymood.tools.image_generation import image_generation_prompt
+from bytemymood.tools.image_generation.derivatives import (
+    MIME_TYPES,
+    Rendition,
+    load_renditions,
+    make_renditions,
+    pick_display_rendition,
+    store_renditions,
+)
+from bytemymood.tools.image_generation.perceptual import dhash, get_local_perceptual_index, hamming
+from bytemymood.tools.image_generation.image_store import (
+    ImageStore,
+    get_local_image_store,
+    image_key,
+    image_path,
+    normalize_prompt,
+    open_image_store,
+)
 from dotenv import load_dotenv
 import asyncio
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Identical generations already in flight, by image key
+_image_flight = SingleFlight()
+
+_prompt_cache: Optional[TieredCache] = None
+_prompt_flight = SingleFlight()
+
+
+def get_prompt_cache() -> Optional[TieredCache]:
+    """Returns the shared enhanced-prompt cache, opening it on first use. None if caching is disabled."""
+    global _prompt_cache
+    if _prompt_cache is None and constants.PROMPT_CACHE_ENABLED:
+        _prompt_cache = open_tiered_cache(
+            constants.PROMPT_CACHE_PATH,
+            "enhanced_prompts",
+            constants.PROMPT_CACHE_MEMORY_SIZE,
+            ttl=constants.PROMPT_CACHE_TTL_SECONDS,
+        )
+    return _prompt_cache
+
+
+def get_prompt_cache_stats() -> Dict[str, Any]:
+    """Returns hit/miss counters for the enhanced-prompt cache, including model calls saved."""
+    cache = get_prompt_cache()
+    if cache is None:
+        return {"enabled": False}
+    stats = cache.stats()
+    stats["model_calls_saved"] = stats["memory_hits"] + stats["disk_hits"] + _prompt_flight.coalesced
+    return stats
+
+
+def _prompt_cache_key(desc: str) -> str:
+    """Keys an enhancement by template version, model and normalized description."""
+    return f"v{image_generation_prompt.ENHANCE_PROMPT_TEMPLATE_VERSION}:{ENHANCE_PROMPT_MODEL}:{normalize_prompt(desc)}"
+
+# Leading bytes that identify each image format Gemini may return
+_IMAGE_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+)
+
+
+def _sniff_image_format(data: Union[bytes, memoryview]) -> Optional[str]:
+    """Returns the image format named by the data's magic bytes, or None if unrecognized."""
+    head = bytes(data[:12])
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    for signature, image_format in _IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return image_format
+    return None
+
+
+def _transcode_to_png(data: Union[bytes, memoryview]) -> bytes:
+    """Decodes an image in any format PIL reads and re-encodes it as PNG."""
+    image = Image.open(BytesIO(data))
+    buffer = BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def _as_bytes(data: Union[bytes, memoryview]) -> bytes:
+    """Returns data as bytes, without copying when it is a view over a whole bytes object."""
+    if isinstance(data, memoryview) and isinstance(data.obj, bytes) and data.nbytes == len(data.obj):
+        return data.obj
+    return bytes(data)
+
+def _write_local_copy(key: str, data: Union[bytes, memoryview], phash: Optional[int] = None) -> str:
+    """
+    Adds a local copy of an image to the size-bounded local image store and returns its path.
+    An image perceptually identical to one already stored is not written again; the path of
+    the stored one is returned instead. Runs in a worker thread.
+    """
+    store = get_local_image_store()
+    index = get_local_perceptual_index() if phash is not None else None
+    if index is not None:
+        match = index.find(phash, constants.IMAGE_DEDUPE_THRESHOLD, exists=store.__contains__)
+        if match is not None:
+            metrics.increment("image_dedupe", scope="local")
+            logger.info(f"Image matches local copy {match[0]} (distance {match[1]}); not writing it again")
+            return image_path(LOCAL_IMAGE_SAVE_PATH, match[0])
+    store.put(key, data)
+    if index is not None:
+        index.add(key, phash)
+    path = image_path(LOCAL_IMAGE_SAVE_PATH, key)
+    logger.info(f"Successfully saved image locally to: {path}")
+    return path
+
+
+_local_image_writes: Optional[BackgroundQueue] = None
+
+
+def get_local_image_writes() -> BackgroundQueue:
+    """Returns the bounded queue that writes local image copies in the background."""
+    global _local_image_writes
+    if _local_image_writes is None:
+        _local_image_writes = BackgroundQueue("local_images", constants.LOCAL_IMAGE_WRITE_QUEUE_SIZE)
+    return _local_image_writes
+
+
+async def _save_local_copy(key: str, image_bytes: Union[bytes, memoryview], phash: Optional[int] = None) -> Optional[str]:
+    """
+    Writes the local copy off the event loop. Returns its path once it is on disk,
+    or None if it was only queued for the background writer.
+    """
+    if constants.LOCAL_IMAGE_SAVE_IN_BACKGROUND:
+        await get_local_image_writes().submit(_write_local_copy, key, image_bytes, phash)
+        return None
+    return await asyncio.to_thread(_write_local_copy, key, image_bytes, phash)
+
+
+async def _save_artifact(filename: str, image_bytes: Union[bytes, memoryview], mime_type: str, tool_context: ToolContext) -> Any:
+    """Saves image bytes as an ADK artifact and returns its version."""
+    logger.info(f"Saving {len(image_bytes)} bytes as ADK artifact (name: {filename}, mime: {mime_type})")
+    artifact_part = types.Part(inline_data=types.Blob(data=_as_bytes(image_bytes), mime_type=mime_type))
+    artifact_version = await tool_context.save_artifact(filename=filename, artifact=artifact_part)
+    logger.info(f"Successfully saved artifact {filename} (version {artifact_version})")
+    return artifact_version
+
 # Tool function to save image as artifact and conditionally save locally
-async def _image_save_func(image_bytes: bytes, file_extension: str, tool_context: ToolContext) -> Dict[str, Any]:
-    """Saves image bytes as an ADK artifact and conditionally saves a copy locally."""
+async def _image_save_func(
+    image_bytes: Union[bytes, memoryview], file_extension: str, tool_context: ToolContext, phash: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Saves image bytes as an ADK artifact and conditionally saves a copy locally.
+    When the image's perceptual hash is given, a near-identical local copy is reused.
+    Both saves run concurrently and the local write never blocks the event loop.
+    The bytes may be passed as a memoryview; they are only materialized for the artifact Blob.
+    """
     logger.debug("Entering _image_save_func (artifact save version)...")
 
     # Determine mime type and ensure extension format
@@ -28,47 +179,36 @@ async def _image_save_func(image_bytes: bytes, file_extension: str, tool_context
         file_extension = '.' + file_extension
     mime_type = f"image/{file_extension.lstrip('.')}" if file_extension else "image/png"
     # Make filename unique for the artifact itself and local copy
-    filename = f"generated_image_{uuid.uuid4()}{file_extension if file_extension else '.png'}" 
+    image_id = uuid.uuid4()
+    filename = f"generated_image_{image_id}{file_extension if file_extension else '.png'}" 
 
-    # --- Conditional Local Save Logic  --- 
+    saves = [_save_artifact(filename, image_bytes, mime_type, tool_context)]
+    local_path = None
     if SAVE_IMAGES_LOCALLY:
-        save_dir = LOCAL_IMAGE_SAVE_PATH
-        try:
-            os.makedirs(save_dir, exist_ok=True)
-            # Use the unique filename generated above for local copy consistency
-            local_path = os.path.join(save_dir, filename) 
-            
-            logger.info(f"Attempting to save image locally to: {local_path} (SAVE_IMAGES_LOCALLY is True)")
-            with open(local_path, "wb") as f:
-                f.write(image_bytes)
-            logger.info(f"Successfully saved image locally to: {local_path}")
-        except Exception as e:
-            # Log error but don't stop the main process
-            logger.warning(f"Local file save failed (path: {save_dir}): {e}", exc_info=False)
+        # The local copy is keyed by the artifact's uuid and sharded by its first two hex digits
+        local_path = image_path(LOCAL_IMAGE_SAVE_PATH, image_id.hex)
+        logger.info(f"Attempting to save image locally to: {local_path} (SAVE_IMAGES_LOCALLY is True)")
+        saves.append(_save_local_copy(image_id.hex, image_bytes, phash))
     else:
         logger.debug("Local image saving skipped (SAVE_IMAGES_LOCALLY is False).")
-    # --- End Conditional Local Save Logic ---
-    
-    # --- Save as ADK Artifact --- 
-    artifact_version = None # Initialize artifact_version variable
-    local_path_if_saved = local_path if SAVE_IMAGES_LOCALLY and 'local_path' in locals() else None
-    try:
-        logger.info(f"Saving {len(image_bytes)} bytes as ADK artifact (name: {filename}, mime: {mime_type})")
-        # Create a Part object for the artifact data
-        artifact_part = types.Part(inline_data=types.Blob(data=image_bytes, mime_type=mime_type))
-        
-        # Call save_artifact with filename and artifact keywords 
-        logger.debug(f"--->>> PRE-SAVE ARTIFACT CALL (sync) for {filename}")
-        artifact_version = await tool_context.save_artifact( 
-            filename=filename, 
-            artifact=artifact_part 
-        )
-        # Log using filename and returned version
-        logger.info(f"Successfully saved artifact {filename} (version {artifact_version})")
-    except Exception as e:
-        logger.error(f"Failed to save ADK artifact: {e}", exc_info=True)
+    artifact_version, *local_result = await asyncio.gather(*saves, return_exceptions=True)
+    for r in (artifact_version, *local_result):
+        if isinstance(r, BaseException) and not isinstance(r, Exception):
+            raise r  # Cancellation and interpreter exits are not save failures
+
+    local_error = None
+    local_path_if_saved = None
+    if local_result and isinstance(local_result[0], BaseException):
+        # Log error but don't stop the main process
+        local_error = str(local_result[0])
+        logger.warning(f"Local file save failed (path: {local_path}): {local_error}", exc_info=False)
+    elif local_result and local_result[0]:
+        local_path_if_saved = local_result[0]
+
+    if isinstance(artifact_version, BaseException):
+        e = artifact_version
+        logger.error(f"Failed to save ADK artifact: {e}", exc_info=e)
         # If artifact saving fails, return specific info if local save happened
-        error_msg = f"Failed to save image as artifact: {e}"
         if local_path_if_saved:
              # Return confirmation of local save + artifact error, avoiding generic "error" key
              logger.warning(f"Artifact save failed, but local copy exists at {local_path_if_saved}")
@@ -79,43 +219,59 @@ async def _image_save_func(image_bytes: bytes, file_extension: str, tool_context
              }
         else:
              # Only return generic error if local save didn't happen/succeed
-             return {"error": error_msg}
-    # --- End Artifact Save ---
+             return {"error": f"Failed to save image as artifact: {e}"}
 
     # --- Return confirmation and artifact info (NO raw data) ---
     confirmation_msg = f"Image artifact {filename} (version {artifact_version}) saved successfully."
+    result = {
+        "filename": filename, 
+        "artifact_version": artifact_version, 
+    }
     if local_path_if_saved:
         confirmation_msg += f" Local copy saved to {local_path_if_saved}."
+    elif local_error:
+        confirmation_msg += f" Local copy failed: {local_error}."
+        result["local_error"] = local_error
+    elif local_path:
+        confirmation_msg += f" Local copy queued for {local_path}."
+    result["confirmation"] = confirmation_msg
         
     logger.info("Returning confirmation and artifact info to agent.")
-    return {
-        "filename": filename, 
-        "artifact_version": artifact_version, 
-        "confirmation": confirmation_msg
-    }
+    return result
     # --- End Return ---
 
 # Helper function for prompt enhancement 
 async def _enhance_prompt_for_image_gen(desc: str) -> Optional[str]:
-    """Enhances the user-provided description into a detailed prompt using Gemini."""
+    """
+    Enhances the user-provided description into a detailed prompt using Gemini.
+    Returns None if the enhancement fails.
+
+    Raises:
+        RateLimitExceeded: If the enhancement model is too busy to take the call within the allowed wait.
+    """
+    cache = get_prompt_cache()
+    key = _prompt_cache_key(desc)
+    if cache is not None:
+        cached = await asyncio.to_thread(cache.get, key)
+        if cached is not None:
+            logger.debug(f"Enhanced prompt cache hit for description: '{desc}'")
+            metrics.increment("prompt_enhance_cache", outcome="hit")
+            return cached
+    metrics.increment("prompt_enhance_cache", outcome="miss")
+    return await _prompt_flight.do(key, lambda: _enhance_prompt_remote(desc, cache, key))
+
+
+async def _enhance_prompt_remote(desc: str, cache: Optional[TieredCache], key: str) -> Optional[str]:
+    """
+    Calls Gemini to enhance desc and stores the result in the enhanced-prompt cache.
+    RateLimitExceeded is passed on so that callers can report when to retry.
+    """
     logger.debug(f"Enhancing prompt for description: '{desc}' with Gemini Flash")
     try:
-        # Initialize client (API key should be in environment)
-        client = genai.Client()
-        # Construct the prompt string directly
-        prompt_text = (
-            "You are a creative image generation assistant. Enhance the following user request "
-            f"into a detailed and vivid image generation prompt. User request: '{desc}'\n"
-            "Examples:\n"
-            f"- {image_generation_prompt.ENHANCE_PROMPT_CHARACTER[0]}\n"
-            f"- {image_generation_prompt.ENHANCE_PROMPT_YOUTUBE_THUMBNAIL[0]}\n"
-            "Return ONLY the enhanced prompt string."
-        )
+        prompt_text = image_generation_prompt.ENHANCE_PROMPT_TEMPLATE.format(desc=desc)
         logger.debug("Sending prompt to genai.generate_content...")
-        # Call generate_content in a thread to avoid blocking the event loop
-        response = await asyncio.to_thread(
-            client.models.generate_content,
-            model="gemini-2.0-flash-001",
+        response = await genai_client.generate_content(
+            model=ENHANCE_PROMPT_MODEL,
             contents=prompt_text,
             config=types.GenerateContentConfig(
                 temperature=0.3,
@@ -142,15 +298,289 @@ async def _enhance_prompt_for_image_gen(desc: str) -> Optional[str]:
              return None
         logger.info(f"Enhanced prompt for {desc}: '{detailed_prompt}'")
         # log_prompt_to_file(prompt_text, response, detailed_prompt.strip())
-        return detailed_prompt.strip() # Return the string
+        detailed_prompt = detailed_prompt.strip()
+        if cache is not None:
+            await asyncio.to_thread(cache.set, key, detailed_prompt)
+        return detailed_prompt # Return the string
+    except RateLimitExceeded as e:
+        logger.warning(f"Prompt enhancement rate limited: {e}")
+        raise
     except Exception as e:
         logger.error(f"Gemini prompt enhancement failed: {e}", exc_info=True)
         return None # Indicate failure
 
+def _rate_limit_error(what: str, e: RateLimitExceeded) -> Dict[str, Any]:
+    """Returns the tool result for a call turned away by the client-side rate limiter."""
+    return {
+        "error": f"{what} is busy right now; try again in about {e.retry_after:.0f} seconds.",
+        "retry_after_seconds": round(e.retry_after, 1),
+    }
+
+
+async def enhance_image_prompt(desc: str) -> Dict[str, Any]:
+    """
+    Enhances a cooking step description into a detailed prompt for image generation.
+    Args:
+        desc: The cooking step description to enhance.
+    Returns:
+        The enhanced prompt, or an error. A busy model also reports retry_after_seconds.
+    """
+    try:
+        prompt = await _enhance_prompt_for_image_gen(desc)
+    except RateLimitExceeded as e:
+        return _rate_limit_error("Prompt enhancement", e)
+    if prompt is None:
+        return {"error": "Prompt enhancement failed"}
+    return {"enhanced_prompt": prompt}
+
+
 # Wrap prompt enhancement as a tool
-prompt_enhance_tool = FunctionTool(func=_enhance_prompt_for_image_gen)
+prompt_enhance_tool = FunctionTool(func=enhance_image_prompt)
 
 # --- Gemini Native Image Generation Tool ---
+async def _render_image(
+    desc: str,
+    config: types.GenerateContentConfig,
+    store: Optional[ImageStore],
+    key: str,
+) -> Dict[str, Any]:
+    """Generates PNG bytes for desc with Gemini and adds them to the image store."""
+    logger.info(f"Generating image with Gemini using prompt: '{desc}'")
+    # Generate image using Gemini's native image generation
+    try:
+        response = await genai_client.generate_content(
+            model=IMAGE_GENERATION_MODEL,
+            contents=desc,
+            config=config,
+        )
+    except RateLimitExceeded as e:
+        logger.warning(f"Image generation rate limited: {e}")
+        return _rate_limit_error("Image generation", e)
+    logger.debug(f"Received response from Gemini, type: {type(response)}")
+    # Extract image data from response safely
+    image_data = None
+    try:
+        if hasattr(response, 'candidates') and response.candidates:
+            candidate = response.candidates[0]
+            if hasattr(candidate, 'content') and hasattr(candidate.content, 'parts'):
+                for part in candidate.content.parts:
+                    if hasattr(part, 'inline_data') and part.inline_data and hasattr(part.inline_data, 'data'):
+                        image_data = part.inline_data.data
+                        logger.debug(f"Found image data: {len(image_data)} bytes")
+                        break
+    except Exception as extract_error:
+        logger.error(f"Error extracting image data: {extract_error}")
+        return {"error": f"Failed to extract image data: {extract_error}"}
+    if not image_data:
+        logger.error("No image data found in Gemini response")
+        return {"error": "No image data generated by Gemini"}
+    # PNG output is passed through untouched; anything else is re-encoded off the event loop
+    image_format = _sniff_image_format(image_data)
+    if image_format == "png":
+        png_bytes = memoryview(image_data)
+        metrics.increment("image_encode", outcome="passthrough")
+    else:
+        logger.debug(f"Transcoding {image_format or 'unrecognized'} image data to PNG")
+        try:
+            png_bytes = memoryview(await asyncio.to_thread(_transcode_to_png, image_data))
+        except Exception as image_error:
+            logger.error(f"Error processing image data: {image_error}")
+            return {"error": f"Failed to process image data: {image_error}"}
+        metrics.increment("image_encode", outcome="transcode")
+    if store is not None:
+        try:
+            await asyncio.to_thread(store.put, key, png_bytes)
+        except OSError as e:
+            logger.warning(f"Failed to add generated image {key} to the image cache: {e}")
+    return {"image_bytes": png_bytes}
+
+
+def _image_request(desc: str) -> Tuple[types.GenerateContentConfig, str]:
+    """Returns the generation config for desc and the image key it is cached under."""
+    config = types.GenerateContentConfig(response_modalities=['TEXT', 'IMAGE'])
+    key = image_key(desc, IMAGE_GENERATION_MODEL, config.model_dump(mode="json", exclude_none=True))
+    return config, key
+
+
+async def _obtain_image(desc: str, config: types.GenerateContentConfig, key: str) -> Dict[str, Any]:
+    """
+    Returns {"image_bytes", "cached"} for desc from the image store, or renders it,
+    sharing the render with any identical request already in flight.
+    """
+    store = await open_image_store()
+    image_bytes = await asyncio.to_thread(store.get, key) if store is not None else None
+    if image_bytes is not None:
+        logger.info(f"Image cache hit for prompt: '{desc}'")
+        metrics.increment("image_cache", outcome="hit")
+        return {"image_bytes": image_bytes, "cached": True}
+    metrics.increment("image_cache", outcome="miss")
+    result = await _image_flight.do(key, lambda: _render_image(desc, config, store, key))
+    if "error" in result:
+        return result
+    return {"image_bytes": result["image_bytes"], "cached": False}
+
+
+def _session_image(key: str, tool_context: ToolContext) -> Optional[Dict[str, Any]]:
+    """Returns the artifact already saved in this session for an image key, if any."""
+    saved = tool_context.state.get(GENERATED_IMAGE_ARTIFACTS) or {}
+    if key not in saved:
+        return None
+    logger.info(f"Reusing image artifact {saved[key]['filename']} for image {key}")
+    metrics.increment("image_cache", outcome="session_hit")
+    return {**_artifact_info(saved[key]), "cached": True}
+
+
+def _artifact_info(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Returns a saved-artifact entry without the bookkeeping kept only in session state."""
+    return {k: v for k, v in entry.items() if k != "phash"}
+
+
+async def _perceptual_hash(image_bytes: Union[bytes, memoryview]) -> Optional[int]:
+    """Returns the image's perceptual hash, or None if dedupe is disabled or the image cannot be read."""
+    if not constants.IMAGE_DEDUPE_ENABLED:
+        return None
+    try:
+        return await asyncio.to_thread(dhash, _as_bytes(image_bytes))
+    except Exception as e:
+        logger.debug(f"Could not hash image for dedupe: {e}")
+        return None
+
+
+async def _image_hash(key: str, image_bytes: Union[bytes, memoryview]) -> Optional[int]:
+    """Returns the perceptual hash of the image under key, kept next to it in the image store once computed."""
+    if not constants.IMAGE_DEDUPE_ENABLED:
+        return None
+    store = await open_image_store()
+    if store is not None:
+        stored = await asyncio.to_thread(store.get_sidecar, key, "dhash")
+        if stored is not None:
+            metrics.increment("image_derivatives", kind="dhash", outcome="hit")
+            return int(stored)
+    phash = await _perceptual_hash(image_bytes)
+    if phash is not None and store is not None:
+        try:
+            await asyncio.to_thread(store.put_sidecar, key, "dhash", str(phash).encode())
+        except OSError as e:
+            logger.warning(f"Failed to store the perceptual hash of image {key}: {e}")
+    return phash
+
+
+async def _image_renditions(key: str, image_bytes: Union[bytes, memoryview]) -> List[Rendition]:
+    """Returns the renditions of the image under key, kept next to it in the image store once encoded."""
+    store = await open_image_store()
+    if store is not None:
+        stored = await asyncio.to_thread(load_renditions, store, key, _png_width(image_bytes))
+        if stored is not None:
+            metrics.increment("image_derivatives", kind="renditions", outcome="hit")
+            return stored
+    renditions = await make_renditions(_as_bytes(image_bytes))
+    if store is not None:
+        try:
+            await asyncio.to_thread(store_renditions, store, key, renditions)
+        except OSError as e:
+            logger.warning(f"Failed to store the renditions of image {key}: {e}")
+    return renditions
+
+
+def _similar_session_image(key: str, phash: int, tool_context: ToolContext) -> Optional[Dict[str, Any]]:
+    """
+    Returns the artifact saved in this session whose image is nearest to phash, if it is
+    within the dedupe threshold. The match is also recorded under key for exact reuse later.
+    """
+    saved = tool_context.state.get(GENERATED_IMAGE_ARTIFACTS) or {}
+    candidates = [(hamming(phash, entry["phash"]), entry) for entry in saved.values() if entry.get("phash") is not None]
+    if not candidates:
+        return None
+    distance, entry = min(candidates, key=lambda candidate: candidate[0])
+    if distance > constants.IMAGE_DEDUPE_THRESHOLD:
+        return None
+    logger.info(f"Image {key} matches artifact {entry['filename']} (distance {distance}); reusing it")
+    metrics.increment("image_dedupe", scope="session")
+    tool_context.state[GENERATED_IMAGE_ARTIFACTS] = {**saved, key: entry}
+    return {**_artifact_info(entry), "cached": True, "duplicate_distance": distance}
+
+
+def _png_width(data: Union[bytes, memoryview]) -> int:
+    """Reads the image width from a PNG's IHDR chunk."""
+    return int.from_bytes(data[16:20], "big")
+
+
+async def _save_renditions(
+    artifact_result: Dict[str, Any],
+    image_bytes: Union[bytes, memoryview],
+    renditions_job: "asyncio.Future[List[Rendition]]",
+    tool_context: ToolContext,
+) -> Dict[str, Any]:
+    """
+    Saves the encoded renditions as artifacts linked to the original by name
+    (<original>.<width>w.<format>) and points the result at the smallest adequate one.
+    """
+    try:
+        renditions = await renditions_job
+    except Exception as e:
+        logger.warning(f"Image renditions failed, returning the original PNG: {e}")
+        return artifact_result
+    stem = os.path.splitext(artifact_result["filename"])[0]
+    names = [f"{stem}.{r.width}w.{r.format}" for r in renditions]
+    versions = await asyncio.gather(*(
+        tool_context.save_artifact(
+            filename=name,
+            artifact=types.Part(inline_data=types.Blob(data=r.data, mime_type=MIME_TYPES[r.format])),
+        )
+        for name, r in zip(names, renditions)
+    ), return_exceptions=True)
+    linked = []
+    for name, r, version in zip(names, renditions, versions):
+        if isinstance(version, Exception):
+            logger.warning(f"Failed to save image rendition {name}: {version}")
+            continue
+        linked.append({"filename": name, "artifact_version": version, "format": r.format, "width": r.width, "bytes": len(r.data)})
+    width = _png_width(image_bytes)
+    original = {"filename": artifact_result["filename"], "artifact_version": artifact_result["artifact_version"],
+                "format": "png", "width": width, "bytes": len(image_bytes)}
+    display = pick_display_rendition([original, *linked], width) or original
+    metrics.increment("image_renditions", outcome="saved" if linked else "none")
+    return {
+        **artifact_result,
+        "filename": display["filename"],
+        "artifact_version": display["artifact_version"],
+        "mime_type": MIME_TYPES[display["format"]],
+        "original_filename": original["filename"],
+        "renditions": linked,
+    }
+
+
+async def _save_session_image(
+    key: str, image_bytes: Union[bytes, memoryview], cached: bool, tool_context: ToolContext
+) -> Dict[str, Any]:
+    """
+    Saves image bytes as this session's artifact for an image key and returns the tool result.
+    An image near-identical to one already saved in the session reuses that artifact.
+    Smaller renditions are encoded, or read from the image store, while the original is being saved.
+    """
+    phash = await _image_hash(key, image_bytes)
+    if phash is not None:
+        similar = _similar_session_image(key, phash, tool_context)
+        if similar is not None:
+            return similar
+    renditions_job = None
+    if constants.IMAGE_DERIVATIVES_ENABLED and _sniff_image_format(image_bytes) == "png":
+        renditions_job = asyncio.ensure_future(_image_renditions(key, image_bytes))
+    artifact_result = await _image_save_func(image_bytes, ".png", tool_context, phash)
+    logger.info(f"Generate artifact save result keys: {artifact_result.keys()}")
+    if renditions_job is not None and "filename" in artifact_result:
+        artifact_result = await _save_renditions(artifact_result, image_bytes, renditions_job, tool_context)
+    elif renditions_job is not None:
+        renditions_job.cancel()
+    if "error" in artifact_result or "artifact_error" in artifact_result:
+         error_key = "error" if "error" in artifact_result else "artifact_error"
+         confirm = artifact_result.get("confirmation", "Image generated but artifact save failed.") + f" Error: {artifact_result.get(error_key)}"
+         return {"confirmation": confirm, "artifact_error": artifact_result.get(error_key)}
+    saved = tool_context.state.get(GENERATED_IMAGE_ARTIFACTS) or {}
+    tool_context.state[GENERATED_IMAGE_ARTIFACTS] = {**saved, key: {**artifact_result, "phash": phash}}
+    return {**artifact_result, "cached": cached}
+
+
 async def _generate_image_with_gemini(desc: str, tool_context: ToolContext) -> Dict[str, Any]:
     """
     Generates a new image using Gemini's native image generation model based on a text description.
@@ -163,58 +593,44 @@ async def _generate_image_with_gemini(desc: str, tool_context: ToolContext) -> D
         the artifact name and version where the image is stored.
     """
     try:
-        # Initialize Gemini client (API key should be in environment)
-        client = genai.Client()
-        logger.info(f"Generating image with Gemini using prompt: '{desc}'")
-        # Generate image using Gemini's native image generation
-        response = await asyncio.to_thread(
-            client.models.generate_content,
-            model="gemini-2.0-flash-preview-image-generation",
-            contents=desc,
-            config=types.GenerateContentConfig(
-                response_modalities=['TEXT', 'IMAGE']
-            )
-        )
-        logger.debug(f"Received response from Gemini, type: {type(response)}")
-        # Extract image data from response safely
-        image_data = None
-        try:
-            if hasattr(response, 'candidates') and response.candidates:
-                candidate = response.candidates[0]
-                if hasattr(candidate, 'content') and hasattr(candidate.content, 'parts'):
-                    for part in candidate.content.parts:
-                        if hasattr(part, 'inline_data') and part.inline_data and hasattr(part.inline_data, 'data'):
-                            image_data = part.inline_data.data
-                            logger.debug(f"Found image data: {len(image_data)} bytes")
-                            break
-        except Exception as extract_error:
-            logger.error(f"Error extracting image data: {extract_error}")
-            return {"error": f"Failed to extract image data: {extract_error}"}
-        if not image_data:
-            logger.error("No image data found in Gemini response")
-            return {"error": "No image data generated by Gemini"}
-        # Convert PIL Image to bytes for saving
-        try:
-            image = Image.open(BytesIO(image_data))
-            img_byte_arr = BytesIO()
-            image.save(img_byte_arr, format='PNG')
-            img_byte_arr = img_byte_arr.getvalue()
-        except Exception as image_error:
-            logger.error(f"Error processing image data: {image_error}")
-            return {"error": f"Failed to process image data: {image_error}"}
+        config, key = _image_request(desc)
+        # An identical image already saved in this session is returned as-is
+        saved = _session_image(key, tool_context)
+        if saved is not None:
+            return saved
+        result = await _obtain_image(desc, config, key)
+        if "error" in result:
+            return result
         # Save the image as artifact and locally
-        artifact_result = await _image_save_func(img_byte_arr, ".png", tool_context)
-        logger.info(f"Generate artifact save result keys: {artifact_result.keys()}")
-        # Return the result
-        if "error" in artifact_result or "artifact_error" in artifact_result:
-             error_key = "error" if "error" in artifact_result else "artifact_error"
-             confirm = artifact_result.get("confirmation", "Image generated but artifact save failed.") + f" Error: {artifact_result.get(error_key)}"
-             return {"confirmation": confirm, "artifact_error": artifact_result.get(error_key)}
-        else:
-            return artifact_result
+        return await _save_session_image(key, result["image_bytes"], result["cached"], tool_context)
     except Exception as e:
         logger.error(f"Gemini image generation failed: {e}", exc_info=True)
         return {"error": str(e)}
 
 # Create the FunctionTool for Gemini image generation
 gemini_image_generation_tool = FunctionTool(func=_generate_image_with_gemini)
+
+
+async def generate_step_image(desc: str, tool_context: ToolContext) -> Dict[str, Any]:
+    """
+    Generates the image for a cooking step in one call: the step description is
+    enhanced into a detailed image prompt and the image is generated from it.
+    Enhanced prompts are cached, so a step seen before skips the enhancement call.
+    Args:
+        desc: The cooking step description, as written in the recipe.
+        tool_context: The ADK tool context for accessing state and services.
+    Returns:
+        The artifact name and version where the image is stored, or an error.
+        A busy model also reports retry_after_seconds.
+    """
+    try:
+        prompt = await _enhance_prompt_for_image_gen(desc)
+    except RateLimitExceeded as e:
+        return _rate_limit_error("Prompt enhancement", e)
+    if prompt is None:
+        logger.warning(f"Prompt enhancement failed; generating from the step description: '{desc}'")
+    metrics.increment("step_image_enhancement", outcome="enhanced" if prompt else "raw")
+    return await _generate_image_with_gemini(prompt or desc, tool_context)
+
+
+generate_step_image_tool = FunctionTool(func=generate_step_image)
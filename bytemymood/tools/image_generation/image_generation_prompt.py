@@ -107,4 +107,16 @@ User-Provided Details (fill these in before generating):
 - Preferred font names or style references
 - Specific props or background keywords
 """
-]
\ No newline at end of file
+]
+# Bump whenever ENHANCE_PROMPT_TEMPLATE or its examples change, so cached
+# enhancements made with the old template are no longer reused.
+ENHANCE_PROMPT_TEMPLATE_VERSION = 1
+
+ENHANCE_PROMPT_TEMPLATE = (
+    "You are a creative image generation assistant. Enhance the following user request "
+    "into a detailed and vivid image generation prompt. User request: '{desc}'\n"
+    "Examples:\n"
+    f"- {ENHANCE_PROMPT_CHARACTER[0]}\n"
+    f"- {ENHANCE_PROMPT_YOUTUBE_THUMBNAIL[0]}\n"
+    "Return ONLY the enhanced prompt string."
+)
@@ -0,0 +1,292 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Size-bounded stores for generated images.
+
+The image cache is content-addressed: images are keyed by a hash of the
+normalized prompt, the model and the generation config, so identical
+requests from any user map to the same file. Local copies saved with
+SAVE_IMAGES_LOCALLY use the same store type, keyed by the artifact's uuid.
+
+Files live under <root>/<first two hex digits>/<key>.png, so no directory
+grows past a few hundred entries. Data derived from an image, such as its
+renditions and perceptual hash, can be kept next to it as <key>.<name>
+sidecar files; they count towards its size and are evicted with it. The
+store keeps an in-memory index and evicts the least recently used images
+once their total size exceeds `max_bytes`. Recency is kept in file mtimes,
+so the index is rebuilt from a single scan on startup.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import unicodedata
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from bytemymood.shared_libraries import constants
+
+logger = logging.getLogger(__name__)
+
+# Temporary files older than this belong to a write that was interrupted, not one in progress
+_STALE_TMP_SECONDS = 300
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Normalizes Unicode, case and whitespace so trivially different prompts share a key."""
+    return " ".join(unicodedata.normalize("NFC", prompt).casefold().split())
+
+
+def image_key(prompt: str, model: str, config: Optional[Dict[str, Any]] = None) -> str:
+    """Returns the content address of an image generated from prompt with model and config."""
+    payload = json.dumps(
+        {"prompt": normalize_prompt(prompt), "model": model, "config": config or {}},
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def image_path(root: str, key: str) -> str:
+    """Returns where the image stored under key lives in a store rooted at root."""
+    return os.path.join(root, key[:2], f"{key}.png")
+
+
+class ImageStore:
+    """A size-bounded, sharded image store on the local filesystem."""
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # Image key -> bytes of the image and its sidecars
+        self._sidecars: Dict[str, Dict[str, int]] = {}  # Image key -> sidecar name -> bytes
+        self._total = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(root, exist_ok=True)
+        self._scan()
+
+    def _path(self, key: str) -> str:
+        return image_path(self.root, key)
+
+    def _sidecar_path(self, key: str, name: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.{name}")
+
+    def _scan(self) -> None:
+        """
+        Rebuilds the index from the files on disk, oldest first. Stale temporary
+        files left by interrupted writes and sidecars whose image is gone are removed,
+        and images saved directly in the root by older versions are moved into their shards.
+        """
+        found = []
+        sidecars = []
+        for entry in os.scandir(self.root):
+            if entry.is_file() and entry.name.endswith(".png"):
+                self._adopt(entry)
+        for shard in os.scandir(self.root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if not entry.is_file():
+                    continue
+                if entry.name.endswith(".png"):
+                    stat = entry.stat()
+                    found.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+                elif entry.name.endswith(".tmp"):
+                    if time.time() - entry.stat().st_mtime > _STALE_TMP_SECONDS:
+                        os.remove(entry.path)
+                elif "." in entry.name:
+                    key, name = entry.name.split(".", 1)
+                    sidecars.append((key, name, entry.stat().st_size, entry.path))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._total += size
+        for key, name, size, path in sidecars:
+            if key not in self._entries:
+                os.remove(path)
+                continue
+            self._sidecars.setdefault(key, {})[name] = size
+            self._entries[key] += size
+            self._total += size
+        self._evict()
+
+    def _adopt(self, entry: os.DirEntry) -> None:
+        """Moves an unsharded generated_image_<uuid>.png into the shard for its uuid."""
+        try:
+            key = uuid.UUID(entry.name[:-4][-36:]).hex
+        except ValueError:
+            logger.debug(f"Leaving unrecognized file {entry.path} in place")
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(entry.path, path)
+
+    def _evict(self) -> None:
+        while self._total > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._total -= size
+            self.evictions += 1
+            paths = [self._sidecar_path(key, name) for name in self._sidecars.pop(key, {})]
+            for path in [self._path(key), *paths]:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            logger.debug(f"Evicted cached image {key}")
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Returns the stored image bytes for key, or None on a miss."""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+        try:
+            path = self._path(key)
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._total -= self._entries.pop(key, 0)
+                self._sidecars.pop(key, None)  # Left on disk until the next scan removes them
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        """Stores image bytes under key, evicting older images if over the size limit."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            size = len(data) + sum(self._sidecars.get(key, {}).values())
+            self._total += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._evict()
+
+    def sidecars(self, key: str) -> List[str]:
+        """Returns the names of the sidecars stored with the image under key."""
+        with self._lock:
+            return list(self._sidecars.get(key, ()))
+
+    def get_sidecar(self, key: str, name: str) -> Optional[bytes]:
+        """Returns the sidecar stored as name with the image under key, or None if there is none."""
+        with self._lock:
+            if name not in self._sidecars.get(key, ()):
+                return None
+        try:
+            with open(self._sidecar_path(key, name), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put_sidecar(self, key: str, name: str, data: bytes) -> bool:
+        """
+        Stores data derived from the image under key next to it, to be evicted with it.
+        name must not be "png". Returns False if the image is not in the store.
+        """
+        if key not in self._entries:
+            return False
+        path = self._sidecar_path(key, name)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            if key not in self._entries:  # Evicted while the sidecar was being written
+                os.remove(path)
+                return False
+            sizes = self._sidecars.setdefault(key, {})
+            added = len(data) - sizes.get(name, 0)
+            sizes[name] = len(data)
+            self._entries[key] += added
+            self._total += added
+            self._evict()
+        return True
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "images": len(self._entries),
+            "bytes": self._total,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+_store: Optional[ImageStore] = None
+_store_lock = threading.Lock()
+_store_unavailable = False
+_local_store: Optional[ImageStore] = None
+_local_store_lock = threading.Lock()
+
+
+def get_image_store() -> Optional[ImageStore]:
+    """
+    Returns the shared image store, opening it on first use. None if disabled or unavailable.
+    Opening scans the directory; async code should call open_image_store instead.
+    """
+    global _store, _store_unavailable
+    if not constants.IMAGE_CACHE_ENABLED or _store_unavailable:
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                try:
+                    _store = ImageStore(constants.IMAGE_CACHE_PATH, constants.IMAGE_CACHE_MAX_BYTES)
+                except OSError as e:
+                    logger.warning(f"Image cache unavailable ({constants.IMAGE_CACHE_PATH}): {e}")
+                    _store_unavailable = True
+                    return None
+    return _store
+
+
+async def open_image_store() -> Optional[ImageStore]:
+    """Returns the shared image store like get_image_store, opening it in a worker thread on first use."""
+    if _store is None and constants.IMAGE_CACHE_ENABLED and not _store_unavailable:
+        return await asyncio.to_thread(get_image_store)
+    return get_image_store()  # Already open, or never will be
+
+
+def get_local_image_store() -> ImageStore:
+    """
+    Returns the store for local image copies, opening it on first use.
+    Opening scans the directory, so call this from a worker thread.
+
+    Raises:
+        OSError: If the directory cannot be created or read.
+    """
+    global _local_store
+    if _local_store is None:
+        with _local_store_lock:
+            if _local_store is None:
+                _local_store = ImageStore(constants.LOCAL_IMAGE_SAVE_PATH, constants.LOCAL_IMAGE_MAX_BYTES)
+                logger.info(f"Opened local image store with {_local_store.stats()['images']} images")
+    return _local_store
@@ -0,0 +1,237 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Perceptual hashing for spotting near-identical step images.
+
+dhash reduces an image to a 64-bit difference hash that changes little
+under re-encoding, resizing or small edits, so two renders of "chop the
+onions" usually differ in only a few bits. A BKTree finds every stored
+hash within a Hamming distance without comparing against all of them.
+
+Run as a module to dedupe an existing image directory:
+
+    python -m bytemymood.tools.image_generation.perceptual dedupe <dir> [--threshold N] [--workers N] [--link]
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import Any, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from bytemymood.shared_libraries import constants
+from bytemymood.shared_libraries.cache import SqliteCache
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp")
+
+
+def dhash(data: bytes, size: int = 8) -> int:
+    """Returns the size*size-bit difference hash of an encoded image."""
+    with Image.open(BytesIO(data)) as image:
+        image.draft("L", (size * 4, size * 4))  # Lets JPEG decode at reduced scale
+        pixels = list(image.convert("L").resize((size + 1, size), Image.LANCZOS).getdata())
+    value = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            value = (value << 1) | (left > pixels[row * (size + 1) + col + 1])
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    """Returns the number of bits that differ between two hashes."""
+    return (a ^ b).bit_count()
+
+
+class BKTree:
+    """A Burkhard-Keller tree of hashes under Hamming distance, mapping each hash to a value."""
+
+    def __init__(self):
+        # Each node is [hash, value, {distance: child}]
+        self._root: Optional[list] = None
+        self._size = 0
+
+    def add(self, hash_value: int, value: Any) -> None:
+        """Adds a hash. Adding a hash that is already present replaces its value."""
+        if self._root is None:
+            self._root = [hash_value, value, {}]
+            self._size = 1
+            return
+        node = self._root
+        while True:
+            distance = hamming(hash_value, node[0])
+            if distance == 0:
+                node[1] = value
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [hash_value, value, {}]
+                self._size += 1
+                return
+            node = child
+
+    def search(self, hash_value: int, radius: int) -> List[Tuple[int, Any]]:
+        """Returns (distance, value) for every hash within radius, nearest first."""
+        found = []
+        pending = [self._root] if self._root is not None else []
+        while pending:
+            node = pending.pop()
+            distance = hamming(hash_value, node[0])
+            if distance <= radius:
+                found.append((distance, node[1]))
+            # Only subtrees at distance d from this node with |d - distance| <= radius can match.
+            for d, child in node[2].items():
+                if distance - radius <= d <= distance + radius:
+                    pending.append(child)
+        found.sort(key=lambda item: item[0])
+        return found
+
+    def __len__(self) -> int:
+        return self._size
+
+
+class PerceptualIndex:
+    """
+    Hashes of the images in a store, persisted in SQLite and searched through a BKTree.
+    Keys removed from the store are skipped on lookup rather than deleted from the tree.
+    """
+
+    def __init__(self, path: str):
+        self._db = SqliteCache(path, "perceptual_hashes")
+        self._tree = BKTree()
+        self._hashes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        for key, hash_value in self._db.items():
+            self._hashes[key] = hash_value
+            self._tree.add(hash_value, key)
+
+    def add(self, key: str, hash_value: int) -> None:
+        with self._lock:
+            self._hashes[key] = hash_value
+            self._tree.add(hash_value, key)
+        self._db.set(key, hash_value)
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self._hashes.pop(key, None)
+        self._db.delete(key)
+
+    def find(self, hash_value: int, threshold: int, exists=lambda key: True) -> Optional[Tuple[str, int]]:
+        """
+        Returns (key, distance) of the nearest indexed image within threshold for which
+        exists(key) is true. Keys that no longer exist are dropped from the index.
+        """
+        with self._lock:
+            matches = self._tree.search(hash_value, threshold)
+        for distance, key in matches:
+            current = self._hashes.get(key)
+            if current is None or hamming(current, hash_value) != distance:
+                continue  # A stale tree node for a key that was removed or re-hashed
+            if exists(key):
+                return key, distance
+            self.discard(key)
+        return None
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+
+_local_index: Optional[PerceptualIndex] = None
+_local_index_lock = threading.Lock()
+
+
+def get_local_perceptual_index() -> PerceptualIndex:
+    """Returns the hash index of the local image store, opening it on first use."""
+    global _local_index
+    if _local_index is None:
+        with _local_index_lock:
+            if _local_index is None:
+                _local_index = PerceptualIndex(constants.PERCEPTUAL_INDEX_PATH)
+    return _local_index
+
+
+def _hash_file(path: str) -> Tuple[str, Optional[int]]:
+    """Hashes one image file. Runs in a worker process."""
+    try:
+        with open(path, "rb") as f:
+            return path, dhash(f.read())
+    except (OSError, Image.UnidentifiedImageError):
+        return path, None
+
+
+def find_duplicates(directory: str, threshold: int, workers: Optional[int] = None) -> List[Tuple[str, str, int]]:
+    """
+    Hashes every image under directory in a process pool and returns
+    (duplicate, kept, distance) for each image within threshold of an earlier one.
+    The oldest image of each group is the one kept.
+    """
+    paths = []
+    for dirpath, _, filenames in os.walk(directory):
+        paths.extend(os.path.join(dirpath, name) for name in filenames if name.lower().endswith(IMAGE_EXTENSIONS))
+    paths.sort(key=lambda p: (os.stat(p).st_mtime, p))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        hashes = list(pool.map(_hash_file, paths, chunksize=32))
+    tree = BKTree()
+    duplicates = []
+    for path, hash_value in hashes:
+        if hash_value is None:
+            logger.warning(f"Skipping unreadable image {path}")
+            continue
+        match = tree.search(hash_value, threshold)
+        if match:
+            duplicates.append((path, match[0][1], match[0][0]))
+        else:
+            tree.add(hash_value, path)
+    return duplicates
+
+
+def _link_duplicate(duplicate: str, kept: str) -> None:
+    """Replaces duplicate with a hard link to kept, so both paths share one copy of the bytes."""
+    tmp_path = f"{duplicate}.dedupe.tmp"
+    os.link(kept, tmp_path)
+    os.replace(tmp_path, duplicate)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m bytemymood.tools.image_generation.perceptual")
+    commands = parser.add_subparsers(dest="command", required=True)
+    dedupe = commands.add_parser("dedupe", help="Find near-identical images in a directory")
+    dedupe.add_argument("directory")
+    dedupe.add_argument("--threshold", type=int, default=constants.IMAGE_DEDUPE_THRESHOLD,
+                        help="Maximum differing hash bits for two images to count as duplicates")
+    dedupe.add_argument("--workers", type=int, default=None, help="Hashing processes (default: CPU count)")
+    dedupe.add_argument("--link", action="store_true",
+                        help="Replace each duplicate with a hard link to the image it duplicates")
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+
+    duplicates = find_duplicates(args.directory, args.threshold, args.workers)
+    saved = 0
+    for duplicate, kept, distance in duplicates:
+        print(f"{duplicate} -> {kept} (distance {distance})")
+        if args.link and not os.path.samefile(duplicate, kept):
+            saved += os.path.getsize(duplicate)
+            _link_duplicate(duplicate, kept)
+    print(f"Found {len(duplicates)} duplicates" + (f"; freed {saved} bytes" if args.link else ""))
+
+
+if __name__ == "__main__":
+    main()
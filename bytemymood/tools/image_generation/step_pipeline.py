@@ -0,0 +1,262 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Look-ahead image generation for the steps of a recipe.
+
+Once the execution agent has parsed a recipe, prepare_step_images hands the
+step descriptions to a per-session StepImagePipeline. Its workers enhance and
+render the current step first, then the next few, while the user is still
+cooking. get_step_image then returns a finished image right away, or waits
+for the job already in flight, raised to interactive priority, instead of
+starting a new one. The rendered bytes go through the shared image store;
+only the artifact save, which belongs to the session, happens when the step
+is shown. A session's pipeline is closed once it has gone unused for
+STEP_IMAGE_PIPELINE_IDLE_TTL_SECONDS.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from google.adk.tools import FunctionTool, ToolContext
+
+from bytemymood.shared_libraries import constants, metrics
+from bytemymood.shared_libraries.context import session_id
+from bytemymood.shared_libraries.rate_limit import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_INTERACTIVE,
+    CallPriority,
+    RateLimitExceeded,
+    call_priority,
+)
+from bytemymood.tools.image_generation.image_generation import (
+    _enhance_prompt_for_image_gen,
+    _image_request,
+    _obtain_image,
+    _rate_limit_error,
+    _save_session_image,
+    _session_image,
+)
+
+logger = logging.getLogger(__name__)
+
+
+async def _prepare_step_image(desc: str) -> Dict[str, Any]:
+    """
+    Enhances a step description and renders its image. Falls back to the raw description if
+    enhancement fails, but reports a rate-limited enhancement with when to retry.
+    """
+    try:
+        prompt = await _enhance_prompt_for_image_gen(desc) or desc
+        config, key = _image_request(prompt)
+        result = await _obtain_image(prompt, config, key)
+    except RateLimitExceeded as e:
+        return _rate_limit_error("Prompt enhancement", e)
+    except Exception as e:
+        logger.error(f"Step image preparation failed: {e}", exc_info=True)
+        return {"error": str(e)}
+    return {**result, "key": key, "prompt": prompt}
+
+
+class StepImagePipeline:
+    """
+    Prepares the images for one recipe's steps, at most `concurrency` at a time.
+    Only the current step and the `lookahead` steps after it are started, nearest first.
+    """
+
+    def __init__(self, steps: List[str], lookahead: int, concurrency: int):
+        self.steps = list(steps)
+        self.lookahead = lookahead
+        self.current = 1
+        self.last_used = time.monotonic()
+        self._jobs: Dict[int, "asyncio.Future[Dict[str, Any]]"] = {}
+        self._priorities: Dict[int, CallPriority] = {}
+        self._wake = asyncio.Event()
+        self._workers = [asyncio.ensure_future(self._worker()) for _ in range(concurrency)]
+
+    def _next_step(self) -> Optional[int]:
+        """Returns the unstarted step nearest to the current one within the look-ahead window."""
+        last = min(self.current + self.lookahead, len(self.steps))
+        for number in range(self.current, last + 1):
+            if number not in self._jobs:
+                return number
+        return None
+
+    def _start(self, number: int, priority: int) -> "asyncio.Future[Dict[str, Any]]":
+        # Each job has its own priority so that the one a user is waiting for can be raised alone.
+        self._priorities[number] = CallPriority(priority)
+        with call_priority(self._priorities[number]):
+            job = asyncio.ensure_future(_prepare_step_image(self.steps[number - 1]))
+        self._jobs[number] = job
+        return job
+
+    async def _worker(self) -> None:
+        while True:
+            number = self._next_step()
+            if number is None:
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+            logger.debug(f"Prefetching image for step {number} (current step {self.current})")
+            # Prefetches yield to interactive Gemini calls when the model is rate limited.
+            await asyncio.wait([self._start(number, PRIORITY_BACKGROUND)])
+
+    async def get(self, number: int) -> Tuple[Dict[str, Any], str]:
+        """
+        Makes number the current step and returns its prepared image with how it was
+        obtained: "ready" if it was already finished, "in_flight" if it was being
+        prepared, or "started" if it had not been started yet.
+        """
+        if not 1 <= number <= len(self.steps):
+            raise ValueError(f"Step {number} is out of range; the recipe has {len(self.steps)} steps")
+        self.current = number
+        # Earlier steps' images stay in the image store; drop their bytes here.
+        for done in [n for n, job in self._jobs.items() if n < number and job.done()]:
+            del self._jobs[done]
+            del self._priorities[done]
+        self._wake.set()
+        job = self._jobs.get(number)
+        if job is not None and job.done() and "error" in job.result():
+            job = None  # Retry a failed step rather than returning the same error again
+        if job is None:
+            status, job = "started", self._start(number, PRIORITY_INTERACTIVE)
+        elif job.done():
+            status = "ready"
+        else:
+            # A user is now waiting for this prefetch, so it no longer yields to other calls.
+            status = "in_flight"
+            self._priorities[number].raise_to(PRIORITY_INTERACTIVE)
+        # Shielded so a cancelled tool call does not throw away the prepared image.
+        return await asyncio.shield(job), status
+
+    def close(self) -> None:
+        """Stops the workers and cancels unfinished jobs."""
+        for task in [*self._workers, *self._jobs.values()]:
+            if not task.done():
+                task.cancel()
+
+
+_pipelines: "OrderedDict[str, StepImagePipeline]" = OrderedDict()  # Least recently used first
+_sweep_loop: Optional[asyncio.AbstractEventLoop] = None  # Loop on which the next idle sweep is scheduled
+
+
+def _expire_idle_pipelines() -> None:
+    """Closes the pipelines of sessions that have not used them for longer than the TTL."""
+    cutoff = time.monotonic() - constants.STEP_IMAGE_PIPELINE_IDLE_TTL_SECONDS
+    while _pipelines:
+        session, pipeline = next(iter(_pipelines.items()))
+        if pipeline.last_used > cutoff:
+            break
+        del _pipelines[session]
+        pipeline.close()
+        metrics.increment("step_image_pipelines", outcome="expired")
+        logger.debug(f"Session {session} idle; closed its step image pipeline")
+
+
+def _sweep_idle_pipelines() -> None:
+    global _sweep_loop
+    _sweep_loop = None
+    _expire_idle_pipelines()
+    if _pipelines:
+        oldest = next(iter(_pipelines.values()))
+        _schedule_sweep(oldest.last_used + constants.STEP_IMAGE_PIPELINE_IDLE_TTL_SECONDS - time.monotonic())
+
+
+def _schedule_sweep(delay: float) -> None:
+    """Schedules an idle sweep on the running loop unless one is already due there."""
+    global _sweep_loop
+    loop = asyncio.get_running_loop()
+    if _sweep_loop is loop:
+        return
+    _sweep_loop = loop
+    loop.call_later(max(0.0, delay), _sweep_idle_pipelines)
+
+
+def start_step_pipeline(session_id: str, steps: List[str]) -> StepImagePipeline:
+    """Starts preparing images for a session's recipe steps, replacing any earlier pipeline for the session."""
+    _expire_idle_pipelines()
+    previous = _pipelines.pop(session_id, None)
+    if previous is not None:
+        previous.close()
+    pipeline = StepImagePipeline(steps, constants.STEP_IMAGE_LOOKAHEAD, constants.STEP_IMAGE_CONCURRENCY)
+    _pipelines[session_id] = pipeline
+    while len(_pipelines) > constants.STEP_IMAGE_MAX_PIPELINES:
+        _, evicted = _pipelines.popitem(last=False)
+        evicted.close()
+    _schedule_sweep(constants.STEP_IMAGE_PIPELINE_IDLE_TTL_SECONDS)
+    return pipeline
+
+
+def get_step_pipeline(session_id: str) -> Optional[StepImagePipeline]:
+    """Returns the session's pipeline, if one was started and has not gone idle."""
+    _expire_idle_pipelines()
+    pipeline = _pipelines.get(session_id)
+    if pipeline is not None:
+        pipeline.last_used = time.monotonic()
+        _pipelines.move_to_end(session_id)
+    return pipeline
+
+
+async def prepare_step_images(steps: List[str], tool_context: ToolContext) -> Dict[str, Any]:
+    """
+    Starts generating images for every step of the parsed recipe in the background.
+    Call this once, right after parsing the recipe, with the step descriptions in order.
+
+    Args:
+        steps: The description of each recipe step, in order.
+        tool_context: The ADK tool context.
+
+    Returns:
+        The number of steps queued.
+    """
+    steps = [step.strip() for step in steps if step and step.strip()]
+    if not steps:
+        return {"error": "No steps given"}
+    start_step_pipeline(session_id(tool_context), steps)
+    logger.info(f"Started step image pipeline for {len(steps)} steps")
+    return {"status": f"Preparing images for {len(steps)} steps", "steps": len(steps)}
+
+
+async def get_step_image(step_number: int, tool_context: ToolContext) -> Dict[str, Any]:
+    """
+    Returns the image for a recipe step prepared by prepare_step_images, waiting for it if
+    it is still being generated, and saves it as an artifact for this session.
+
+    Args:
+        step_number: The 1-based number of the step to show.
+        tool_context: The ADK tool context.
+
+    Returns:
+        The artifact name and version of the step image, or an error.
+    """
+    pipeline = get_step_pipeline(session_id(tool_context))
+    if pipeline is None:
+        return {"error": "No steps prepared for this session; call prepare_step_images first"}
+    try:
+        result, status = await pipeline.get(step_number)
+    except ValueError as e:
+        return {"error": str(e)}
+    metrics.increment("step_images", outcome=status)
+    if "error" in result:
+        return result
+    saved = _session_image(result["key"], tool_context)
+    if saved is None:
+        saved = await _save_session_image(result["key"], result["image_bytes"], result["cached"], tool_context)
+    return {**saved, "step": step_number, "prompt": result["prompt"]}
+
+
+prepare_step_images_tool = FunctionTool(func=prepare_step_images)
+step_image_tool = FunctionTool(func=get_step_image)
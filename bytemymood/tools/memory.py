@@ -14,19 +14,81 @@
 
 """The 'memorize' tool for several agents to affect session states."""
 
+import asyncio
 from datetime import datetime
 import json
+import logging
 import os
-from typing import Dict, Any
+import threading
+import time
+from typing import Dict, Any, List, Tuple
 
 from google.adk.agents.callback_context import CallbackContext
 from google.adk.sessions.state import State
 from google.adk.tools import ToolContext
 
+from pydantic import ValidationError
+
 from bytemymood.shared_libraries import constants
+from bytemymood.shared_libraries.context import session_id, user_id
+from bytemymood.shared_libraries.frozen import freeze
+from bytemymood.shared_libraries.indexed_list import IndexedList, indexed_copy
+from bytemymood.shared_libraries.journal import ADD, REMOVE, SET, Op
+from bytemymood.shared_libraries.types import MemoryUpdate, ProfileFile, ProfileState
+from bytemymood.tools.profile_repository import get_profile_repository
+from bytemymood.tools.weather import start_weather_prefetch
+
+logger = logging.getLogger(__name__)
 
 SAMPLE_PROFILE_PATH = os.path.join(os.path.dirname(__file__), "../user_profiles/user_profile_default.json")
 
+# Parsed, frozen profile templates by path: (mtime_ns, last checked (monotonic), profile data)
+_profile_templates: Dict[str, Tuple[int, float, Dict[str, Any]]] = {}
+_profile_templates_lock = threading.Lock()
+
+
+def _write_back(tool_context: ToolContext, *ops: Op):
+    """Journals state changes to be saved to the user's stored profile."""
+    repository = get_profile_repository()
+    # Only durable preferences outlive the session; the current recipe, mood and progress do not
+    ops = [op for op in ops if op[1] in constants.PROFILE_PERSISTED_KEYS]
+    if repository is None or not ops:
+        return
+    try:
+        base = _durable(_loaded_template_state())
+    except (OSError, ValueError) as e:
+        logger.warning(f"Profile template unavailable, saving changes only: {e}")
+        base = {}
+    repository.record(user_id(tool_context), ops, base=base)
+
+
+def _loaded_template_state() -> Dict[str, Any]:
+    """
+    Returns the sample profile state as last loaded by the profile callback, without
+    revalidating it, so the tools do not touch the disk. Reads it only if no callback has run.
+    """
+    cached = _profile_templates.get(SAMPLE_PROFILE_PATH)
+    if cached is not None:
+        return cached[2]["state"]
+    return _get_profile_template(SAMPLE_PROFILE_PATH)["state"]
+
+
+def _durable(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Returns the keys of a profile state that are saved across sessions."""
+    return {key: value for key, value in state.items() if key in constants.PROFILE_PERSISTED_KEYS}
+
+
+def _owned_list(mem_dict: State, key: str) -> IndexedList:
+    """
+    Returns the session's own IndexedList for key, to be changed in place.
+    Values loaded from a profile are frozen and may be shared with other
+    sessions, so they are copied the first time they change; the copy is the
+    session's from then on, and later changes cost O(1) rather than a copy.
+    """
+    value = mem_dict.get(key)
+    if isinstance(value, IndexedList):
+        return value
+    return indexed_copy(value)
 
 
 def memorize_list(key: str, value: str, tool_context: ToolContext):
@@ -42,13 +104,37 @@ def memorize_list(key: str, value: str, tool_context: ToolContext):
         A status message.
     """
     mem_dict = tool_context.state
-    if key not in mem_dict:
-        mem_dict[key] = []
-    if value not in mem_dict[key]:
-        mem_dict[key].append(value)
+    if key not in mem_dict or value not in mem_dict[key]:
+        items = _owned_list(mem_dict, key)
+        items.add(value)
+        mem_dict[key] = items  # Reassigned so the change is recorded in the state delta
+        _write_back(tool_context, (ADD, key, [value]))
     return {"status": f'Stored "{key}": "{value}"'}
 
 
+def memorize_list_items(key: str, values: List[str], tool_context: ToolContext):
+    """
+    Memorize several pieces of information into a list in one call.
+    Use this instead of repeated memorize_list calls when adding many items,
+    e.g. a whole fridge inventory.
+
+    Args:
+        key: the label indexing the memory to store the values.
+        values: the pieces of information to be stored.
+        tool_context: The ADK tool context.
+
+    Returns:
+        A status message.
+    """
+    mem_dict = tool_context.state
+    items = _owned_list(mem_dict, key)
+    added = items.add_many(values)
+    if added or key not in mem_dict:
+        mem_dict[key] = items
+        _write_back(tool_context, (ADD, key, added))
+    return {"status": f'Stored {len(added)} new items in "{key}"', "added": added}
+
+
 def memorize(key: str, value: str, tool_context: ToolContext):
     """
     Memorize pieces of information, one key-value pair at a time.
@@ -64,9 +150,57 @@ def memorize(key: str, value: str, tool_context: ToolContext):
     mem_dict = tool_context.state
     mem_dict[key] = value
     print(f"Stored {key}: {value}")
+    _write_back(tool_context, (SET, key, value))
     return {"status": f'Stored "{key}": "{value}"'}
 
 
+def memorize_many(updates: List[MemoryUpdate], tool_context: ToolContext):
+    """
+    Memorize several pieces of information in one call. Either every update
+    is stored or, if any of them is invalid, none are.
+
+    Args:
+        updates: the updates to apply. Each has a key and either a value to
+            store under it, or values to add to the list stored under it.
+        tool_context: The ADK tool context.
+
+    Returns:
+        A status message.
+    """
+    mem_dict = tool_context.state
+    try:
+        parsed = [MemoryUpdate.model_validate(update) for update in updates]
+    except ValidationError as e:
+        return {"error": f"Invalid updates, nothing stored: {e}"}
+
+    changes: Dict[str, Any] = {}
+    ops: List[Op] = []
+    for update in parsed:
+        if update.key in changes:
+            return {"error": f'Duplicate key "{update.key}", nothing stored'}
+        if update.key in (constants.USER_PROFILE, constants.SYSTEM_TIME):
+            return {"error": f'"{update.key}" cannot be memorized, nothing stored'}
+        if (update.value is None) == (update.values is None):
+            return {"error": f'"{update.key}" needs exactly one of value or values, nothing stored'}
+        if update.values is None:
+            changes[update.key] = update.value
+            ops.append((SET, update.key, update.value))
+        else:
+            items = indexed_copy(mem_dict.get(update.key))
+            ops.append((ADD, update.key, items.add_many(update.values)))
+            changes[update.key] = items
+    try:
+        # Profile fields keep their types, e.g. allergies stays a list
+        ProfileState.model_validate(changes)
+    except ValidationError as e:
+        return {"error": f"Invalid updates, nothing stored: {e}"}
+
+    for key, value in changes.items():
+        mem_dict[key] = value
+    _write_back(tool_context, *ops)
+    return {"status": f"Stored {len(changes)} values: {', '.join(changes)}"}
+
+
 def forget(key: str, value: str, tool_context: ToolContext):
     """
     Forget pieces of information.
@@ -82,17 +216,42 @@ def forget(key: str, value: str, tool_context: ToolContext):
     if tool_context.state[key] is None:
         tool_context.state[key] = []
     if value in tool_context.state[key]:
-        tool_context.state[key].remove(value)
+        items = _owned_list(tool_context.state, key)
+        items.discard(value)
+        tool_context.state[key] = items
+        _write_back(tool_context, (REMOVE, key, [value]))
     return {"status": f'Removed "{key}": "{value}"'}
 
 
+def forget_list_items(key: str, values: List[str], tool_context: ToolContext):
+    """
+    Forget several pieces of information from a list in one call.
+
+    Args:
+        key: the label indexing the memory to remove the values from.
+        values: the pieces of information to be removed.
+        tool_context: The ADK tool context.
+
+    Returns:
+        A status message.
+    """
+    items = _owned_list(tool_context.state, key)
+    removed = items.discard_many(values)
+    if removed:
+        tool_context.state[key] = items
+        _write_back(tool_context, (REMOVE, key, removed))
+    return {"status": f'Removed {len(removed)} items from "{key}"', "removed": removed}
+
+
 def _set_initial_states(source: Dict[str, Any], target: State | dict[str, Any]):
     """
     Setting the initial session state given a JSON object of states.
-    Handles nested JSON structures by recursively copying values.
+    Nested values are stored as read-only references to the frozen source
+    rather than copies, so sessions share unchanged profile data and the
+    memory tools replace a key's value when they change it.
 
     Args:
-        source: A JSON object of states.
+        source: A JSON object of states. Frozen sources are shared as-is.
         target: The session state object to insert into.
     """
     if constants.SYSTEM_TIME not in target:
@@ -101,32 +260,84 @@ def _set_initial_states(source: Dict[str, Any], target: State | dict[str, Any]):
     if constants.USER_PROFILE not in target:
         target[constants.USER_PROFILE] = True
 
-        # Recursively copy all values from source to target
-        for key, value in source.items():
-            if isinstance(value, dict):
-                # For nested dictionaries, create a new dict and recursively copy
-                target[key] = {}
-                _set_initial_states(value, target[key])
-            elif isinstance(value, list):
-                # For lists, create a new list with copied values
-                target[key] = value.copy()
-            else:
-                # For primitive values, copy directly
-                target[key] = value
+        for key, value in freeze(source).items():
+            target[key] = value
 
 
-def _load_user_profile(callback_context: CallbackContext):
+def _get_profile_template(path: str = SAMPLE_PROFILE_PATH) -> Dict[str, Any]:
+    """
+    Returns the parsed profile file at path, reading it from disk only when its
+    mtime has changed. The mtime itself is checked at most once every
+    PROFILE_REVALIDATE_SECONDS, and each new version is validated once against
+    the ProfileFile schema.
+
+    Args:
+        path: Path of the profile JSON file.
+
+    Returns:
+        The frozen profile data, e.g. {"state": {...}}.
+    """
+    now = time.monotonic()
+    cached = _profile_templates.get(path)
+    if cached is not None and now - cached[1] < constants.PROFILE_REVALIDATE_SECONDS:
+        return cached[2]
+
+    with _profile_templates_lock:
+        mtime_ns = os.stat(path).st_mtime_ns
+        cached = _profile_templates.get(path)
+        if cached is not None and cached[0] == mtime_ns:
+            _profile_templates[path] = (mtime_ns, now, cached[2])
+            return cached[2]
+
+        with open(path, "r") as file:
+            data = json.load(file)
+        try:
+            ProfileFile.model_validate(data)
+        except ValidationError as e:
+            if cached is None:
+                raise ValueError(f"Invalid user profile {path}: {e}") from e
+            # Keep serving the last valid version rather than breaking live sessions
+            logger.error(f"Ignoring invalid update to user profile {path}: {e}")
+            _profile_templates[path] = (mtime_ns, now, cached[2])
+            return cached[2]
+        logger.info(f"Loaded user profile template from {path}")
+        data = freeze(data)
+        _profile_templates[path] = (mtime_ns, now, data)
+        return data
+
+
+def _initial_profile(user: str) -> Dict[str, Any]:
+    """
+    Returns the sample profile overlaid with the user's stored preferences, if any.
+    May read from disk.
+    """
+    template = _get_profile_template(SAMPLE_PROFILE_PATH)["state"]
+    repository = get_profile_repository()
+    stored = repository.get(user) if repository else None
+    if not stored:
+        return template
+    return {**template, **_durable(stored)}
+
+
+async def _load_user_profile(callback_context: CallbackContext):
     """
     Sets up the initial user profile state.
     Set this as a callback as before_agent_call of the root_agent.
     This gets called before the system instruction is constructed.
+    The user's stored profile is used when there is one; new users start
+    from the sample profile.
 
     Args:
         callback_context: The callback context.
-    """    
-    data = {}
-    with open(SAMPLE_PROFILE_PATH, "r") as file:
-        data = json.load(file)
-        # print(f"\nLoading User Profile: {data}\n")
+    """
+    state = callback_context.state
+    if constants.USER_PROFILE not in state:
+        # Profile storage is read off the event loop
+        profile = await asyncio.to_thread(_initial_profile, user_id(callback_context))
+        _set_initial_states(profile, state)
+    elif constants.SYSTEM_TIME not in state:
+        state[constants.SYSTEM_TIME] = str(datetime.now())
 
-    _set_initial_states(data["state"], callback_context.state)
+    # Warm the weather cache for the profile's location while the model is still thinking.
+    # The prefetch outlives this turn and is released once the session goes idle.
+    start_weather_prefetch(session_id(callback_context), state.get("city"), state.get("country"))
@@ -0,0 +1,444 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Per-user profile storage.
+
+Profiles are looked up by user_id through a ProfileRepository, which keeps an
+LRU of recently used profiles in front of a storage backend and buffers
+changes so they are written back in batches.
+
+Changes are stored as journal entries (see shared_libraries/journal.py)
+appended after the user's last snapshot, so writing back a change costs in
+proportion to the change rather than to the whole profile. Loading replays
+the journal over the snapshot, and once a user's journal reaches
+`compact_after` entries it is folded into a new snapshot.
+
+The journal covers only these profile write-backs. How session state is
+persisted is up to the session service the runtime supplies (AdkApp, Agent
+Engine or `adk web`), which this package does not create. ADK's
+DatabaseSessionService, for one, rewrites the whole session state on every
+event that changes it.
+
+    SqliteProfileBackend: snapshot and journal tables in one SQLite file (default).
+    FileProfileBackend: a {"state": {...}} JSON snapshot per user, the same
+        format as the bundled files in bytemymood/user_profiles, next to a
+        JSON-lines journal.
+"""
+
+import abc
+import atexit
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from bytemymood.shared_libraries import constants
+from bytemymood.shared_libraries.cache import LRUCache
+from bytemymood.shared_libraries.frozen import FrozenDict, freeze
+from bytemymood.shared_libraries.journal import Op, apply_ops
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+_ABSENT = object()  # Cached for users with no stored profile, so they are looked up once
+
+
+class ProfileBackend(abc.ABC):
+    """Storage for profile states keyed by user_id."""
+
+    @abc.abstractmethod
+    def load(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Returns the stored profile state for user_id, or None if there is none."""
+
+    @abc.abstractmethod
+    def append(self, entries: Iterable[Tuple[str, List[Op]]]) -> None:
+        """Appends (user_id, ops) journal entries, compacting journals that have grown too long."""
+
+    @abc.abstractmethod
+    def save_many(self, profiles: Iterable[Tuple[str, Dict[str, Any]]]) -> None:
+        """Writes (user_id, state) snapshots, replacing any stored state and journal."""
+
+    def close(self) -> None:
+        pass
+
+
+class SqliteProfileBackend(ProfileBackend):
+    """Stores profile snapshots and journal entries as JSON rows indexed by user_id."""
+
+    def __init__(self, path: str, compact_after: int = 100):
+        self.path = path
+        self.compact_after = compact_after
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS profiles "
+                "(user_id TEXT PRIMARY KEY, state TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS profile_journal "
+                "(id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL, "
+                "op TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS profile_journal_user ON profile_journal (user_id, id)"
+            )
+            self._conn.commit()
+
+    def _load(self, user_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn.execute("SELECT state FROM profiles WHERE user_id = ?", (user_id,)).fetchone()
+        ops = [
+            (op, key, json.loads(value))
+            for op, key, value in self._conn.execute(
+                "SELECT op, key, value FROM profile_journal WHERE user_id = ? ORDER BY id", (user_id,)
+            )
+        ]
+        if row is None and not ops:
+            return None
+        return apply_ops(json.loads(row[0]) if row else {}, ops)
+
+    def _save(self, profiles: Iterable[Tuple[str, Dict[str, Any]]]) -> None:
+        now = time.time()
+        rows = [(user_id, json.dumps(state), now) for user_id, state in profiles]
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO profiles (user_id, state, updated_at) VALUES (?, ?, ?)", rows
+        )
+        self._conn.executemany("DELETE FROM profile_journal WHERE user_id = ?", [(row[0],) for row in rows])
+
+    def load(self, user_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._load(user_id)
+
+    def append(self, entries: Iterable[Tuple[str, List[Op]]]) -> None:
+        rows = [
+            (user_id, op, key, json.dumps(value))
+            for user_id, ops in entries
+            for op, key, value in ops
+        ]
+        if not rows:
+            return
+        user_ids = sorted({row[0] for row in rows})
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT INTO profile_journal (user_id, op, key, value) VALUES (?, ?, ?, ?)", rows
+                )
+                placeholders = ",".join("?" * len(user_ids))
+                full = [
+                    user_id
+                    for user_id, in self._conn.execute(
+                        f"SELECT user_id FROM profile_journal WHERE user_id IN ({placeholders}) "
+                        "GROUP BY user_id HAVING COUNT(*) >= ?",
+                        (*user_ids, self.compact_after),
+                    )
+                ]
+                if full:
+                    self._save((user_id, self._load(user_id)) for user_id in full)
+                    logger.debug(f"Compacted profile journals for {len(full)} users")
+
+    def save_many(self, profiles: Iterable[Tuple[str, Dict[str, Any]]]) -> None:
+        with self._lock:
+            with self._conn:
+                self._save(profiles)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class FileProfileBackend(ProfileBackend):
+    """Stores each profile as <directory>/<user_id>.json plus <user_id>.journal."""
+
+    def __init__(self, directory: str, compact_after: int = 100):
+        self.directory = directory
+        self.compact_after = compact_after
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, user_id: str, extension: str = ".json") -> str:
+        # Keep readable ids as-is; anything that could escape the directory is hashed.
+        if re.fullmatch(r"[A-Za-z0-9_.@-]{1,128}", user_id) and not user_id.startswith("."):
+            name = user_id
+        else:
+            name = hashlib.sha256(user_id.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{name}{extension}")
+
+    def _read_journal(self, user_id: str) -> List[Op]:
+        ops = []
+        try:
+            with open(self._path(user_id, ".journal"), "r") as f:
+                for line in f:
+                    try:
+                        ops.append(tuple(json.loads(line)))
+                    except ValueError:
+                        # A torn final line from an interrupted append
+                        logger.warning(f"Skipping unreadable journal entry for {user_id}")
+        except FileNotFoundError:
+            pass
+        return ops
+
+    def _load(self, user_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(user_id), "r") as f:
+                state = json.load(f)["state"]
+        except FileNotFoundError:
+            state = None
+        ops = self._read_journal(user_id)
+        if state is None and not ops:
+            return None
+        return apply_ops(state or {}, ops)
+
+    def _save(self, user_id: str, state: Dict[str, Any]) -> None:
+        path = self._path(user_id)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"state": state}, f, indent=2)
+        os.replace(tmp_path, path)
+        try:
+            os.remove(self._path(user_id, ".journal"))
+        except FileNotFoundError:
+            pass
+
+    def load(self, user_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._load(user_id)
+
+    def append(self, entries: Iterable[Tuple[str, List[Op]]]) -> None:
+        with self._lock:
+            for user_id, ops in entries:
+                with open(self._path(user_id, ".journal"), "a") as f:
+                    f.writelines(json.dumps(list(op)) + "\n" for op in ops)
+                if len(self._read_journal(user_id)) >= self.compact_after:
+                    self._save(user_id, self._load(user_id))
+
+    def save_many(self, profiles: Iterable[Tuple[str, Dict[str, Any]]]) -> None:
+        with self._lock:
+            for user_id, state in profiles:
+                self._save(user_id, state)
+
+
+class ProfileRepository:
+    """
+    An LRU of hot profiles in front of a backend, with batched write-back.
+    Changes are buffered until `batch_size` users have pending changes or
+    `flush_interval` seconds have passed since the last write, and are then
+    written on a background thread, so recording a change never waits on
+    storage. flush() writes synchronously.
+    """
+
+    def __init__(
+        self,
+        backend: ProfileBackend,
+        cache_size: int = 1024,
+        batch_size: int = 32,
+        flush_interval: float = 5.0,
+    ):
+        self.backend = backend
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._cache = LRUCache(cache_size)
+        # Journal entries not yet written, by user
+        self._pending: Dict[str, List[Op]] = {}
+        # Full states of users with no stored profile yet; their first write is a snapshot
+        self._new: Dict[str, Dict[str, Any]] = {}
+        # Changes taken by a flush that is still writing them
+        self._writing: Dict[str, List[Op]] = {}
+        self._writing_new: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="profile-writer")
+        self._scheduled: Optional[Future] = None
+        self._timer: Optional[threading.Timer] = None
+
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the frozen profile state for user_id, or None if the user has none yet.
+        A user found to have no profile is remembered, so later calls do not touch storage.
+        """
+        with self._lock:
+            state = self._cache.get(user_id, _MISSING)
+            if state is _ABSENT:
+                return None
+            if state is _MISSING:
+                if user_id in self._new:
+                    state = self._new[user_id]
+                else:
+                    state = self._writing_new.get(user_id, _MISSING)
+                    if state is _MISSING:
+                        state = self.backend.load(user_id)
+                    # Replaying entries is idempotent, so changes a flush has already written can be applied again.
+                    ops = self._writing.get(user_id, []) + self._pending.get(user_id, [])
+                    if ops:
+                        state = apply_ops(state or {}, ops)
+                if state is None:
+                    self._cache.set(user_id, _ABSENT)
+            if state is not None and not isinstance(state, FrozenDict):
+                # Freeze on read rather than on every update.
+                state = freeze(state)
+                self._cache.set(user_id, state)
+            return state
+
+    def record(self, user_id: str, ops: List[Op], base: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Applies journal entries to the user's profile and schedules them to be written back.
+
+        Args:
+            user_id: The user the profile belongs to.
+            ops: The (op, key, value) changes, in order.
+            base: The state to start from if the user has no stored profile yet.
+        """
+        with self._lock:
+            current = self.get(user_id)
+            if current is None:
+                current = base or {}
+                self._new[user_id] = current
+            state = apply_ops(current, ops)
+            if user_id in self._new:
+                self._new[user_id] = state
+            else:
+                self._pending.setdefault(user_id, []).extend(ops)
+            self._cache.set(user_id, state)
+            if self.pending() >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval:
+                self._schedule_flush()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self._schedule_flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _schedule_flush(self) -> None:
+        """Starts a flush on the writer thread unless one is already waiting to run."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._scheduled is not None and not self._scheduled.running() and not self._scheduled.done():
+                return
+            try:
+                self._scheduled = self._writer.submit(self.flush)
+            except RuntimeError:
+                pass  # Shutting down; close() writes what is left
+
+    def drain(self) -> None:
+        """Waits for any background flush that has been started to finish."""
+        scheduled = self._scheduled
+        if scheduled is not None:
+            scheduled.result()
+
+    def flush(self) -> int:
+        """Writes every pending change to the backend. Returns the number of profiles written."""
+        with self._flush_lock:
+            with self._lock:
+                self._last_flush = time.monotonic()
+                if not self._pending and not self._new:
+                    return 0
+                pending, self._pending = self._pending, {}
+                new, self._new = self._new, {}
+                self._writing, self._writing_new = pending, new
+            # Storage is written without holding the repository lock, so records and reads carry on meanwhile.
+            try:
+                if new:
+                    self.backend.save_many(new.items())
+                if pending:
+                    self.backend.append(pending.items())
+            except (sqlite3.Error, OSError) as e:
+                logger.error(f"Failed to write back {len(pending) + len(new)} profiles: {e}")
+                with self._lock:
+                    # Keep the changes so the next flush retries them, ahead of any newer ones.
+                    for user_id, ops in pending.items():
+                        self._pending[user_id] = ops + self._pending.get(user_id, [])
+                    for user_id, state in new.items():
+                        # Changes recorded during the write were journaled against this snapshot.
+                        self._new[user_id] = apply_ops(state, self._pending.pop(user_id, []))
+                    self._writing, self._writing_new = {}, {}
+                return 0
+            with self._lock:
+                self._writing, self._writing_new = {}, {}
+            logger.debug(f"Wrote back {len(pending) + len(new)} profiles")
+            return len(pending) + len(new)
+
+    def pending(self) -> int:
+        return len(self._pending) + len(self._new)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        self._writer.shutdown(wait=True)
+        self.flush()
+        self.backend.close()
+
+
+def _build_backend() -> Optional[ProfileBackend]:
+    backend = constants.PROFILE_BACKEND
+    if backend == "sqlite":
+        return SqliteProfileBackend(
+            os.path.join(constants.PROFILE_STORE_PATH, "profiles.sqlite3"),
+            compact_after=constants.PROFILE_JOURNAL_COMPACT_AFTER,
+        )
+    if backend == "file":
+        return FileProfileBackend(constants.PROFILE_STORE_PATH, compact_after=constants.PROFILE_JOURNAL_COMPACT_AFTER)
+    if backend:
+        logger.warning(f"Unknown profile backend {backend!r}; per-user profiles disabled.")
+    return None
+
+
+_repository: Optional[ProfileRepository] = None
+_repository_lock = threading.Lock()
+_repository_unavailable = False
+
+
+def get_profile_repository() -> Optional[ProfileRepository]:
+    """Returns the shared profile repository, opening it on first use. None if disabled or unavailable."""
+    global _repository, _repository_unavailable
+    if _repository_unavailable:
+        return None
+    if _repository is None:
+        with _repository_lock:
+            if _repository is None:
+                try:
+                    backend = _build_backend()
+                except (sqlite3.Error, OSError) as e:
+                    logger.warning(f"Could not open profile store {constants.PROFILE_STORE_PATH}: {e}")
+                    backend = None
+                if backend is None:
+                    _repository_unavailable = True
+                    return None
+                _repository = ProfileRepository(
+                    backend,
+                    cache_size=constants.PROFILE_CACHE_SIZE,
+                    batch_size=constants.PROFILE_WRITE_BATCH_SIZE,
+                    flush_interval=constants.PROFILE_WRITE_INTERVAL_SECONDS,
+                )
+    return _repository
+
+
+def flush_profiles() -> None:
+    """Writes back any buffered profile changes."""
+    if _repository is not None:
+        _repository.flush()
+
+
+atexit.register(flush_profiles)
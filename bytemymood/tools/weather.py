@@ -3,14 +3,22 @@ Weather API tool using Google Maps Geocoding and Google Weather API for real-tim
 Returns fields most relevant for recipe inspiration.
 """
 
+import asyncio
 import logging
 import os
+import time
 import httpx
-from typing import Dict, Any, Optional
+from typing import AsyncIterator, Dict, Any, Iterable, List, Optional, Set, Tuple
 from datetime import datetime
 from dotenv import load_dotenv
 from google.adk.tools import FunctionTool
 
+from bytemymood.shared_libraries import constants, metrics
+from bytemymood.shared_libraries.cache import LRUCache, SingleFlight, TieredCache, open_tiered_cache
+from bytemymood.shared_libraries.resilience import CircuitOpenError, LatencyBudget, LatencyBudgetExceeded
+from bytemymood.tools.gazetteer import lookup_city, normalize_name
+from bytemymood.tools.http_client import http_get
+
 load_dotenv()
 
 logger = logging.getLogger(__name__)
@@ -20,6 +28,203 @@ GOOGLE_WEATHER_API_KEY = os.getenv("GOOGLE_WEATHER_API_KEY")
 GOOGLE_GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
 GOOGLE_WEATHER_URL = "https://weather.googleapis.com/v1/currentConditions:lookup"
 
+_GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+_geocode_cache: Optional[TieredCache] = None
+_weather_cache = LRUCache(constants.WEATHER_CACHE_MAX_ENTRIES)
+_weather_flight = SingleFlight()
+_geocode_flight = SingleFlight()
+
+# Background prefetches, deduplicated by location and reference-counted by session
+_prefetch_tasks: Dict[str, "asyncio.Task"] = {}
+_prefetch_sessions: Dict[str, Set[str]] = {}
+_session_prefetch: Dict[str, str] = {}
+_session_seen: Dict[str, float] = {}  # Last turn of each session with a prefetch (monotonic)
+
+
+def normalize_location_key(city: str, country: Optional[str] = None) -> str:
+    """
+    Builds a canonical "city,country" key so that spelling variants such as
+    " São  Paulo, BR" and "sao paulo,br" share a cache entry.
+    """
+    return f"{normalize_name(city)},{normalize_name(country)}"
+
+
+def get_geocode_cache() -> Optional[TieredCache]:
+    """Returns the shared geocode cache, opening it on first use. None if caching is disabled."""
+    global _geocode_cache
+    if _geocode_cache is None and constants.GEOCODE_CACHE_ENABLED:
+        _geocode_cache = open_tiered_cache(
+            constants.GEOCODE_CACHE_PATH, "geocode", constants.GEOCODE_CACHE_MEMORY_SIZE
+        )
+    return _geocode_cache
+
+
+def get_geocode_cache_stats() -> Dict[str, Any]:
+    """Returns hit/miss counters for the geocode cache."""
+    cache = get_geocode_cache()
+    return cache.stats() if cache else {"enabled": False}
+
+
+async def _geocode(city: str, country: Optional[str] = None, budget: Optional[LatencyBudget] = None) -> Optional[Dict[str, Any]]:
+    """
+    Resolves a city/country to coordinates and canonical locality/country names.
+    Tries the offline gazetteer first, then the geocode cache, and only then
+    calls the Google Geocoding API.
+
+    Returns:
+        A dict with lat, lon, city and country, or None if the location is unknown.
+    """
+    offline = lookup_city(city, country)
+    if offline is not None:
+        logger.debug(f"Resolved {city},{country} from the offline gazetteer")
+        return offline
+
+    cache = get_geocode_cache()
+    key = normalize_location_key(city, country)
+    if cache is not None:
+        cached = await asyncio.to_thread(cache.get, key)
+        if cached is not None:
+            logger.debug(f"Geocode cache hit for {key}")
+            return cached
+
+    return await _geocode_flight.do(key, lambda: _geocode_remote(key, city, country, budget))
+
+
+async def _geocode_remote(key: str, city: str, country: Optional[str], budget: Optional[LatencyBudget]) -> Optional[Dict[str, Any]]:
+    """Calls the Google Geocoding API and stores the resolved location in the geocode cache."""
+    location_query = city
+    if country:
+        location_query = f"{city},{country}"
+    geo_params = {
+        "address": location_query,
+        "key": GOOGLE_GEOCODING_API_KEY
+    }
+    geo_resp = await http_get(GOOGLE_GEOCODE_URL, params=geo_params, budget=budget)
+    geo_resp.raise_for_status()
+    geo_data = geo_resp.json()
+    if not geo_data.get("results"):
+        return None
+    geo_result = geo_data["results"][0]
+    resolved_city = None
+    resolved_country = None
+    for comp in geo_result.get("address_components", []):
+        if "locality" in comp["types"]:
+            resolved_city = comp["long_name"]
+        if "country" in comp["types"]:
+            resolved_country = comp["short_name"]
+    resolved = {
+        "lat": geo_result["geometry"]["location"]["lat"],
+        "lon": geo_result["geometry"]["location"]["lng"],
+        "city": resolved_city or city,
+        "country": resolved_country or country,
+    }
+    logger.info(f"Geocoded {location_query} to lat={resolved['lat']}, lon={resolved['lon']}")
+    cache = get_geocode_cache()
+    if cache is not None:
+        await asyncio.to_thread(cache.set, key, resolved)
+    return resolved
+
+
+def geohash(lat: float, lon: float, precision: int) -> str:
+    """Encodes coordinates as a geohash; nearby points share a prefix (and grid cell)."""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        rng, value = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_GEOHASH_BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(chars)
+
+
+def _get_fresh_weather(cell: str) -> Optional[Dict[str, Any]]:
+    """Returns the cached weather entry for a grid cell if it is within the TTL."""
+    entry = _weather_cache.get(cell)
+    if entry is None or time.time() - entry["fetched_at"] > constants.WEATHER_CACHE_TTL_SECONDS:
+        return None
+    return entry
+
+
+async def _fetch_current_weather(cell: str, lat: float, lon: float, budget: Optional[LatencyBudget] = None) -> Dict[str, Any]:
+    """
+    Calls the Google Weather API and stores the parsed conditions for the grid cell.
+
+    Returns:
+        A cache entry with current_weather, fetched_at and api_response_time.
+    """
+    weather_params = {
+        "key": GOOGLE_WEATHER_API_KEY,
+        "location.latitude": lat,
+        "location.longitude": lon
+    }
+    weather_resp = await http_get(GOOGLE_WEATHER_URL, params=weather_params, budget=budget)
+    weather_resp.raise_for_status()
+    weather_data = weather_resp.json()
+
+    # Parse weather data (Google's response structure)
+    # See: https://developers.google.com/maps/documentation/weather/reference/rest/v1/currentConditions/lookup
+    # Example fields: temperature, feelsLikeTemperature, weatherCondition, relativeHumidity, wind, precipitation, isDaytime, uvIndex
+    try:
+        # Google Weather API may return either a 'currentConditions' list or a flat dict
+        if "currentConditions" in weather_data and weather_data["currentConditions"]:
+            current = weather_data["currentConditions"][0]
+        else:
+            current = weather_data
+    except (KeyError, IndexError):
+        raise ValueError(f"Unexpected Google Weather API response: {weather_data}")
+
+    # Extract relevant fields for recipe inspiration
+    temperature = current.get("temperature", {}).get("degrees")
+    feels_like = current.get("feelsLikeTemperature", {}).get("degrees")
+    condition = current.get("weatherCondition", {}).get("type")
+    condition_text = current.get("weatherCondition", {}).get("description", {}).get("text")
+    humidity = current.get("relativeHumidity")
+    wind_speed = current.get("wind", {}).get("speed", {}).get("value")
+    precipitation_chance = current.get("precipitation", {}).get("probability", {}).get("percent")
+    is_daytime = current.get("isDaytime")
+    uv_index = current.get("uvIndex")
+
+    # Format for human-friendly output
+    current_weather = {
+        "temperature": f"{temperature:.1f}°C" if temperature is not None else None,
+        "feels_like": f"{feels_like:.1f}°C" if feels_like is not None else None,
+        "condition": condition,
+        "condition_text": condition_text,
+        "humidity": f"{humidity}%" if humidity is not None else None,
+        "wind_speed": f"{wind_speed} km/h" if wind_speed is not None else None,
+        "precipitation_chance": f"{precipitation_chance}%" if precipitation_chance is not None else None,
+        "is_daytime": is_daytime,
+        "uv_index": uv_index
+    }
+    entry = {
+        "current_weather": current_weather,
+        "fetched_at": time.time(),
+        "api_response_time": weather_resp.elapsed.total_seconds() if hasattr(weather_resp, 'elapsed') else None
+    }
+    _weather_cache.set(cell, entry)
+    return entry
+
+
+def get_weather_cache_stats() -> Dict[str, Any]:
+    """Returns counters for the weather cache and request coalescing."""
+    return {**_weather_cache.stats(), **_weather_flight.stats()}
+
+
 async def get_current_weather(city: str, country: Optional[str] = None) -> Dict[str, Any]:
     """
     Get current weather data for a specific city using Google Maps Geocoding and Google Weather API.
@@ -33,83 +238,42 @@ async def get_current_weather(city: str, country: Optional[str] = None) -> Dict[
         if not GOOGLE_WEATHER_API_KEY:
             return {"error": "Google Weather API key not configured. Please set GOOGLE_WEATHER_API_KEY in your .env file."}
 
+        # Geocoding and the weather lookup share one overall latency budget
+        budget = LatencyBudget(constants.WEATHER_TOOL_LATENCY_BUDGET_SECONDS, name="weather_tool")
+
         # 1. Geocode city/country to lat/lon
         location_query = city
         if country:
             location_query = f"{city},{country}"
-        geo_params = {
-            "address": location_query,
-            "key": GOOGLE_GEOCODING_API_KEY
-        }
-        async with httpx.AsyncClient() as client:
-            geo_resp = await client.get(GOOGLE_GEOCODE_URL, params=geo_params, timeout=10)
-            geo_resp.raise_for_status()
-            geo_data = geo_resp.json()
-        if not geo_data.get("results"):
+        geo = await _geocode(city, country, budget)
+        if geo is None:
             return {"error": f"Could not geocode location: {location_query}"}
-        geo_result = geo_data["results"][0]
-        lat = geo_result["geometry"]["location"]["lat"]
-        lon = geo_result["geometry"]["location"]["lng"]
-        resolved_city = None
-        resolved_country = None
-        for comp in geo_result.get("address_components", []):
-            if "locality" in comp["types"]:
-                resolved_city = comp["long_name"]
-            if "country" in comp["types"]:
-                resolved_country = comp["short_name"]
-        if not resolved_city:
-            resolved_city = city
-        if not resolved_country:
-            resolved_country = country
-
-        logger.info(f"Geocoded {location_query} to lat={lat}, lon={lon}")
-
-        # 2. Call Google Weather API
-        weather_params = {
-            "key": GOOGLE_WEATHER_API_KEY,
-            "location.latitude": lat,
-            "location.longitude": lon
-        }
-        async with httpx.AsyncClient() as client:
-            weather_resp = await client.get(GOOGLE_WEATHER_URL, params=weather_params, timeout=10)
-            weather_resp.raise_for_status()
-            weather_data = weather_resp.json()
-
-        # 3. Parse weather data (Google's response structure)
-        # See: https://developers.google.com/maps/documentation/weather/reference/rest/v1/currentConditions/lookup
-        # Example fields: temperature, feelsLikeTemperature, weatherCondition, relativeHumidity, wind, precipitation, isDaytime, uvIndex
-        try:
-            # Google Weather API may return either a 'currentConditions' list or a flat dict
-            if "currentConditions" in weather_data and weather_data["currentConditions"]:
-                current = weather_data["currentConditions"][0]
-            else:
-                current = weather_data
-        except (KeyError, IndexError):
-            return {"error": f"Unexpected Google Weather API response: {weather_data}"}
-
-        # Extract relevant fields for recipe inspiration
-        temperature = current.get("temperature", {}).get("degrees")
-        feels_like = current.get("feelsLikeTemperature", {}).get("degrees")
-        condition = current.get("weatherCondition", {}).get("type")
-        condition_text = current.get("weatherCondition", {}).get("description", {}).get("text")
-        humidity = current.get("relativeHumidity")
-        wind_speed = current.get("wind", {}).get("speed", {}).get("value")
-        precipitation_chance = current.get("precipitation", {}).get("probability", {}).get("percent")
-        is_daytime = current.get("isDaytime")
-        uv_index = current.get("uvIndex")
-
-        # Format for human-friendly output
-        current_weather = {
-            "temperature": f"{temperature:.1f}°C" if temperature is not None else None,
-            "feels_like": f"{feels_like:.1f}°C" if feels_like is not None else None,
-            "condition": condition,
-            "condition_text": condition_text,
-            "humidity": f"{humidity}%" if humidity is not None else None,
-            "wind_speed": f"{wind_speed} km/h" if wind_speed is not None else None,
-            "precipitation_chance": f"{precipitation_chance}%" if precipitation_chance is not None else None,
-            "is_daytime": is_daytime,
-            "uv_index": uv_index
-        }
+        lat = geo["lat"]
+        lon = geo["lon"]
+        resolved_city = geo["city"]
+        resolved_country = geo["country"]
+
+        # 2. Current conditions for the grid cell, from cache or Google Weather API
+        cell = geohash(lat, lon, constants.WEATHER_CACHE_GEOHASH_PRECISION)
+        entry = _get_fresh_weather(cell)
+        cached = entry is not None
+        fallback_error = None
+        if not cached:
+            try:
+                entry = await budget.run(
+                    _weather_flight.do(cell, lambda: _fetch_current_weather(cell, lat, lon, budget))
+                )
+            except (CircuitOpenError, LatencyBudgetExceeded, httpx.HTTPError) as e:
+                # Upstream is down or slow: fall back to the last known conditions for this cell
+                entry = _weather_cache.get(cell)
+                if entry is None:
+                    raise
+                cached = True
+                fallback_error = str(e)
+                logger.warning(f"Serving last cached weather for {location_query}: {e}")
+        age = max(0.0, time.time() - entry["fetched_at"])
+        current_weather = entry["current_weather"]
+
         location = {
             "city": resolved_city,
             "country": resolved_country,
@@ -121,15 +285,21 @@ async def get_current_weather(city: str, country: Optional[str] = None) -> Dict[
             "current_weather": current_weather,
             "verification_details": {
                 "source": "Google Weather API",
-                "timestamp": datetime.now().isoformat(),
-                "is_current": True,
-                "api_response_time": weather_resp.elapsed.total_seconds() if hasattr(weather_resp, 'elapsed') else None
+                "timestamp": datetime.fromtimestamp(entry["fetched_at"]).isoformat(),
+                "is_current": age <= constants.WEATHER_CACHE_TTL_SECONDS,
+                "cached": cached,
+                "cache_age_seconds": round(age, 1),
+                "api_response_time": entry["api_response_time"]
             },
             "error_message": None
         }
-        logger.info(f"Successfully retrieved weather data for {location_query}: {current_weather['temperature']}, {current_weather['condition_text']}")
+        if fallback_error:
+            result["verification_details"]["fallback_reason"] = fallback_error
+        logger.info(f"Successfully retrieved weather data for {location_query} (cached={cached}): {current_weather['temperature']}, {current_weather['condition_text']}")
         return result
-    except httpx.RequestError as e:
+    except ValueError as e:
+        return {"error": str(e)}
+    except (httpx.RequestError, CircuitOpenError, LatencyBudgetExceeded) as e:
         error_msg = f"Failed to fetch weather data: {str(e)}"
         logger.error(error_msg)
         return {
@@ -161,4 +331,134 @@ async def get_current_weather(city: str, country: Optional[str] = None) -> Dict[
         }
 
 # Create the FunctionTool
-weather_api_tool = FunctionTool(func=get_current_weather) 
\ No newline at end of file
+weather_api_tool = FunctionTool(func=get_current_weather)
+
+
+async def iter_current_weather(
+    locations: Iterable[Tuple[str, Optional[str]]],
+    concurrency: int = constants.WEATHER_BATCH_CONCURRENCY,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Looks up current weather for many (city, country) pairs, yielding each result as soon as it completes.
+    Duplicate locations (after normalization) are looked up once. At most `concurrency`
+    lookups run at a time, and a failing location yields its own error instead of aborting the batch.
+
+    Args:
+        locations: (city, country) pairs; country may be None.
+        concurrency: Maximum number of lookups in flight.
+
+    Yields:
+        Dicts with "city", "country" and "result" (the get_current_weather response).
+    """
+    unique: Dict[str, Tuple[str, Optional[str]]] = {}
+    for city, country in locations:
+        unique.setdefault(normalize_location_key(city, country), (city, country))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _lookup(city: str, country: Optional[str]) -> Dict[str, Any]:
+        async with semaphore:
+            try:
+                result = await get_current_weather(city, country)
+            except Exception as e:
+                logger.error(f"Batch weather lookup failed for {city},{country}: {e}")
+                result = {"weather_status": "failed", "error_message": f"Unexpected error: {e}"}
+        return {"city": city, "country": country, "result": result}
+
+    tasks = [asyncio.ensure_future(_lookup(city, country)) for city, country in unique.values()]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def get_current_weather_batch(locations: List[Tuple[str, Optional[str]]]) -> Dict[str, Any]:
+    """
+    Collects iter_current_weather results into a single response.
+
+    Returns:
+        A dict with the per-location "results" and the number that "failed".
+    """
+    results = [item async for item in iter_current_weather(locations)]
+    failed = sum(1 for item in results if item["result"].get("weather_status") != "success")
+    logger.info(f"Batch weather lookup finished: {len(results)} locations, {failed} failed")
+    return {"results": results, "failed": failed}
+
+
+def start_weather_prefetch(session_id: str, city: Optional[str], country: Optional[str] = None) -> bool:
+    """
+    Starts warming the geocode and weather caches for a location in the background.
+    Sessions asking for the same location share one prefetch. Call this at the
+    start of every turn: a session that has not called it for
+    WEATHER_PREFETCH_SESSION_TTL_SECONDS is treated as ended, as is one passed
+    to cancel_weather_prefetch. The prefetch is cancelled once no session
+    still wants it.
+
+    Returns:
+        True if a prefetch is running for the location after the call.
+    """
+    if not city or not constants.WEATHER_PREFETCH_ENABLED:
+        return False
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    key = normalize_location_key(city, country)
+    _expire_prefetch_sessions()
+    if _session_prefetch.get(session_id) not in (None, key):
+        cancel_weather_prefetch(session_id)
+
+    task = _prefetch_tasks.get(key)
+    if task is None:
+        task = loop.create_task(get_current_weather(city, country))
+        task.add_done_callback(lambda _, k=key, t=task: _finish_prefetch(k, t))
+        _prefetch_tasks[key] = task
+        loop.call_later(constants.WEATHER_PREFETCH_SESSION_TTL_SECONDS, _expire_prefetch_sessions)
+        metrics.increment("weather_prefetch", outcome="started")
+        logger.debug(f"Started weather prefetch for {key}")
+    elif session_id not in _prefetch_sessions.get(key, ()):
+        metrics.increment("weather_prefetch", outcome="deduplicated")
+    _prefetch_sessions.setdefault(key, set()).add(session_id)
+    _session_prefetch[session_id] = key
+    _session_seen[session_id] = time.monotonic()
+    return True
+
+
+def _expire_prefetch_sessions() -> None:
+    """Releases the prefetches of sessions that have been idle for longer than the TTL."""
+    cutoff = time.monotonic() - constants.WEATHER_PREFETCH_SESSION_TTL_SECONDS
+    for session_id in [s for s, seen in _session_seen.items() if seen <= cutoff]:
+        logger.debug(f"Session {session_id} idle; releasing its weather prefetch")
+        cancel_weather_prefetch(session_id)
+
+
+def cancel_weather_prefetch(session_id: str) -> None:
+    """Releases a session's interest in its prefetch, cancelling it if no other session shares it."""
+    key = _session_prefetch.pop(session_id, None)
+    _session_seen.pop(session_id, None)
+    if key is None:
+        return
+    sessions = _prefetch_sessions.get(key, set())
+    sessions.discard(session_id)
+    if sessions:
+        return
+    _prefetch_sessions.pop(key, None)
+    task = _prefetch_tasks.pop(key, None)
+    if task is not None and not task.done():
+        task.cancel()
+        metrics.increment("weather_prefetch", outcome="cancelled")
+        logger.debug(f"Cancelled weather prefetch for {key}")
+
+
+def _finish_prefetch(key: str, task: "asyncio.Task") -> None:
+    """Forgets a finished prefetch; its result now lives in the weather cache."""
+    if _prefetch_tasks.get(key) is not task:
+        return
+    del _prefetch_tasks[key]
+    for session_id in _prefetch_sessions.pop(key, set()):
+        if _session_prefetch.get(session_id) == key:
+            del _session_prefetch[session_id]
+            _session_seen.pop(session_id, None)
+    if not task.cancelled():
+        metrics.increment("weather_prefetch", outcome="completed") 
\ No newline at end of file
@@ -58,6 +58,7 @@ def create() -> None:
             "pydantic>=2.10.6,<3.0.0",
             "python-dotenv>=1.0.1,<2.0.0",
             "google-genai>=1.16.1,<2.0.0",
+            "httpx[http2]>=0.28.1,<1.0.0",
             "Pillow>=10.0.0,<11.0.0",
             "absl-py>=2.2.1,<3.0.0",
             "cloudpickle>=3.1.1,<4.0.0",